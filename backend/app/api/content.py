@@ -3,12 +3,23 @@ MediaFlux Hub - Content Management API
 Управление видео контентом
 """
 
-from fastapi import APIRouter, UploadFile, File, Form
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.requests import ClientDisconnect
+from email.utils import formatdate
+from typing import Dict, List
+import base64
+import binascii
 import os
 
+from app.config import settings
+from app.services.ingest_service import IngestError, Upload, video_ingest
+
 router = APIRouter()
 
+TUS_VERSION = "1.0.0"
+TUS_HEADERS = {"Tus-Resumable": TUS_VERSION, "Cache-Control": "no-store"}
+
 @router.get("/folders")
 async def get_content_folders():
     """Список папок с контентом"""
@@ -53,20 +64,165 @@ async def upload_videos(
     videos: List[UploadFile] = File(...),
     category: str = Form(...)
 ):
-    """Загрузка видео файлов"""
+    """Загрузка видео файлов одним multipart запросом (без докачки)"""
     uploaded_files = []
     
     for video in videos:
-        # Симуляция сохранения файла
-        filename = f"{category}_{video.filename}"
+        try:
+            video.file.seek(0, 2)
+            upload = await video_ingest.create(category, video.filename, video.file.tell())
+            video.file.seek(0)
+            if upload.state == 'uploading':
+                upload = await video_ingest.write(upload.upload_id, 0, _read_upload_file(video))
+        except IngestError as e:
+            uploaded_files.append({"filename": video.filename, "error": str(e), "category": category})
+            continue
+        
         uploaded_files.append({
-            "filename": filename,
-            "size": len(await video.read()),
-            "category": category
+            "filename": os.path.basename(upload.video_path),
+            "size": upload.length,
+            "category": category,
+            "duplicate": upload.state == 'duplicate'
         })
     
+    accepted = sum(1 for file in uploaded_files if "error" not in file)
     return {
-        "success": True,
-        "message": f"Загружено {len(videos)} видео",
+        "success": accepted == len(videos),
+        "message": f"Загружено {accepted} из {len(videos)} видео",
         "files": uploaded_files
-    } 
\ No newline at end of file
+    }
+
+
+async def _read_upload_file(video: UploadFile):
+    """Чтение загруженного файла частями, не целиком в память"""
+    while True:
+        chunk = await video.read(1024 * 1024)
+        if not chunk:
+            break
+        yield chunk
+
+
+# Загрузка с докачкой по протоколу tus 1.0 (расширения creation, termination, expiration)
+
+def _parse_metadata(header: str) -> Dict[str, str]:
+    """Upload-Metadata: пары "ключ base64(значение)" через запятую"""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in header.split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ''
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail=f"Некорректное значение метаданных {key}")
+    return metadata
+
+
+def _upload_headers(upload: Upload) -> Dict[str, str]:
+    headers = {
+        **TUS_HEADERS,
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+    }
+    if upload.state == 'uploading':
+        headers["Upload-Expires"] = formatdate(video_ingest.expires_at(upload), usegmt=True)
+    else:
+        headers["Upload-State"] = upload.state
+    return headers
+
+
+def _tus_error(error: IngestError) -> Response:
+    return JSONResponse({"detail": str(error)}, status_code=error.status_code, headers=TUS_HEADERS)
+
+
+@router.options("/uploads")
+async def tus_options():
+    """Возможности сервера загрузок"""
+    return Response(status_code=204, headers={
+        **TUS_HEADERS,
+        "Tus-Version": TUS_VERSION,
+        "Tus-Extension": "creation,termination,expiration",
+        "Tus-Max-Size": str(settings.MAX_VIDEO_SIZE_MB * 1024 * 1024),
+    })
+
+
+@router.post("/uploads")
+async def create_upload(request: Request):
+    """
+    Создание загрузки. Upload-Length - размер файла, Upload-Metadata -
+    filename, category и необязательный sha256: видео, которое уже есть
+    в каталоге, не загружается повторно (ответ 200 с Upload-State: duplicate).
+    """
+    try:
+        length = int(request.headers.get("Upload-Length", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Нужен заголовок Upload-Length")
+    
+    metadata = _parse_metadata(request.headers.get("Upload-Metadata", ""))
+    try:
+        upload = await video_ingest.create(
+            metadata.get("category", ""), metadata.get("filename", ""), length, metadata.get("sha256") or None
+        )
+    except IngestError as e:
+        return _tus_error(e)
+    
+    location = str(request.url_for("get_upload", upload_id=upload.upload_id))
+    status_code = 200 if upload.state == 'duplicate' else 201
+    return Response(status_code=status_code, headers={**_upload_headers(upload), "Location": location})
+
+
+@router.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    """Принятое смещение - с него клиент продолжает загрузку"""
+    try:
+        upload = await video_ingest.get(upload_id)
+    except IngestError as e:
+        return Response(status_code=e.status_code, headers=TUS_HEADERS)
+    return Response(status_code=200, headers=_upload_headers(upload))
+
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    """Дозапись данных с Upload-Offset; тело - application/offset+octet-stream"""
+    if request.headers.get("Content-Type") != "application/offset+octet-stream":
+        return Response(status_code=415, headers=TUS_HEADERS)
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Нужен заголовок Upload-Offset")
+    
+    try:
+        upload = await video_ingest.write(upload_id, offset, request.stream())
+    except ClientDisconnect:
+        # Принятое сохранено, клиент узнает смещение через HEAD
+        return Response(status_code=400, headers=TUS_HEADERS)
+    except IngestError as e:
+        return _tus_error(e)
+    
+    return Response(status_code=204, headers=_upload_headers(upload))
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Состояние загрузки: путь принятого видео или существующей копии"""
+    try:
+        upload = await video_ingest.get(upload_id)
+    except IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {
+        "upload_id": upload.upload_id,
+        "state": upload.state,
+        "offset": upload.offset,
+        "length": upload.length,
+        "category": upload.category,
+        "filename": os.path.basename(upload.video_path) if upload.video_path else upload.filename,
+        "sha256": upload.content_hash,
+    }
+
+
+@router.delete("/uploads/{upload_id}")
+async def terminate_upload(upload_id: str):
+    """Отмена загрузки"""
+    try:
+        await video_ingest.terminate(upload_id)
+    except IngestError as e:
+        return _tus_error(e)
+    return Response(status_code=204, headers=TUS_HEADERS)
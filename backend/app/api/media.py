@@ -0,0 +1,217 @@
+"""
+MediaFlux Hub - Media API
+Раздача видео по подписанным временным ссылкам (Range, условные запросы)
+"""
+
+import mimetypes
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple, Union
+
+import anyio
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.services.media_server import media_server
+from app.services.object_storage import FilesystemStorageBackend, object_storage
+
+router = APIRouter()
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class MediaFileResponse(Response):
+    """
+    Отдача диапазона файла без загрузки его в память.
+
+    Если сервер поддерживает ASGI расширение zerocopysend, файл уходит
+    через sendfile; иначе читается частями по MEDIA_CHUNK_SIZE в потоке.
+    """
+
+    def __init__(self, path: str, status_code: int, headers: dict, offset: int, length: int, send_body: bool = True):
+        self.path = path
+        self.status_code = status_code
+        self.offset = offset
+        self.length = length
+        self.send_body = send_body
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.length:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False
+                })
+                return
+
+            await anyio.to_thread.run_sync(file.seek, self.offset)
+            remaining = self.length
+            while remaining:
+                chunk = await anyio.to_thread.run_sync(file.read, min(settings.MEDIA_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+
+            if remaining:
+                # Файл укоротился во время отдачи - закрываем тело, клиент увидит недостачу
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+
+
+def parse_range(header: str, size: int) -> Union[None, str, Tuple[int, int]]:
+    """
+    Разбор заголовка Range для одного диапазона.
+    None - заголовок не поддерживается (отдаем файл целиком),
+    "unsatisfiable" - диапазон вне файла, иначе (start, end) включительно.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return "unsatisfiable"
+            return max(size - suffix, 0), size - 1
+
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        return "unsatisfiable"
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _http_date(header: Optional[str]) -> Optional[float]:
+    """Дата из HTTP заголовка в секундах"""
+    if not header:
+        return None
+    try:
+        return parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Слабое сравнение ETag для If-None-Match"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _reject() -> HTTPException:
+    media_server.stats['rejected'] += 1
+    return HTTPException(status_code=403, detail="Ссылка недействительна или истекла")
+
+
+def _file_response(request: Request, path: str, size: int, mtime_ns: int, etag: str, name: str, expires: int) -> Response:
+    """Ответ с файлом: условные запросы, Range и отдача без загрузки в память"""
+    mtime = mtime_ns // 1_000_000_000
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(mtime, usegmt=True),
+        "accept-ranges": "bytes",
+        "cache-control": f"private, max-age={max(expires - int(time.time()), 0)}",
+        "content-type": mimetypes.guess_type(name)[0] or "application/octet-stream"
+    }
+
+    # Условные запросы: If-None-Match важнее If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        modified_since = _http_date(request.headers.get("if-modified-since"))
+        if modified_since is not None and mtime <= modified_since:
+            return Response(status_code=304, headers=headers)
+
+    status_code, offset, length = 200, 0, size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range != etag and _http_date(if_range) != mtime:
+        range_header = None
+
+    if range_header:
+        byte_range = parse_range(range_header, size)
+        if byte_range == "unsatisfiable":
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            status_code, offset, length = 206, start, end - start + 1
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+    headers["content-length"] = str(length)
+    media_server.stats['served'] += 1
+    return MediaFileResponse(
+        path, status_code, headers, offset, length,
+        send_body=request.method != "HEAD"
+    )
+
+
+@router.api_route("/storage/{key:path}", methods=["GET", "HEAD"])
+async def serve_storage_object(
+    key: str,
+    request: Request,
+    expires: int = Query(...),
+    sig: str = Query(...)
+):
+    """Объект файлового хранилища (STORAGE_BACKEND=filesystem) по подписанной ссылке"""
+    if not media_server.verify(key, expires, sig):
+        raise _reject()
+
+    backend = object_storage.backend
+    if not isinstance(backend, FilesystemStorageBackend):
+        raise HTTPException(status_code=404, detail="Видео не найдено")
+    try:
+        path = backend.object_file(key)
+        stat = await anyio.to_thread.run_sync(os.stat, path)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Видео не найдено")
+
+    # Ключ объекта - sha256 содержимого, он же ETag
+    etag = f'"{os.path.splitext(os.path.basename(key))[0]}"'
+    return _file_response(request, str(path), stat.st_size, stat.st_mtime_ns, etag, key, expires)
+
+
+@router.api_route("/{name}", methods=["GET", "HEAD"])
+async def serve_media(
+    name: str,
+    request: Request,
+    expires: int = Query(...),
+    sig: str = Query(...)
+):
+    """Видео по подписанной ссылке"""
+    if not media_server.verify(name, expires, sig):
+        raise _reject()
+
+    content_hash, _ = os.path.splitext(name)
+    media = await media_server.resolve(content_hash)
+    if media is None:
+        raise HTTPException(status_code=404, detail="Видео не найдено")
+
+    return _file_response(request, media.path, media.size, media.mtime_ns, f'"{content_hash}"', name, expires)
@@ -8,8 +8,8 @@ from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
-from app.config import settings
-from app.database import SessionLocal, Proxy
+from app.database import AsyncSessionLocal
+from app.repositories.proxies import ProxyRepository
 from app.api.auth import verify_token
 from app.services.proxy_service import ProxyManager
 
@@ -48,17 +48,8 @@ async def get_proxies(
 ):
     """Получение списка прокси"""
     try:
-        db = SessionLocal()
-        
-        query = db.query(Proxy)
-        
-        if is_active is not None:
-            query = query.filter(Proxy.is_active == is_active)
-        
-        if country:
-            query = query.filter(Proxy.country == country)
-        
-        proxies = query.order_by(Proxy.created_at.desc()).all()
+        async with AsyncSessionLocal() as db:
+            proxies = await ProxyRepository(db).list(is_active=is_active, country=country)
         
         result = [
             ProxyResponse(
@@ -78,7 +69,6 @@ async def get_proxies(
             for proxy in proxies
         ]
         
-        db.close()
         return result
         
     except Exception as e:
@@ -132,17 +122,16 @@ async def delete_proxy(
 ):
     """Удаление прокси"""
     try:
-        db = SessionLocal()
-        
-        proxy = db.query(Proxy).filter(Proxy.id == proxy_id).first()
-        if not proxy:
-            db.close()
-            raise HTTPException(status_code=404, detail="Прокси не найден")
-        
-        proxy_url = proxy.proxy_url
-        db.delete(proxy)
-        db.commit()
-        db.close()
+        async with AsyncSessionLocal() as db:
+            proxy_repository = ProxyRepository(db)
+            
+            proxy = await proxy_repository.get(proxy_id)
+            if not proxy:
+                raise HTTPException(status_code=404, detail="Прокси не найден")
+            
+            proxy_url = proxy.proxy_url
+            await proxy_repository.delete(proxy)
+            await db.commit()
         
         return {
             "message": f"Прокси {proxy_url} удален",
@@ -4,12 +4,10 @@ API для системного мониторинга и управления
 """
 import logging
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
-from app.config import settings
-from app.database import SessionLocal
 from app.api.auth import verify_token
 from app.services.system_service import SystemService
 
@@ -4,6 +4,7 @@ Configuration Settings
 """
 import os
 from pathlib import Path
+from typing import ClassVar, Dict, List
 from pydantic_settings import BaseSettings
 
 
@@ -40,6 +41,115 @@ class Settings(BaseSettings):
     MAX_CONCURRENT_UPLOADS: int = 5
     UPLOAD_TIMEOUT: int = 300  # 5 минут
     
+    # Планирование расписания (скользящий горизонт)
+    SCHEDULE_HORIZON_HOURS: int = 48  # Расписание аккаунта продлевается на столько вперед (целыми днями)
+    SCHEDULE_EXTEND_MINUTES: int = 60
+    SCHEDULE_WRITE_BATCH: int = 2000  # Задач в одной транзакции записи расписания
+    SCHEDULE_PLANNER_WORKERS: int = 2  # Процессов расчета плана; 0 - в процессе приложения
+    SCHEDULE_SHARD_SIZE: int = 250  # Аккаунтов в шарде; план меньше одного шарда считается без пула
+    
+    # Очередь задач публикации
+    WORKER_ID: str = ""  # Пусто - генерируется из hostname и pid
+    QUEUE_BATCH_SIZE: int = 200
+    QUEUE_LEASE_SECONDS: int = 900  # 15 минут
+    QUEUE_HEARTBEAT_SECONDS: int = 120
+    QUEUE_REAPER_INTERVAL_SECONDS: int = 60
+    DISPATCH_RESYNC_MINUTES: int = 15  # Сверка шкалы задач с БД (страховка)
+    
+    # Конвейер публикации (воркеров на этап)
+    PIPELINE_PREPARE_WORKERS: int = 3
+    PIPELINE_CREATE_WORKERS: int = 3
+    PIPELINE_AWAIT_WORKERS: int = 2  # Только регистрация в опросчике статусов
+    PIPELINE_PUBLISH_WORKERS: int = 3
+    PIPELINE_QUEUE_SIZE: int = 1000
+    
+    # HTTP сессии (пул соединений на пару прокси/user-agent)
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_KEEPALIVE_TIMEOUT: int = 30
+    HTTP_SESSION_IDLE_SECONDS: int = 600
+    
+    # Хеширование видео (sha256 по частям в пуле потоков)
+    HASH_WORKERS: int = 2
+    HASH_CHUNK_SIZE: int = 1024 * 1024
+    HASH_CACHE_SIZE: int = 10000
+    
+    # Встроенный медиа-сервер (подписанные временные ссылки на видео)
+    MEDIA_PUBLIC_BASE_URL: str = "http://localhost:8000"  # Внешний адрес приложения
+    MEDIA_URL_SECRET: str = ""  # По умолчанию используется SECRET_KEY
+    MEDIA_URL_TTL_SECONDS: int = 3600
+    MEDIA_CHUNK_SIZE: int = 256 * 1024
+    
+    # Предзагрузка видео задач перед публикацией
+    PRESTAGE_LOOKAHEAD_MINUTES: int = 90
+    PRESTAGE_INTERVAL_SECONDS: int = 120
+    PRESTAGE_BATCH_SIZE: int = 100
+    PRESTAGE_CONCURRENCY: int = 4
+    PRESTAGE_URL_MIN_REMAINING_SECONDS: int = 900  # Ссылка должна жить после публикации не меньше
+    
+    # Проба видео (разбор MP4/MOV в пуле процессов) и требования Instagram Reels
+    PROBE_WORKERS: int = 2
+    REELS_VIDEO_CODECS: List[str] = ["avc1", "avc3", "hvc1", "hev1"]  # H.264 / HEVC
+    REELS_AUDIO_CODECS: List[str] = ["mp4a"]  # AAC
+    REELS_MIN_DURATION_SECONDS: float = 3
+    REELS_MAX_DURATION_SECONDS: float = 900  # 15 минут
+    REELS_MAX_DIMENSION: int = 1920
+    REELS_MIN_ASPECT_RATIO: float = 0.01
+    REELS_MAX_ASPECT_RATIO: float = 10
+    REELS_MIN_FRAME_RATE: float = 23
+    REELS_MAX_FRAME_RATE: float = 60
+    REELS_MAX_BITRATE_KBPS: int = 25000
+    
+    # Поиск почти-дубликатов видео (перцептивный хеш по кадрам ffmpeg)
+    FFMPEG_BINARY: str = "ffmpeg"
+    FINGERPRINT_WORKERS: int = 2
+    FINGERPRINT_FRAMES: int = 5
+    FINGERPRINT_MAX_DISTANCE: int = 6  # Бит из 64
+    
+    # Перекодирование видео под требования Reels (нужен ffmpeg)
+    TRANSCODE_ENABLED: bool = False
+    TRANSCODE_WORKERS: int = 2  # Одновременных процессов ffmpeg
+    TRANSCODE_THREADS_PER_JOB: int = 2
+    TRANSCODE_OUTPUT_DIR: str = "./transcoded"
+    TRANSCODE_PRESET: str = "veryfast"
+    TRANSCODE_CRF: int = 23
+    TRANSCODE_MAX_BITRATE_KBPS: int = 8000
+    TRANSCODE_FRAME_RATE: int = 30  # Для видео с fps вне допустимого диапазона
+    TRANSCODE_RETRY_MINUTES: int = 10  # Перенос задачи, видео которой еще перекодируется
+    TRANSCODE_MAX_ATTEMPTS: int = 3  # Попыток ffmpeg, после которых видео считается непригодным
+    TRANSCODE_FAILURE_BACKOFF_MINUTES: int = 15  # Пауза перед повтором после ошибки, удваивается с каждой попыткой
+    
+    # Отслеживание изменений в папках контента (inotify через watchfiles)
+    CONTENT_WATCH_ENABLED: bool = True
+    CONTENT_WATCH_QUIET_MS: int = 2000  # Пачка событий применяется после такой паузы
+    CONTENT_WATCH_MAX_BATCH_MS: int = 30000  # ...но не реже, даже если копирование продолжается
+    CONTENT_WATCH_SETTLE_SECONDS: int = 5  # Файл, менявшийся позже, считается недокопированным
+    CONTENT_RECONCILE_MINUTES: int = 30  # Сверка каталога с диском на случай пропущенных событий
+
+    # Описания публикаций (генерируются при предзагрузке или публикации)
+    CAPTION_BLOOM_CAPACITY: int = 5000  # Описаний в поколении фильтра аккаунта
+    CAPTION_BLOOM_ERROR_RATE: float = 0.01
+    CAPTION_MAX_ATTEMPTS: int = 5  # Попыток сгенерировать не встречавшееся описание
+    
+    # Прием видео через API (потоковая загрузка с докачкой)
+    INGEST_WRITE_BUFFER: int = 4 * 1024 * 1024  # Запись на диск и fsync такими частями
+    INGEST_UPLOAD_EXPIRE_HOURS: int = 24  # Незавершенные загрузки удаляются
+    
+    # Публичное хранилище видео: local (медиа-сервер), s3, filesystem
+    STORAGE_BACKEND: str = "local"
+    STORAGE_KEY_PREFIX: str = "videos/"
+    STORAGE_PART_SIZE: int = 8 * 1024 * 1024  # Минимум 5 MB для S3
+    STORAGE_UPLOAD_WORKERS: int = 4
+    STORAGE_OBJECT_TTL_SECONDS: int = 0  # Срок жизни объектов по lifecycle правилу, 0 - бессрочно
+    STORAGE_FS_ROOT: str = "./storage"
+    STORAGE_FS_BASE_URL: str = ""  # Внешний адрес приложения для ссылок /media/storage/<key> (обязателен для filesystem)
+    S3_BUCKET: str = ""
+    S3_ENDPOINT_URL: str = ""  # Для MinIO / R2 / других S3-совместимых
+    S3_REGION: str = ""
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     CACHE_TTL: int = 3600  # 1 час
@@ -55,7 +165,7 @@ class Settings(BaseSettings):
     PROXIES_DIR: Path = BASE_DIR / "proxies"
     
     # Дневные лимиты по типам аккаунтов
-    DAILY_LIMITS = {
+    DAILY_LIMITS: ClassVar[Dict[str, int]] = {
         'new_account': 2,        # Новые аккаунты
         'normal_account': 5,     # Обычные аккаунты  
         'trusted_account': 8,    # Проверенные аккаунты
@@ -63,8 +173,8 @@ class Settings(BaseSettings):
     }
     
     # Типы видео файлов
-    ALLOWED_VIDEO_EXTENSIONS = ['.mp4', '.mov']
-    MAX_VIDEO_SIZE_MB = 500
+    ALLOWED_VIDEO_EXTENSIONS: ClassVar[List[str]] = ['.mp4', '.mov']
+    MAX_VIDEO_SIZE_MB: ClassVar[int] = 500
     
     # Создание директорий
     def __init__(self, **kwargs):
@@ -4,10 +4,11 @@ Database Configuration and Models
 """
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine, MetaData, Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import create_engine, MetaData, Column, Integer, BigInteger, Float, String, Boolean, DateTime, Text, LargeBinary, ForeignKey, Index, select, text, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.config import settings
 
 # Настройка логирования
@@ -23,6 +24,32 @@ engine = create_engine(
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_database_url(url: str) -> str:
+    """URL с асинхронным драйвером для того же DATABASE_URL"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    return url
+
+
+# Асинхронный engine для сервисов (не блокирует event loop)
+async_engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    echo=False
+)
+
+# Асинхронная сессия; объекты остаются доступны после commit
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Базовый класс для моделей
 Base = declarative_base()
 
@@ -36,6 +63,12 @@ async def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Получение асинхронной сессии базы данных"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 class Account(Base):
     """Модель аккаунта Instagram"""
     __tablename__ = "accounts"
@@ -51,11 +84,17 @@ class Account(Base):
     status = Column(String, default='active')  # active, limited, banned, error
     last_post_time = Column(DateTime, nullable=True)
     last_activity = Column(DateTime, nullable=True)
+    planned_until = Column(DateTime, nullable=True)  # Расписание построено до этого момента
+    planned_revision = Column(String, nullable=True)  # Лимит и контент, с которыми оно построено
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # Связи
     post_tasks = relationship("PostTask", back_populates="account")
+    
+    __table_args__ = (
+        Index('ix_accounts_status_planned_until', 'status', 'planned_until'),  # продление расписания
+    )
 
 
 class Proxy(Base):
@@ -93,6 +132,88 @@ class ContentFolder(Base):
     
     # Связи
     post_tasks = relationship("PostTask", back_populates="folder")
+    videos = relationship("Video", back_populates="folder")
+    
+    __table_args__ = (
+        Index('ix_content_folders_total_videos', 'total_videos'),
+    )
+
+
+class ContentCategoryStats(Base):
+    """Сводка по категории контента: счетчики обновляются вместе с папками и публикациями"""
+    __tablename__ = "content_category_stats"
+    
+    category = Column(String, primary_key=True)
+    folders = Column(Integer, default=0, nullable=False)
+    active_folders = Column(Integer, default=0, nullable=False)
+    total_videos = Column(Integer, default=0, nullable=False)
+    used_videos = Column(Integer, default=0, nullable=False)  # Видео, опубликованные хотя бы раз
+    posts = Column(Integer, default=0, nullable=False)  # Всего публикаций
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class Video(Base):
+    """Модель каталога видео в папках контента"""
+    __tablename__ = "videos"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    folder_id = Column(String, ForeignKey('content_folders.folder_id'), nullable=False)
+    path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    inode = Column(BigInteger, nullable=False)
+    content_hash = Column(String, nullable=True)  # sha256, считается отдельно
+    first_posted_at = Column(DateTime, nullable=True)  # Первая публикация любым аккаунтом
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    # Связи
+    folder = relationship("ContentFolder", back_populates="videos")
+    
+    __table_args__ = (
+        Index('ix_videos_folder_path', 'folder_id', 'path', unique=True),
+    )
+
+
+class VideoMetadata(Base):
+    """Модель метаданных видео (результат пробы контейнера) по хешу содержимого"""
+    __tablename__ = "video_metadata"
+    
+    content_hash = Column(String, primary_key=True)  # sha256 файла
+    duration = Column(Float, nullable=True)  # секунды
+    width = Column(Integer, nullable=True)  # с учетом поворота
+    height = Column(Integer, nullable=True)
+    video_codec = Column(String, nullable=True)  # fourcc: avc1, hvc1...
+    audio_codec = Column(String, nullable=True)  # fourcc: mp4a...
+    frame_rate = Column(Float, nullable=True)
+    bitrate = Column(Integer, nullable=True)  # бит/с
+    probe_error = Column(Text, nullable=True)  # Файл не удалось разобрать
+    fingerprint = Column(String, nullable=True)  # Перцептивный dHash (hex, 64 бита)
+    probed_at = Column(DateTime, default=func.now())
+
+
+class RotationDeck(Base):
+    """Модель колоды ротации видео аккаунта по папке"""
+    __tablename__ = "rotation_decks"
+    
+    account_id = Column(String, ForeignKey('accounts.id'), primary_key=True)
+    folder_id = Column(String, ForeignKey('content_folders.folder_id'), primary_key=True)
+    cards = Column(Text, nullable=False, default='[]')  # JSON: перемешанные ID видео
+    cursor = Column(Integer, default=0)  # Карты до курсора уже выданы
+    posted = Column(Text, nullable=False, default='[]')  # JSON: ID опубликованных в цикле
+    cycle = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class CaptionFilter(Base):
+    """Модель фильтра Блума описаний аккаунта (проверка повторов)"""
+    __tablename__ = "caption_filters"
+    
+    account_id = Column(String, ForeignKey('accounts.id'), primary_key=True)
+    bits = Column(LargeBinary, nullable=False)  # Текущее поколение фильтра
+    previous_bits = Column(LargeBinary, nullable=True)  # Предыдущее поколение
+    count = Column(Integer, default=0, nullable=False)  # Описаний в текущем поколении
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 
 class PostTask(Base):
@@ -113,6 +234,11 @@ class PostTask(Base):
     media_id = Column(String, nullable=True)
     instagram_url = Column(String, nullable=True)
     error_message = Column(Text, nullable=True)
+    lease_owner = Column(String, nullable=True)  # ID воркера, захватившего задачу
+    lease_expires_at = Column(DateTime, nullable=True)  # Окончание аренды задачи
+    video_url = Column(String, nullable=True)  # Заранее загруженное видео (предзагрузка)
+    video_url_expires_at = Column(DateTime, nullable=True)  # Окончание срока ссылки на видео
+    staged_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=func.now())
     completed_at = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -121,6 +247,16 @@ class PostTask(Base):
     account = relationship("Account", back_populates="post_tasks")
     folder = relationship("ContentFolder", back_populates="post_tasks")
     statistics = relationship("PostStatistics", back_populates="task", uselist=False)
+    
+    # Составные индексы под горячие запросы
+    __table_args__ = (
+        Index('ix_post_tasks_status_scheduled_time', 'status', 'scheduled_time'),  # захват очереди
+        Index('ix_post_tasks_account_folder_status', 'account_id', 'folder_id', 'status'),  # выбор видео
+        Index('ix_post_tasks_account_scheduled_time', 'account_id', 'scheduled_time'),  # продление расписания
+        Index('ix_post_tasks_status_completed_at', 'status', 'completed_at'),  # статистика постов
+        Index('ix_post_tasks_status_updated_at', 'status', 'updated_at'),  # очистка неудачных задач
+        Index('ix_post_tasks_status_lease_expires_at', 'status', 'lease_expires_at'),  # reaper аренды
+    )
 
 
 class PostStatistics(Base):
@@ -155,6 +291,22 @@ class SystemLog(Base):
     component = Column(String, nullable=True)  # scheduler, uploader, api, etc.
     details = Column(Text, nullable=True)  # JSON
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_system_logs_created_level_component', 'created_at', 'level', 'component'),
+    )
+
+
+class PublishedMedia(Base):
+    """Модель видео вне каталога, отдаваемого медиа-сервером (результаты перекодирования)"""
+    __tablename__ = "published_media"
+    
+    content_hash = Column(String, primary_key=True)  # sha256 файла - имя в подписанной ссылке
+    path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    inode = Column(BigInteger, nullable=False)
+    published_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 
 class SystemSettings(Base):
@@ -173,6 +325,11 @@ def create_tables():
         Base.metadata.create_all(bind=engine)
         logger.info("✅ MediaFlux Hub: Таблицы базы данных созданы")
         
+        # create_all не добавляет новые колонки и индексы в уже существующие таблицы
+        add_missing_columns()
+        create_missing_indexes()
+        audit_query_plans()
+        
         # Создание дефолтных настроек
         db = SessionLocal()
         try:
@@ -207,6 +364,102 @@ def create_tables():
         raise
 
 
+def add_missing_columns():
+    """Добавление nullable колонок моделей, отсутствующих в существующей базе"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable or column.primary_key:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"🧱 MediaFlux Hub: Добавлена колонка {table.name}.{column.name}")
+
+
+def create_missing_indexes():
+    """Создание индексов моделей, отсутствующих в существующей базе"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _hot_queries():
+    """Горячие запросы сервисов, которые должны идти по индексам"""
+    now = datetime.now()
+    return {
+        'claim_due': select(PostTask.task_id).where(
+            PostTask.status == 'pending',
+            PostTask.scheduled_time <= now
+        ).order_by(PostTask.scheduled_time.asc()).limit(200),
+        'used_video_paths': select(PostTask.video_path).where(
+            PostTask.account_id == 'account',
+            PostTask.folder_id == 'folder',
+            PostTask.status.in_(['completed', 'processing'])
+        ),
+        'top_folders': select(ContentFolder.folder_id).order_by(ContentFolder.total_videos.desc()).limit(10),
+        'completed_since': select(func.count()).select_from(PostTask).where(
+            PostTask.status == 'completed',
+            PostTask.completed_at >= now
+        ),
+        'failed_cleanup': select(PostTask.task_id).where(
+            PostTask.status == 'failed',
+            PostTask.updated_at < now
+        ),
+        'prestage_candidates': select(PostTask.task_id).where(
+            PostTask.status == 'pending',
+            PostTask.scheduled_time <= now,
+            PostTask.video_url_expires_at.is_(None)
+        ).order_by(PostTask.scheduled_time.asc()).limit(100),
+        'expired_leases': select(PostTask.task_id).where(
+            PostTask.status == 'processing',
+            PostTask.lease_expires_at < now
+        ),
+        'recent_logs': select(SystemLog.id).where(
+            SystemLog.created_at >= now,
+            SystemLog.level == 'ERROR'
+        ).order_by(SystemLog.created_at.desc()).limit(100),
+    }
+
+
+def audit_query_plans() -> list:
+    """
+    Проверка планов горячих запросов через EXPLAIN QUERY PLAN (SQLite).
+    Возвращает имена запросов, выполняющихся полным сканированием таблицы.
+    """
+    if engine.dialect.name != 'sqlite':
+        return []
+
+    full_scans = []
+    with engine.connect() as conn:
+        for name, query in _hot_queries().items():
+            compiled = query.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+            try:
+                plan = conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {compiled}",
+                    tuple(compiled.params[key] for key in compiled.positiontup)
+                ).fetchall()
+            except Exception as e:
+                logger.warning(f"⚠️ MediaFlux Hub: Не удалось получить план запроса {name}: {e}")
+                continue
+
+            # Строка плана "SCAN <table>" без индекса - полный проход по таблице
+            details = [row[-1] for row in plan]
+            if any(detail.startswith('SCAN') and 'INDEX' not in detail for detail in details):
+                full_scans.append(name)
+                logger.warning(f"🐢 MediaFlux Hub: Полное сканирование таблицы в запросе {name}: {'; '.join(details)}")
+
+    if not full_scans:
+        logger.info("✅ MediaFlux Hub: Горячие запросы используют индексы")
+
+    return full_scans
+
+
 def init_database():
     """Инициализация базы данных"""
     logger.info("🚀 MediaFlux Hub: Инициализация базы данных...")
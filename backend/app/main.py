@@ -9,13 +9,20 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 
+from app.services.http_sessions import http_sessions
+from app.services.object_storage import object_storage
+from app.services.video_probe import video_prober
+from app.services.video_fingerprint import video_fingerprinter
+from app.services.transcoder import transcoding_farm
+from app.services.fleet_planner import fleet_planner
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Импорт API модулей
 try:
-    from app.api import dashboard, accounts, content, tasks
+    from app.api import dashboard, accounts, content, tasks, media
     API_AVAILABLE = True
     logger.info("✅ All API modules imported successfully")
 except ImportError as e:
@@ -26,12 +33,19 @@ except ImportError as e:
 async def lifespan(app: FastAPI):
     """Lifecycle события приложения"""
     logger.info("🚀 MediaFlux Hub запускается...")
+    object_storage.start()
     if API_AVAILABLE:
         logger.info("✅ API endpoints активны")
     else:
         logger.warning("⚠️ Running without API endpoints")
     yield
     logger.info("🛑 MediaFlux Hub останавливается...")
+    await http_sessions.close_all()
+    await transcoding_farm.stop()
+    object_storage.close()
+    video_prober.close()
+    video_fingerprinter.close()
+    fleet_planner.close()
 
 # Создание приложения
 app = FastAPI(
@@ -63,6 +77,7 @@ if API_AVAILABLE:
     app.include_router(accounts.router, prefix="/api/accounts", tags=["Accounts"]) 
     app.include_router(content.router, prefix="/api/content", tags=["Content"])
     app.include_router(tasks.router, prefix="/api/tasks", tags=["Tasks"])
+    app.include_router(media.router, prefix="/media", tags=["Media"])
     logger.info("✅ All API routers connected")
 
 # Главная страница - КРАСИВЫЙ DASHBOARD
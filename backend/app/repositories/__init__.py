@@ -0,0 +1 @@
+# MediaFlux Hub - Repositories Package
\ No newline at end of file
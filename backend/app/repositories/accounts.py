@@ -0,0 +1,121 @@
+"""
+MediaFlux Hub - Account Repository
+Асинхронный доступ к аккаунтам Instagram
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import String, bindparam, cast, or_, select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Account, Proxy
+
+
+class AccountRepository:
+    """MediaFlux Hub - Репозиторий аккаунтов"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, account_id: str) -> Optional[Account]:
+        """Аккаунт по ID"""
+        return await self.db.get(Account, account_id)
+
+    async def list_active(self) -> List[Account]:
+        """Активные аккаунты"""
+        result = await self.db.execute(select(Account).where(Account.status == 'active'))
+        return list(result.scalars().all())
+
+    async def list_to_plan(self, planned_until: datetime, content_revision: str) -> List[Account]:
+        """
+        Активные аккаунты, расписание которых не доходит до planned_until
+        или построено с другим дневным лимитом или другой ревизией контента
+        """
+        revision = cast(func.coalesce(Account.daily_limit, 0), String) + ':' + content_revision
+        result = await self.db.execute(
+            select(Account).where(
+                Account.status == 'active',
+                or_(
+                    Account.planned_until.is_(None),
+                    Account.planned_until < planned_until,
+                    func.coalesce(Account.planned_revision, '') != revision
+                )
+            )
+        )
+        return list(result.scalars().all())
+
+    async def list_inactive_planned(self) -> List[Account]:
+        """Неактивные аккаунты, у которых осталось построенное расписание"""
+        result = await self.db.execute(
+            select(Account).where(Account.status != 'active', Account.planned_until.isnot(None))
+        )
+        return list(result.scalars().all())
+
+    async def set_planned(self, account_id: str, planned_until: Optional[datetime], revision: Optional[str]):
+        """Отметка, до какого момента и с какой ревизией построено расписание"""
+        await self.db.execute(
+            update(Account)
+            .where(Account.id == account_id)
+            .values(planned_until=planned_until, planned_revision=revision)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def set_planned_many(self, planned: Iterable[Tuple[str, datetime, str]]):
+        """set_planned для пачки аккаунтов (account_id, planned_until, revision) одним executemany"""
+        params = [
+            {'b_id': account_id, 'b_until': planned_until, 'b_revision': revision}
+            for account_id, planned_until, revision in planned
+        ]
+        if not params:
+            return
+        accounts_table = Account.__table__
+        await self.db.execute(
+            update(accounts_table)
+            .where(accounts_table.c.id == bindparam('b_id'))
+            .values(planned_until=bindparam('b_until'), planned_revision=bindparam('b_revision')),
+            params
+        )
+
+    async def count(self, status: Optional[str] = None) -> int:
+        """Количество аккаунтов (всего или с указанным статусом)"""
+        query = select(func.count()).select_from(Account)
+        if status:
+            query = query.where(Account.status == status)
+        return (await self.db.execute(query)).scalar_one()
+
+    async def set_status(self, account_id: str, status: str) -> Optional[Account]:
+        """Смена статуса аккаунта"""
+        account = await self.get(account_id)
+        if account:
+            account.status = status
+            account.updated_at = datetime.now()
+        return account
+
+    async def record_post(self, account_id: str, posted_at: datetime):
+        """Учет опубликованного поста: счетчик и время последней публикации"""
+        await self.db.execute(
+            update(Account)
+            .where(Account.id == account_id)
+            .values(
+                current_daily_posts=Account.current_daily_posts + 1,
+                last_post_time=posted_at,
+                last_activity=posted_at,
+                updated_at=posted_at
+            )
+        )
+
+    async def reset_daily_posts(self) -> int:
+        """Сброс дневных счетчиков постов у всех аккаунтов"""
+        result = await self.db.execute(
+            update(Account).values(current_daily_posts=0, updated_at=datetime.now())
+        )
+        return result.rowcount or 0
+
+    async def list_with_inactive_proxy(self) -> List[Account]:
+        """Аккаунты без прокси или с неактивным прокси"""
+        result = await self.db.execute(
+            select(Account)
+            .join(Proxy, Account.proxy_url == Proxy.proxy_url, isouter=True)
+            .where((Proxy.is_active == False) | (Proxy.id == None))
+        )
+        return list(result.scalars().all())
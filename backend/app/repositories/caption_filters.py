@@ -0,0 +1,35 @@
+"""
+MediaFlux Hub - CaptionFilter Repository
+Асинхронный доступ к фильтрам описаний аккаунтов
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import CaptionFilter
+from app.repositories.upsert import dialect_insert
+
+
+class CaptionFilterRepository:
+    """MediaFlux Hub - Репозиторий фильтров описаний"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, account_id: str) -> Optional[CaptionFilter]:
+        """Фильтр описаний аккаунта"""
+        return await self.db.get(CaptionFilter, account_id)
+
+    async def save(self, account_id: str, bits: bytes, previous_bits: Optional[bytes], count: int):
+        """Создание или перезапись фильтра одним INSERT ... ON CONFLICT DO UPDATE"""
+        values = {
+            'bits': bits,
+            'previous_bits': previous_bits,
+            'count': count,
+            'updated_at': datetime.now()
+        }
+        statement = dialect_insert(self.db, CaptionFilter.__table__).values(account_id=account_id, **values)
+        await self.db.execute(
+            statement.on_conflict_do_update(index_elements=['account_id'], set_=values)
+        )
@@ -0,0 +1,87 @@
+"""
+MediaFlux Hub - ContentFolder Repository
+Асинхронный доступ к папкам с контентом
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ContentFolder
+from app.repositories.content_stats import ContentStatsRepository
+
+
+class ContentFolderRepository:
+    """MediaFlux Hub - Репозиторий папок с контентом"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, folder_id: str) -> Optional[ContentFolder]:
+        """Папка по ID"""
+        return await self.db.get(ContentFolder, folder_id)
+
+    async def get_by_path(self, path: str) -> Optional[ContentFolder]:
+        """Папка по пути на диске"""
+        result = await self.db.execute(select(ContentFolder).where(ContentFolder.path == path))
+        return result.scalars().first()
+
+    async def list_active(self) -> List[ContentFolder]:
+        """Активные папки"""
+        result = await self.db.execute(select(ContentFolder).where(ContentFolder.is_active == True))
+        return list(result.scalars().all())
+
+    async def list_all(self) -> List[ContentFolder]:
+        """Все папки"""
+        result = await self.db.execute(select(ContentFolder))
+        return list(result.scalars().all())
+
+    async def top_by_videos(self, limit: int = 10) -> List[ContentFolder]:
+        """Папки с наибольшим числом видео (по индексу total_videos)"""
+        result = await self.db.execute(
+            select(ContentFolder).order_by(ContentFolder.total_videos.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    # Изменения папок вместе со сводкой по категориям
+
+    async def create(self, folder: ContentFolder):
+        """Добавление папки"""
+        self.db.add(folder)
+        await self.db.flush()
+        await ContentStatsRepository(self.db).adjust(
+            folder.category,
+            folders=1,
+            active_folders=int(bool(folder.is_active)),
+            total_videos=folder.total_videos or 0,
+            used_videos=folder.used_videos or 0
+        )
+
+    async def set_total_videos(self, folder: ContentFolder, total_videos: int) -> bool:
+        """Новое число видео папки; возвращает, изменилось ли оно"""
+        delta = total_videos - (folder.total_videos or 0)
+        if not delta:
+            return False
+
+        folder.total_videos = total_videos
+        folder.updated_at = datetime.now()
+        await ContentStatsRepository(self.db).adjust(folder.category, total_videos=delta)
+        return True
+
+    async def set_category(self, folder: ContentFolder, category: str):
+        """Перенос папки со счетчиками в другую категорию"""
+        if folder.category == category:
+            return
+
+        counters = {
+            'folders': 1,
+            'active_folders': int(bool(folder.is_active)),
+            'total_videos': folder.total_videos or 0,
+            'used_videos': folder.used_videos or 0
+        }
+        stats_repository = ContentStatsRepository(self.db)
+        await stats_repository.adjust(folder.category, **{key: -value for key, value in counters.items()})
+        await stats_repository.adjust(category, **counters)
+        folder.category = category
+        folder.updated_at = datetime.now()
@@ -0,0 +1,177 @@
+"""
+MediaFlux Hub - ContentCategoryStats Repository
+Сводные счетчики контента по категориям
+"""
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ContentCategoryStats, ContentFolder, PostTask, Video
+from app.repositories.upsert import dialect_insert
+
+# Строк в одном executemany при пересчете
+CHUNK_SIZE = 500
+
+COUNTERS = ('folders', 'active_folders', 'total_videos', 'used_videos', 'posts')
+
+
+class ContentStatsRepository:
+    """
+    MediaFlux Hub - Репозиторий сводки контента.
+
+    Счетчики меняются атомарным upsert x = x + delta вместе с папками
+    и публикациями, поэтому статистика читает одну строку на категорию.
+    rebuild пересчитывает сводку GROUP BY запросами с нуля.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_categories(self) -> List[ContentCategoryStats]:
+        """Сводка по всем категориям"""
+        result = await self.db.execute(select(ContentCategoryStats).order_by(ContentCategoryStats.category))
+        return list(result.scalars().all())
+
+    async def adjust(self, category: str, **deltas: int):
+        """
+        Изменение счетчиков категории на delta одним INSERT ... ON CONFLICT DO UPDATE:
+        строка создается при первом изменении, в том числе при гонке двух сессий
+        """
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+
+        table = ContentCategoryStats.__table__
+        now = datetime.now()
+        statement = dialect_insert(self.db, table).values(
+            category=category,
+            updated_at=now,
+            **{key: deltas.get(key, 0) for key in COUNTERS}
+        )
+        await self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=['category'],
+                set_={'updated_at': now, **{key: table.c[key] + value for key, value in deltas.items()}}
+            )
+        )
+
+    async def record_post(self, folder_id: str, video_path: str, posted_at: datetime) -> bool:
+        """
+        Учет успешной публикации. Первая публикация видео любым аккаунтом
+        увеличивает used_videos папки и категории; возвращает, была ли она первой.
+        """
+        category = await self.db.scalar(select(ContentFolder.category).where(ContentFolder.folder_id == folder_id))
+        if category is None:
+            return False
+
+        first = await self.db.execute(
+            update(Video)
+            .where(
+                Video.folder_id == folder_id,
+                Video.path == video_path,
+                Video.first_posted_at.is_(None)
+            )
+            .values(first_posted_at=posted_at)
+            .execution_options(synchronize_session=False)
+        )
+        first_post = bool(first.rowcount)
+        if first_post:
+            await self.db.execute(
+                update(ContentFolder)
+                .where(ContentFolder.folder_id == folder_id)
+                .values(used_videos=func.coalesce(ContentFolder.used_videos, 0) + 1)
+                .execution_options(synchronize_session=False)
+            )
+
+        await self.adjust(category, posts=1, used_videos=int(first_post))
+        return first_post
+
+    async def rebuild(self, backfill: bool = False) -> List[ContentCategoryStats]:
+        """
+        Пересчет сводки и счетчиков папок с нуля GROUP BY запросами.
+        backfill - проставить first_posted_at по уже выполненным задачам (первый запуск).
+        """
+        if backfill:
+            await self._backfill_first_posts()
+
+        # Счетчики папок по каталогу видео
+        totals = await self.db.execute(
+            select(
+                Video.folder_id,
+                func.count(),
+                func.count(Video.first_posted_at)
+            ).group_by(Video.folder_id)
+        )
+        await self.db.execute(
+            update(ContentFolder).values(total_videos=0, used_videos=0).execution_options(synchronize_session=False)
+        )
+        folders_table = ContentFolder.__table__
+        await self._execute_many(
+            update(folders_table)
+            .where(folders_table.c.folder_id == bindparam('b_folder_id'))
+            .values(total_videos=bindparam('b_total'), used_videos=bindparam('b_used')),
+            [{'b_folder_id': folder_id, 'b_total': total, 'b_used': used} for folder_id, total, used in totals]
+        )
+
+        folders = await self.db.execute(
+            select(
+                ContentFolder.category,
+                func.count(),
+                func.sum(case((ContentFolder.is_active == True, 1), else_=0)),
+                func.sum(ContentFolder.total_videos),
+                func.sum(ContentFolder.used_videos)
+            ).group_by(ContentFolder.category)
+        )
+        posts = dict((await self.db.execute(
+            select(ContentFolder.category, func.count())
+            .select_from(PostTask)
+            .join(ContentFolder, ContentFolder.folder_id == PostTask.folder_id)
+            .where(PostTask.status == 'completed')
+            .group_by(ContentFolder.category)
+        )).all())
+
+        await self.db.execute(delete(ContentCategoryStats))
+        rows = [
+            ContentCategoryStats(
+                category=category,
+                folders=folder_count,
+                active_folders=active or 0,
+                total_videos=total or 0,
+                used_videos=used or 0,
+                posts=posts.get(category, 0)
+            )
+            for category, folder_count, active, total, used in folders
+        ]
+        self.db.add_all(rows)
+        await self.db.flush()
+        return rows
+
+    async def _backfill_first_posts(self):
+        """first_posted_at по самой ранней выполненной задаче с видео"""
+        first_posts = await self.db.execute(
+            select(PostTask.folder_id, PostTask.video_path, func.min(PostTask.completed_at))
+            .where(PostTask.status == 'completed')
+            .group_by(PostTask.folder_id, PostTask.video_path)
+        )
+        videos_table = Video.__table__
+        await self._execute_many(
+            update(videos_table)
+            .where(
+                videos_table.c.folder_id == bindparam('b_folder_id'),
+                videos_table.c.path == bindparam('b_path'),
+                videos_table.c.first_posted_at.is_(None)
+            )
+            .values(first_posted_at=bindparam('b_posted_at')),
+            [
+                {'b_folder_id': folder_id, 'b_path': path, 'b_posted_at': posted_at}
+                for folder_id, path, posted_at in first_posts
+                if posted_at is not None
+            ]
+        )
+
+    async def _execute_many(self, statement, params: List[dict]):
+        """executemany частями (Core UPDATE по таблице, без ORM bulk по первичному ключу)"""
+        for start in range(0, len(params), CHUNK_SIZE):
+            await self.db.execute(statement, params[start:start + CHUNK_SIZE])
@@ -0,0 +1,376 @@
+"""
+MediaFlux Hub - PostTask Repository
+Асинхронный доступ к задачам публикации и их статистике
+"""
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, insert, update, delete, func, text, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import PostTask, PostStatistics
+
+# Строк в одном executemany при пакетной вставке
+INSERT_CHUNK_SIZE = 500
+
+
+def new_task_id() -> str:
+    """ID задачи для пакетной вставки (временная метка по умолчанию в модели совпадает внутри пачки)"""
+    return f"task_{uuid.uuid4().hex}"
+
+
+class PostTaskRepository:
+    """MediaFlux Hub - Репозиторий задач публикации"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, task_id: str) -> Optional[PostTask]:
+        """Задача по ID"""
+        return await self.db.get(PostTask, task_id)
+
+    def add(self, task: PostTask):
+        """Добавление новой задачи в сессию"""
+        self.db.add(task)
+
+    async def insert_many(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Пакетная вставка задач из словарей с одинаковыми ключами (task_id задается
+        заранее) через Core executemany частями, без ORM объектов
+        """
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            await self.db.execute(insert(PostTask.__table__), rows[start:start + INSERT_CHUNK_SIZE])
+        return len(rows)
+
+    async def delete_planned(
+        self,
+        account_id: str,
+        since: Optional[datetime] = None,
+        keep_staged: bool = False
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Удаление pending задач аккаунта начиная с since; возвращает
+        (ID задачи, папка, видео) удаленных
+        """
+        conditions = [
+            PostTask.account_id == account_id,
+            PostTask.status == 'pending'
+        ]
+        if since is not None:
+            conditions.append(PostTask.scheduled_time >= since)
+        if keep_staged:
+            conditions.append(PostTask.staged_at.is_(None))
+
+        result = await self.db.execute(
+            select(PostTask.task_id, PostTask.folder_id, PostTask.video_path).where(*conditions)
+        )
+        rows = [tuple(row) for row in result.all()]
+        if rows:
+            await self.db.execute(
+                delete(PostTask)
+                .where(PostTask.task_id.in_([task_id for task_id, _, _ in rows]), *conditions)
+                .execution_options(synchronize_session=False)
+            )
+        return rows
+
+    async def scheduled_times_by_day(
+        self,
+        account_ids: List[str],
+        since: datetime,
+        until: datetime
+    ) -> Dict[str, Dict[date, List[datetime]]]:
+        """Время задач аккаунтов (кроме проваленных) по дням интервала; запрос на INSERT_CHUNK_SIZE аккаунтов"""
+        times: Dict[str, Dict[date, List[datetime]]] = {}
+        for start in range(0, len(account_ids), INSERT_CHUNK_SIZE):
+            result = await self.db.execute(
+                select(PostTask.account_id, PostTask.scheduled_time).where(
+                    PostTask.account_id.in_(account_ids[start:start + INSERT_CHUNK_SIZE]),
+                    PostTask.scheduled_time >= since,
+                    PostTask.scheduled_time < until,
+                    PostTask.status != 'failed'
+                )
+            )
+            for account_id, scheduled_time in result.all():
+                times.setdefault(account_id, {}).setdefault(scheduled_time.date(), []).append(scheduled_time)
+        return times
+
+    async def list_pending_deadlines(self) -> List[Tuple[str, datetime]]:
+        """ID и время всех pending задач"""
+        result = await self.db.execute(
+            select(PostTask.task_id, PostTask.scheduled_time).where(PostTask.status == 'pending')
+        )
+        return [tuple(row) for row in result.all()]
+
+    # Очередь с арендой
+
+    async def claim_due(
+        self,
+        worker_id: str,
+        now: datetime,
+        lease_expires_at: datetime,
+        limit: int
+    ) -> List[PostTask]:
+        """Атомарный захват готовых задач: pending -> processing с арендой"""
+        due_tasks = select(PostTask.task_id).where(
+            PostTask.status == 'pending',
+            PostTask.scheduled_time <= now
+        ).order_by(PostTask.scheduled_time.asc()).limit(limit)
+
+        # В PostgreSQL пропускаем строки, которые прямо сейчас захватывает другой воркер
+        if self.db.get_bind().dialect.name == 'postgresql':
+            due_tasks = due_tasks.with_for_update(skip_locked=True)
+
+        # Повторная проверка status == 'pending' в самом UPDATE гарантирует,
+        # что строку получит только один воркер
+        result = await self.db.execute(
+            update(PostTask)
+            .where(
+                PostTask.task_id.in_(due_tasks.scalar_subquery()),
+                PostTask.status == 'pending'
+            )
+            .values(
+                status='processing',
+                lease_owner=worker_id,
+                lease_expires_at=lease_expires_at,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            return []
+
+        claimed = await self.db.execute(
+            select(PostTask).where(
+                PostTask.status == 'processing',
+                PostTask.lease_owner == worker_id,
+                PostTask.lease_expires_at == lease_expires_at
+            ).order_by(PostTask.scheduled_time.asc())
+        )
+        return list(claimed.scalars().all())
+
+    async def renew_leases(self, task_ids: Iterable[str], worker_id: str, lease_expires_at: datetime) -> int:
+        """Продление аренды задач воркера"""
+        result = await self.db.execute(
+            update(PostTask)
+            .where(
+                PostTask.task_id.in_(list(task_ids)),
+                PostTask.status == 'processing',
+                PostTask.lease_owner == worker_id
+            )
+            .values(lease_expires_at=lease_expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount or 0
+
+    async def begin_attempt(self, task_id: str, worker_id: str) -> bool:
+        """Учет попытки публикации, если аренда задачи принадлежит воркеру"""
+        result = await self.db.execute(
+            update(PostTask)
+            .where(
+                PostTask.task_id == task_id,
+                PostTask.status == 'processing',
+                PostTask.lease_owner == worker_id
+            )
+            .values(attempts=PostTask.attempts + 1, updated_at=datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        return bool(result.rowcount)
+
+    async def reap_expired_leases(self, now: datetime) -> Tuple[int, int]:
+        """Возврат в pending задач с истекшей арендой; исчерпавшие попытки - в failed"""
+        expired = (
+            PostTask.status == 'processing',
+            PostTask.lease_expires_at.isnot(None),
+            PostTask.lease_expires_at < now
+        )
+
+        failed = await self.db.execute(
+            update(PostTask)
+            .where(*expired, PostTask.attempts >= PostTask.max_attempts)
+            .values(
+                status='failed',
+                error_message="Аренда задачи истекла, попытки исчерпаны",
+                lease_owner=None,
+                lease_expires_at=None,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        requeued = await self.db.execute(
+            update(PostTask)
+            .where(*expired)
+            .values(
+                status='pending',
+                lease_owner=None,
+                lease_expires_at=None,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        return requeued.rowcount or 0, failed.rowcount or 0
+
+    # Предзагрузка видео
+
+    async def list_unstaged(self, until: datetime, url_valid_until: datetime, limit: int) -> List[PostTask]:
+        """Pending задачи до until без ссылки на видео или со ссылкой, истекающей раньше url_valid_until"""
+        result = await self.db.execute(
+            select(PostTask).where(
+                PostTask.status == 'pending',
+                PostTask.scheduled_time <= until,
+                or_(
+                    PostTask.video_url_expires_at.is_(None),
+                    PostTask.video_url_expires_at < url_valid_until
+                )
+            ).order_by(PostTask.scheduled_time.asc()).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def set_staged(self, task_id: str, video_path: str, video_url: str, expires_at: datetime) -> bool:
+        """Запись ссылки на видео, если задача еще pending и видео не сменилось"""
+        now = datetime.now()
+        result = await self.db.execute(
+            update(PostTask)
+            .where(
+                PostTask.task_id == task_id,
+                PostTask.status == 'pending',
+                PostTask.video_path == video_path
+            )
+            .values(video_url=video_url, video_url_expires_at=expires_at, staged_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        return bool(result.rowcount)
+
+    async def get_caption(self, task_id: str) -> Optional[str]:
+        """Сохраненное описание задачи"""
+        return await self.db.scalar(select(PostTask.generated_caption).where(PostTask.task_id == task_id))
+
+    async def set_caption(self, task_id: str, caption: str) -> bool:
+        """Запись описания, если оно еще не сгенерировано"""
+        result = await self.db.execute(
+            update(PostTask)
+            .where(PostTask.task_id == task_id, PostTask.generated_caption.is_(None))
+            .values(generated_caption=caption)
+            .execution_options(synchronize_session=False)
+        )
+        return bool(result.rowcount)
+
+    # Итоги публикации
+
+    async def mark_completed(self, task_id: str, media_id: str, completed_at: datetime) -> Optional[PostTask]:
+        """Отметка успешной публикации"""
+        task = await self.get(task_id)
+        if task:
+            task.status = 'completed'
+            task.media_id = media_id
+            task.instagram_url = f"https://www.instagram.com/p/{media_id}/"
+            task.completed_at = completed_at
+            task.lease_owner = None
+            task.lease_expires_at = None
+            task.updated_at = completed_at
+        return task
+
+    async def mark_failed(self, task_id: str, error_message: str) -> Optional[PostTask]:
+        """Отметка задачи как неудачной"""
+        task = await self.get(task_id)
+        if task:
+            task.status = 'failed'
+            task.error_message = error_message
+            task.lease_owner = None
+            task.lease_expires_at = None
+            task.updated_at = datetime.now()
+        return task
+
+    async def reschedule(self, task_id: str, new_time: datetime, reason: str) -> Optional[PostTask]:
+        """Перенос задачи на другое время"""
+        task = await self.get(task_id)
+        if task:
+            task.scheduled_time = new_time
+            task.status = 'pending'
+            task.error_message = f"Перенесено: {reason}"
+            task.lease_owner = None
+            task.lease_expires_at = None
+            task.updated_at = datetime.now()
+        return task
+
+    # Выборки для контента и статистики
+
+    async def used_video_paths(self, account_id: str, folder_id: str) -> Set[str]:
+        """Видео папки, уже опубликованные (или публикуемые) аккаунтом"""
+        result = await self.db.execute(
+            select(PostTask.video_path).where(
+                PostTask.account_id == account_id,
+                PostTask.folder_id == folder_id,
+                PostTask.status.in_(['completed', 'processing'])
+            )
+        )
+        return {str(path) for path in result.scalars().all()}
+
+    async def list_completed_since(self, since: datetime) -> List[PostTask]:
+        """Опубликованные задачи с media_id начиная с даты"""
+        result = await self.db.execute(
+            select(PostTask).where(
+                PostTask.status == 'completed',
+                PostTask.completed_at >= since,
+                PostTask.media_id.isnot(None)
+            )
+        )
+        return list(result.scalars().all())
+
+    async def count(self, status: str, **since: datetime) -> int:
+        """Количество задач со статусом; since: completed_at=/updated_at= нижняя граница"""
+        query = select(func.count()).select_from(PostTask).where(PostTask.status == status)
+        for column, value in since.items():
+            query = query.where(getattr(PostTask, column) >= value)
+        return (await self.db.execute(query)).scalar_one()
+
+    async def top_accounts(self, since: datetime, limit: int = 10) -> List[Tuple[str, int]]:
+        """Аккаунты с наибольшим числом публикаций начиная с даты"""
+        result = await self.db.execute(
+            text("""
+                SELECT a.username, COUNT(pt.task_id) as posts_count
+                FROM accounts a
+                LEFT JOIN post_tasks pt ON a.id = pt.account_id
+                WHERE pt.status = 'completed' AND pt.completed_at >= :since
+                GROUP BY a.id, a.username
+                ORDER BY posts_count DESC
+                LIMIT :limit
+            """),
+            {'since': since, 'limit': limit}
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def delete_failed_older_than(self, cutoff: datetime) -> int:
+        """Удаление неудачных задач старше даты"""
+        result = await self.db.execute(
+            delete(PostTask).where(
+                PostTask.status == 'failed',
+                PostTask.updated_at < cutoff
+            )
+        )
+        return result.rowcount or 0
+
+    async def save_statistics(self, task_id: str, insights: Dict[str, Any]) -> PostStatistics:
+        """Сохранение статистики поста из Instagram Insights"""
+        result = await self.db.execute(
+            select(PostStatistics).where(PostStatistics.task_id == task_id)
+        )
+        stats = result.scalars().first()
+
+        if not stats:
+            stats = PostStatistics(task_id=task_id)
+            self.db.add(stats)
+
+        stats.impressions = insights.get('impressions', 0)
+        stats.reach = insights.get('reach', 0)
+        stats.likes = insights.get('likes', 0)
+        stats.comments = insights.get('comments', 0)
+        stats.shares = insights.get('shares', 0)
+        stats.saves = insights.get('saves', 0)
+        stats.profile_visits = insights.get('profile_visits', 0)
+        stats.follows = insights.get('follows', 0)
+        stats.updated_at = datetime.now()
+
+        return stats
@@ -0,0 +1,67 @@
+"""
+MediaFlux Hub - Proxy Repository
+Асинхронный доступ к прокси-серверам
+"""
+from typing import List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Proxy
+
+
+class ProxyRepository:
+    """MediaFlux Hub - Репозиторий прокси"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, proxy_id: int) -> Optional[Proxy]:
+        """Прокси по ID"""
+        return await self.db.get(Proxy, proxy_id)
+
+    async def get_by_url(self, proxy_url: str) -> Optional[Proxy]:
+        """Прокси по URL"""
+        result = await self.db.execute(select(Proxy).where(Proxy.proxy_url == proxy_url))
+        return result.scalars().first()
+
+    async def list(self, is_active: Optional[bool] = None, country: Optional[str] = None) -> List[Proxy]:
+        """Список прокси с фильтрами"""
+        query = select(Proxy)
+        if is_active is not None:
+            query = query.where(Proxy.is_active == is_active)
+        if country:
+            query = query.where(Proxy.country == country)
+
+        result = await self.db.execute(query.order_by(Proxy.created_at.desc()))
+        return list(result.scalars().all())
+
+    async def list_available(self, limit: Optional[int] = None) -> List[Proxy]:
+        """Активные прокси со свободными местами, наименее загруженные первыми"""
+        query = select(Proxy).where(
+            Proxy.is_active == True,
+            Proxy.accounts_assigned < Proxy.max_accounts
+        ).order_by(Proxy.accounts_assigned.asc(), Proxy.last_used.asc())
+
+        if limit:
+            query = query.limit(limit)
+
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def count(self, is_active: Optional[bool] = None, assigned: bool = False) -> int:
+        """Количество прокси"""
+        query = select(func.count()).select_from(Proxy)
+        if is_active is not None:
+            query = query.where(Proxy.is_active == is_active)
+        if assigned:
+            query = query.where(Proxy.accounts_assigned > 0)
+        return (await self.db.execute(query)).scalar_one()
+
+    def add(self, proxy: Proxy):
+        """Добавление прокси в сессию"""
+        self.db.add(proxy)
+
+    async def delete(self, proxy: Proxy):
+        """Удаление прокси"""
+        await self.db.delete(proxy)
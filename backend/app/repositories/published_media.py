@@ -0,0 +1,29 @@
+"""
+MediaFlux Hub - PublishedMedia Repository
+Асинхронный доступ к видео вне каталога, опубликованным медиа-сервером
+"""
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import PublishedMedia
+from app.repositories.upsert import dialect_insert
+
+
+class PublishedMediaRepository:
+    """MediaFlux Hub - Репозиторий опубликованных видео вне каталога"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, content_hash: str) -> Optional[PublishedMedia]:
+        """Видео по sha256 содержимого"""
+        return await self.db.get(PublishedMedia, content_hash)
+
+    async def save(self, content_hash: str, path: str, size: int, mtime_ns: int, inode: int):
+        """Создание или перезапись записи одним INSERT ... ON CONFLICT DO UPDATE"""
+        values = {'path': path, 'size': size, 'mtime_ns': mtime_ns, 'inode': inode}
+        statement = dialect_insert(self.db, PublishedMedia.__table__).values(content_hash=content_hash, **values)
+        await self.db.execute(
+            statement.on_conflict_do_update(index_elements=['content_hash'], set_=values)
+        )
@@ -0,0 +1,95 @@
+"""
+MediaFlux Hub - RotationDeck Repository
+Асинхронный доступ к колодам ротации видео
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Row, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import RotationDeck
+from app.repositories.upsert import dialect_insert
+
+# Строк в одном запросе / executemany при пакетной записи
+CHUNK_SIZE = 500
+
+
+class RotationDeckRepository:
+    """MediaFlux Hub - Репозиторий колод ротации"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, account_id: str, folder_id: str) -> Optional[RotationDeck]:
+        """Колода аккаунта по папке"""
+        return await self.db.get(RotationDeck, (account_id, folder_id))
+
+    async def get_fields(self, account_id: str, folder_id: str, *fields: str) -> Optional[Row]:
+        """Текущие значения полей колоды из БД (мимо объектов сессии)"""
+        table = RotationDeck.__table__
+        result = await self.db.execute(
+            select(*(table.c[field] for field in fields)).where(
+                table.c.account_id == account_id,
+                table.c.folder_id == folder_id
+            )
+        )
+        return result.first()
+
+    async def list_for_accounts(self, account_ids: Iterable[str]) -> List[Row]:
+        """
+        Колоды всех папок для набора аккаунтов (частями по CHUNK_SIZE); строки
+        с полями модели, без ORM объектов в сессии
+        """
+        table = RotationDeck.__table__
+        account_ids = list(account_ids)
+        decks: List[Row] = []
+        for start in range(0, len(account_ids), CHUNK_SIZE):
+            result = await self.db.execute(
+                select(table).where(table.c.account_id.in_(account_ids[start:start + CHUNK_SIZE]))
+            )
+            decks.extend(result.all())
+        return decks
+
+    async def save_many(self, decks: List[Dict[str, Any]]):
+        """
+        Создание или перезапись пачки колод (словари с полями модели):
+        один INSERT ... ON CONFLICT DO UPDATE на часть из CHUNK_SIZE колод
+        """
+        table = RotationDeck.__table__
+        for start in range(0, len(decks), CHUNK_SIZE):
+            statement = dialect_insert(self.db, table).values(decks[start:start + CHUNK_SIZE])
+            await self.db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=['account_id', 'folder_id'],
+                    set_={
+                        'cards': statement.excluded.cards,
+                        'cursor': statement.excluded.cursor,
+                        'posted': statement.excluded.posted,
+                        'cycle': statement.excluded.cycle,
+                        'updated_at': func.now()
+                    }
+                )
+            )
+
+    async def compare_and_set(
+        self,
+        account_id: str,
+        folder_id: str,
+        expected: Dict[str, Any],
+        values: Dict[str, Any]
+    ) -> bool:
+        """
+        Запись полей колоды, только если сохраненные поля равны expected;
+        остальные поля строки не трогаются. False - строки нет или ее изменили
+        """
+        table = RotationDeck.__table__
+        result = await self.db.execute(
+            update(table)
+            .where(
+                table.c.account_id == account_id,
+                table.c.folder_id == folder_id,
+                *(table.c[key] == value for key, value in expected.items())
+            )
+            .values(updated_at=func.now(), **values)
+        )
+        return bool(result.rowcount)
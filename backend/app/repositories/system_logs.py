@@ -0,0 +1,63 @@
+"""
+MediaFlux Hub - SystemLog Repository
+Асинхронный доступ к системным логам
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SystemLog
+
+
+class SystemLogRepository:
+    """MediaFlux Hub - Репозиторий системных логов"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def add(
+        self,
+        level: str,
+        message: str,
+        details: Optional[str] = None,
+        account_id: Optional[str] = None,
+        task_id: Optional[str] = None,
+        component: str = "system"
+    ) -> SystemLog:
+        """Добавление записи лога в сессию"""
+        log_entry = SystemLog(
+            level=level,
+            message=message,
+            account_id=account_id,
+            task_id=task_id,
+            component=component,
+            details=details
+        )
+        self.db.add(log_entry)
+        return log_entry
+
+    async def list_recent(
+        self,
+        since: datetime,
+        limit: int = 100,
+        level: Optional[str] = None,
+        component: Optional[str] = None
+    ) -> List[SystemLog]:
+        """Последние записи лога с фильтрами"""
+        query = select(SystemLog).where(SystemLog.created_at >= since)
+
+        if level:
+            query = query.where(SystemLog.level == level)
+
+        if component:
+            query = query.where(SystemLog.component == component)
+
+        result = await self.db.execute(query.order_by(SystemLog.created_at.desc()).limit(limit))
+        return list(result.scalars().all())
+
+    async def delete_older_than(self, cutoff: datetime) -> int:
+        """Удаление записей старше даты"""
+        result = await self.db.execute(delete(SystemLog).where(SystemLog.created_at < cutoff))
+        return result.rowcount or 0
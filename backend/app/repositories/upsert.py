@@ -0,0 +1,21 @@
+"""
+MediaFlux Hub - Upsert
+INSERT ... ON CONFLICT DO UPDATE для диалекта текущей сессии
+"""
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def dialect_insert(db: AsyncSession, table: Table):
+    """INSERT диалекта сессии с поддержкой on_conflict_do_update"""
+    dialect = db.get_bind().dialect.name
+    try:
+        return DIALECT_INSERTS[dialect](table)
+    except KeyError:
+        raise NotImplementedError(f"Upsert не поддерживается для диалекта {dialect}") from None
@@ -0,0 +1,49 @@
+"""
+MediaFlux Hub - VideoMetadata Repository
+Асинхронный доступ к метаданным видео
+"""
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import VideoMetadata
+
+# Ограничение числа параметров в одном IN (...) для SQLite
+CHUNK_SIZE = 500
+
+
+class VideoMetadataRepository:
+    """MediaFlux Hub - Репозиторий метаданных видео"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_all(self) -> List[VideoMetadata]:
+        """Метаданные всех проверенных видео"""
+        result = await self.db.execute(select(VideoMetadata))
+        return list(result.scalars().all())
+
+    async def get_many(self, content_hashes: Iterable[str]) -> List[VideoMetadata]:
+        """Метаданные по списку хешей"""
+        hashes = list(content_hashes)
+        found = []
+        for start in range(0, len(hashes), CHUNK_SIZE):
+            result = await self.db.execute(
+                select(VideoMetadata).where(VideoMetadata.content_hash.in_(hashes[start:start + CHUNK_SIZE]))
+            )
+            found.extend(result.scalars().all())
+        return found
+
+    async def save(self, content_hash: str, values: Dict[str, Any]) -> VideoMetadata:
+        """Создание или перезапись метаданных видео"""
+        metadata = await self.db.get(VideoMetadata, content_hash)
+        if metadata is None:
+            metadata = VideoMetadata(content_hash=content_hash)
+            self.db.add(metadata)
+
+        for key, value in values.items():
+            setattr(metadata, key, value)
+
+        await self.db.flush()
+        return metadata
@@ -0,0 +1,92 @@
+"""
+MediaFlux Hub - Video Repository
+Асинхронный доступ к каталогу видео
+"""
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Video
+
+# Ограничение числа параметров в одном IN (...) для SQLite
+CHUNK_SIZE = 500
+
+
+class VideoRepository:
+    """MediaFlux Hub - Репозиторий каталога видео"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_all(self) -> List[Video]:
+        """Все видео каталога"""
+        result = await self.db.execute(select(Video))
+        return list(result.scalars().all())
+
+    async def list_by_folder(self, folder_id: str) -> List[Video]:
+        """Видео папки"""
+        result = await self.db.execute(select(Video).where(Video.folder_id == folder_id))
+        return list(result.scalars().all())
+
+    async def upsert(self, folder_id: str, files: Dict[str, Sequence[int]]) -> List[Video]:
+        """
+        Добавление или обновление видео папки.
+        files: путь -> (size, mtime_ns, inode). У измененных файлов хеш сбрасывается.
+        """
+        paths = list(files)
+        existing: Dict[str, Video] = {}
+        for start in range(0, len(paths), CHUNK_SIZE):
+            result = await self.db.execute(
+                select(Video).where(
+                    Video.folder_id == folder_id,
+                    Video.path.in_(paths[start:start + CHUNK_SIZE])
+                )
+            )
+            existing.update((video.path, video) for video in result.scalars())
+
+        videos = []
+        for path, (size, mtime_ns, inode) in files.items():
+            video = existing.get(path)
+            if video is None:
+                video = Video(folder_id=folder_id, path=path)
+                self.db.add(video)
+            elif (video.size, video.mtime_ns, video.inode) != (size, mtime_ns, inode):
+                video.content_hash = None
+
+            video.size = size
+            video.mtime_ns = mtime_ns
+            video.inode = inode
+            videos.append(video)
+
+        # ID новых записей нужны индексу каталога
+        await self.db.flush()
+        return videos
+
+    async def delete_paths(self, folder_id: str, paths: Iterable[str]) -> int:
+        """Удаление видео, исчезнувших из папки"""
+        paths = list(paths)
+        deleted = 0
+        for start in range(0, len(paths), CHUNK_SIZE):
+            result = await self.db.execute(
+                delete(Video).where(
+                    Video.folder_id == folder_id,
+                    Video.path.in_(paths[start:start + CHUNK_SIZE])
+                )
+            )
+            deleted += result.rowcount or 0
+        return deleted
+
+    async def set_content_hash(self, video_id: int, content_hash: str, size: int, mtime_ns: int, inode: int) -> bool:
+        """Запись хеша, если файл не менялся с момента хеширования"""
+        result = await self.db.execute(
+            update(Video)
+            .where(
+                Video.id == video_id,
+                Video.size == size,
+                Video.mtime_ns == mtime_ns,
+                Video.inode == inode
+            )
+            .values(content_hash=content_hash)
+        )
+        return bool(result.rowcount)
@@ -0,0 +1,172 @@
+"""
+MediaFlux Hub - Caption Index
+Фильтры Блума описаний по аккаунтам: быстрая проверка, не повторяется ли описание
+"""
+import hashlib
+import logging
+import math
+import re
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.repositories.caption_filters import CaptionFilterRepository
+
+logger = logging.getLogger("mediaflux_hub.captions")
+
+HASHTAG_PATTERN = re.compile(r'#\w+')
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize_caption(caption: str) -> str:
+    """
+    Нормальная форма описания для сравнения: слова текста в нижнем регистре
+    без эмодзи и пунктуации плюс отсортированный набор хештегов. Описания,
+    отличающиеся только эмодзи или порядком хештегов, считаются одинаковыми.
+    """
+    text = caption.lower()
+    hashtags = sorted(set(HASHTAG_PATTERN.findall(text)))
+    words = WORD_PATTERN.findall(HASHTAG_PATTERN.sub(' ', text))
+    return ' '.join(words) + '|' + ' '.join(hashtags)
+
+
+class BloomFilter:
+    """Фильтр Блума: размер и число хешей по емкости и допустимой доле ложных срабатываний"""
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytes] = None, count: int = 0):
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = (size + 7) // 8 * 8
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+
+        # Сохраненный фильтр другого размера (изменились настройки) не используется
+        if bits is not None and len(bits) * 8 == self.size:
+            self.bits = bytearray(bits)
+            self.count = count
+        else:
+            self.bits = bytearray(self.size // 8)
+            self.count = 0
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Двойное хеширование: k позиций из двух 64-битных половин одного blake2b
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class CaptionHistory:
+    """
+    Описания аккаунта: два поколения фильтра. Когда текущее заполняется,
+    оно становится предыдущим, а самое старое забывается, поэтому доля
+    ложных срабатываний не растет, а память на аккаунт постоянна.
+    """
+
+    def __init__(self, current: BloomFilter, previous: Optional[BloomFilter] = None):
+        self.current = current
+        self.previous = previous
+
+    def __contains__(self, caption: str) -> bool:
+        """Описание (вероятно) уже было"""
+        key = normalize_caption(caption)
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def add(self, caption: str) -> bool:
+        """Запоминание описания; False - такое (вероятно) уже было"""
+        if caption in self:
+            return False
+        key = normalize_caption(caption)
+
+        if self.current.full:
+            self.previous = self.current
+            self.current = BloomFilter(settings.CAPTION_BLOOM_CAPACITY, settings.CAPTION_BLOOM_ERROR_RATE)
+        self.current.add(key)
+        return True
+
+
+class CaptionIndex:
+    """
+    MediaFlux Hub - Индекс описаний аккаунтов.
+
+    Фильтр аккаунта читается из caption_filters при первом обращении и
+    дальше живет в памяти; после каждого нового описания сохраняется в
+    сессии вызывающего (commit - за ним). На 5000 описаний при 1% ложных
+    срабатываний поколение фильтра занимает около 6 KB.
+    """
+
+    def __init__(self):
+        self._histories: Dict[str, CaptionHistory] = {}
+
+        self.stats = {'loaded': 0, 'added': 0, 'repeats_rejected': 0}
+
+    async def history(self, db: AsyncSession, account_id: str) -> CaptionHistory:
+        """Описания аккаунта"""
+        history = self._histories.get(account_id)
+        if history is not None:
+            return history
+
+        capacity, error_rate = settings.CAPTION_BLOOM_CAPACITY, settings.CAPTION_BLOOM_ERROR_RATE
+        stored = await CaptionFilterRepository(db).get(account_id)
+        if stored:
+            history = CaptionHistory(
+                BloomFilter(capacity, error_rate, stored.bits, stored.count),
+                BloomFilter(capacity, error_rate, stored.previous_bits, capacity) if stored.previous_bits else None
+            )
+            self.stats['loaded'] += 1
+        else:
+            history = CaptionHistory(BloomFilter(capacity, error_rate))
+
+        self._histories[account_id] = history
+        return history
+
+    async def seen(self, db: AsyncSession, account_id: str, caption: str) -> bool:
+        """Проверка кандидата без записи: True - описание у аккаунта (вероятно) уже было"""
+        if caption in await self.history(db, account_id):
+            self.stats['repeats_rejected'] += 1
+            logger.debug(f"📝 MediaFlux Hub: Повтор описания у аккаунта {account_id} отклонен")
+            return True
+        return False
+
+    async def add(self, db: AsyncSession, account_id: str, caption: str) -> bool:
+        """
+        Запоминание описания, уже закрепленного за задачей; False - повтор,
+        описание не сохранено. Фильтр в памяти меняется до commit вызывающего:
+        при откате историю аккаунта нужно сбросить через discard().
+        """
+        history = await self.history(db, account_id)
+        if not history.add(caption):
+            return False
+        self.stats['added'] += 1
+
+        await CaptionFilterRepository(db).save(
+            account_id,
+            bytes(history.current.bits),
+            bytes(history.previous.bits) if history.previous else None,
+            history.current.count
+        )
+        return True
+
+    def discard(self, account_id: str):
+        """Сброс истории аккаунта в памяти (после отката): следующий доступ перечитает БД"""
+        self._histories.pop(account_id, None)
+
+    def get_caption_stats(self) -> Dict[str, int]:
+        """Статистика индекса описаний"""
+        return {'accounts': len(self._histories), **self.stats}
+
+
+# Общий индекс описаний процесса
+caption_index = CaptionIndex()
@@ -0,0 +1,253 @@
+"""
+MediaFlux Hub - Container Status Poller
+Общий опросчик статусов контейнеров Instagram с батчингом через ?ids=
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from app.config import settings
+from app.services.http_sessions import http_sessions
+
+logger = logging.getLogger("mediaflux_hub.poller")
+
+
+@dataclass
+class PendingContainer:
+    """Контейнер, ожидающий обработки"""
+    container_id: str
+    access_token: str
+    proxy: Optional[str]
+    future: asyncio.Future
+    deadline: float
+    next_poll_at: float
+    polls: int = 0
+
+
+class ContainerStatusPoller:
+    """
+    MediaFlux Hub - Опросчик статусов контейнеров.
+
+    Все ожидающие контейнеры хранятся в одном месте. Контейнеры одного
+    access token опрашиваются одним запросом `/?ids=a,b,c&fields=status_code`,
+    интервал опроса каждого контейнера растет по расписанию backoff.
+    """
+
+    # Интервалы между опросами контейнера (секунды); последний повторяется
+    POLL_SCHEDULE = (5, 5, 8, 13, 20, 30)
+
+    # Максимум ID в одном запросе Graph API
+    MAX_IDS_PER_REQUEST = 50
+
+    # Код ошибки Graph API для несуществующего объекта в ids - только из-за нее пачка делится
+    INVALID_ID_ERROR_CODE = 100
+
+    # Коды лимитов запросов Graph API (приложение, пользователь, страница, бизнес) и пауза после них
+    RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613, 80001, 80002}
+    RATE_LIMIT_BACKOFF = 120
+
+    def __init__(self):
+        self.base_url = f"{settings.INSTAGRAM_BASE_URL}/{settings.INSTAGRAM_API_VERSION}"
+        self._pending: Dict[str, PendingContainer] = {}
+        self._changed = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+        self.stats = {'requests': 0, 'polls': 0, 'finished': 0, 'errors': 0, 'timeouts': 0, 'rate_limited': 0}
+
+    def watch(
+        self,
+        container_id: str,
+        access_token: str,
+        proxy: Optional[str] = None,
+        max_wait: int = 300
+    ) -> asyncio.Future:
+        """Регистрация контейнера; future завершится True (FINISHED) или False"""
+        loop = asyncio.get_running_loop()
+
+        existing = self._pending.get(container_id)
+        if existing:
+            return existing.future
+
+        now = loop.time()
+        self._pending[container_id] = PendingContainer(
+            container_id=container_id,
+            access_token=access_token,
+            proxy=proxy,
+            future=loop.create_future(),
+            deadline=now + max_wait,
+            next_poll_at=now + self.POLL_SCHEDULE[0]
+        )
+
+        if not self._loop_task or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+        self._changed.set()
+
+        return self._pending[container_id].future
+
+    async def wait(
+        self,
+        container_id: str,
+        access_token: str,
+        proxy: Optional[str] = None,
+        max_wait: int = 300
+    ) -> bool:
+        """Ожидание обработки контейнера"""
+        return await asyncio.shield(self.watch(container_id, access_token, proxy, max_wait))
+
+    async def stop(self):
+        """Остановка опросчика"""
+        if self._loop_task:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.set_result(False)
+        self._pending.clear()
+
+    async def _run(self):
+        """Цикл опроса: один проход по всем контейнерам, у которых подошло время"""
+        loop = asyncio.get_running_loop()
+
+        while self._pending:
+            now = loop.time()
+            groups: Dict[Tuple[str, Optional[str]], List[PendingContainer]] = {}
+
+            for pending in list(self._pending.values()):
+                if now >= pending.deadline:
+                    self.stats['timeouts'] += 1
+                    logger.error(f"⏰ MediaFlux Hub: Таймаут обработки контейнера {pending.container_id}")
+                    self._resolve(pending, False)
+                elif now >= pending.next_poll_at:
+                    groups.setdefault((pending.access_token, pending.proxy), []).append(pending)
+
+            requests = []
+            for (access_token, proxy), containers in groups.items():
+                for i in range(0, len(containers), self.MAX_IDS_PER_REQUEST):
+                    requests.append(
+                        self._poll_batch(access_token, proxy, containers[i:i + self.MAX_IDS_PER_REQUEST])
+                    )
+
+            if requests:
+                await asyncio.gather(*requests, return_exceptions=True)
+
+            if not self._pending:
+                break
+
+            # Спим до ближайшего опроса или до регистрации нового контейнера
+            self._changed.clear()
+            next_poll = min(min(p.next_poll_at, p.deadline) for p in self._pending.values())
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=max(0, next_poll - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_batch(self, access_token: str, proxy: Optional[str], containers: List[PendingContainer]):
+        """Один запрос статусов для группы контейнеров"""
+        params = {
+            'ids': ','.join(p.container_id for p in containers),
+            'fields': 'status_code',
+            'access_token': access_token
+        }
+        kwargs = {'params': params, 'timeout': aiohttp.ClientTimeout(total=30)}
+        if proxy:
+            kwargs['proxy'] = proxy
+
+        self.stats['requests'] += 1
+        self.stats['polls'] += len(containers)
+
+        try:
+            async with http_sessions.get(proxy).get(f"{self.base_url}/", **kwargs) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    for pending in containers:
+                        status = (result.get(pending.container_id) or {}).get('status_code')
+                        self._apply_status(pending, status)
+                    return
+
+                error = await self._read_error(response)
+                logger.warning(
+                    f"⚠️ MediaFlux Hub: Ошибка проверки статуса {len(containers)} контейнеров: "
+                    f"{response.status} {error.get('message', '')}"
+                )
+
+        except Exception as e:
+            # Таймаут прокси, обрыв соединения: пачка ждет следующего опроса целиком
+            logger.warning(f"⚠️ MediaFlux Hub: Ошибка при проверке статуса: {e}")
+            for pending in containers:
+                self._schedule_next_poll(pending)
+            return
+
+        if response.status == 429 or error.get('code') in self.RATE_LIMIT_ERROR_CODES:
+            # Лимит запросов: дробление пачки только умножило бы запросы - ждем дольше
+            self.stats['rate_limited'] += 1
+            for pending in containers:
+                self._schedule_next_poll(pending, min_interval=self.RATE_LIMIT_BACKOFF)
+            return
+
+        if response.status != 400 or error.get('code') != self.INVALID_ID_ERROR_CODE:
+            # 5xx и прочие ошибки не связаны с конкретным ID
+            for pending in containers:
+                self._schedule_next_poll(pending)
+            return
+
+        # Один неверный ID ломает весь запрос - делим пачку пополам и опрашиваем сразу
+        if len(containers) > 1:
+            middle = len(containers) // 2
+            await asyncio.gather(
+                self._poll_batch(access_token, proxy, containers[:middle]),
+                self._poll_batch(access_token, proxy, containers[middle:]),
+                return_exceptions=True
+            )
+        else:
+            self.stats['errors'] += 1
+            logger.error(f"💥 MediaFlux Hub: Контейнер {containers[0].container_id} не найден")
+            self._resolve(containers[0], False)
+
+    @staticmethod
+    async def _read_error(response: aiohttp.ClientResponse) -> Dict:
+        """Объект error из ответа Graph API (пустой, если тело не JSON)"""
+        try:
+            body = await response.json(content_type=None)
+        except Exception:
+            return {}
+        error = body.get('error') if isinstance(body, dict) else None
+        return error if isinstance(error, dict) else {}
+
+    def _apply_status(self, pending: PendingContainer, status: Optional[str]):
+        """Обработка статуса контейнера"""
+        logger.debug(f"📊 MediaFlux Hub: Статус контейнера {pending.container_id}: {status}")
+
+        if status == 'FINISHED':
+            self.stats['finished'] += 1
+            logger.info(f"✅ MediaFlux Hub: Контейнер {pending.container_id} обработан!")
+            self._resolve(pending, True)
+        elif status in ('ERROR', 'EXPIRED'):
+            self.stats['errors'] += 1
+            logger.error(f"💥 MediaFlux Hub: Ошибка обработки контейнера {pending.container_id}: {status}")
+            self._resolve(pending, False)
+        else:
+            # IN_PROGRESS, PUBLISHED или нет данных - продолжаем ждать
+            self._schedule_next_poll(pending)
+
+    def _schedule_next_poll(self, pending: PendingContainer, min_interval: float = 0):
+        pending.polls += 1
+        interval = max(self.POLL_SCHEDULE[min(pending.polls, len(self.POLL_SCHEDULE) - 1)], min_interval)
+        pending.next_poll_at = asyncio.get_running_loop().time() + interval
+
+    def _resolve(self, pending: PendingContainer, processed: bool):
+        self._pending.pop(pending.container_id, None)
+        if not pending.future.done():
+            pending.future.set_result(processed)
+
+    def get_poller_stats(self):
+        """Статистика опросчика"""
+        return {'pending': len(self._pending), **self.stats}
+
+
+# Общий опросчик процесса: все ожидающие контейнеры опрашиваются здесь
+container_poller = ContainerStatusPoller()
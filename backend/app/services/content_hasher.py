@@ -0,0 +1,123 @@
+"""
+MediaFlux Hub - Content Hasher
+Потоковое sha256 хеширование видео с кэшем по (path, size, mtime_ns, inode)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.repositories.videos import VideoRepository
+from app.services.video_catalog import video_catalog
+
+logger = logging.getLogger("mediaflux_hub.hasher")
+
+# (path, size, mtime_ns, inode)
+HashKey = Tuple[str, int, int, int]
+
+
+def hash_file(path: str, chunk_size: int) -> str:
+    """sha256 файла чтением по частям в один переиспользуемый буфер"""
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+
+    return digest.hexdigest()
+
+
+class ContentHasher:
+    """
+    MediaFlux Hub - Хеширование контента.
+
+    Файл читается частями по HASH_CHUNK_SIZE в пуле потоков, поэтому
+    в памяти не бывает больше одного буфера на поток и event loop не
+    блокируется. Результат кэшируется по (path, size, mtime_ns, inode) и
+    сохраняется в каталог видео: одно видео, публикуемое многими
+    аккаунтами, читается с диска один раз.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.HASH_WORKERS,
+            thread_name_prefix="mediaflux-hash"
+        )
+        self._cache: "OrderedDict[HashKey, str]" = OrderedDict()
+        self._inflight: Dict[HashKey, asyncio.Future] = {}
+
+        self.stats = {'hashed': 0, 'cache_hits': 0, 'catalog_hits': 0, 'bytes_hashed': 0}
+
+    async def hash(self, path: str) -> str:
+        """sha256 файла (hex); повторные вызовы для неизмененного файла не читают диск"""
+        stat = await asyncio.to_thread(os.stat, path)
+        key: HashKey = (path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        cached = self._cache.get(key)
+        if cached:
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return cached
+
+        entry = video_catalog.find(path)
+        if entry and entry.content_hash and (entry.size, entry.mtime_ns, entry.inode) == key[1:]:
+            self.stats['catalog_hits'] += 1
+            self._remember(key, entry.content_hash)
+            return entry.content_hash
+
+        # Одновременные запросы одного файла ждут одно хеширование
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._compute(key))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(pending)
+
+    async def _compute(self, key: HashKey) -> str:
+        """Хеширование в пуле потоков и сохранение результата"""
+        path, size, mtime_ns, inode = key
+        loop = asyncio.get_running_loop()
+        content_hash = await loop.run_in_executor(self._executor, hash_file, path, settings.HASH_CHUNK_SIZE)
+
+        self.stats['hashed'] += 1
+        self.stats['bytes_hashed'] += size
+        self._remember(key, content_hash)
+
+        entry = video_catalog.find(path)
+        if entry and (entry.size, entry.mtime_ns, entry.inode) == (size, mtime_ns, inode):
+            video_catalog.set_content_hash(entry, content_hash)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await VideoRepository(db).set_content_hash(entry.video_id, content_hash, size, mtime_ns, inode)
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ MediaFlux Hub: Не удалось сохранить хеш {path}: {e}")
+
+        logger.debug(f"#️⃣ MediaFlux Hub: Хеш {os.path.basename(path)}: {content_hash[:16]}")
+        return content_hash
+
+    def _remember(self, key: HashKey, content_hash: str):
+        """Запись в LRU кэш хешей"""
+        self._cache[key] = content_hash
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.HASH_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def get_hasher_stats(self) -> Dict[str, int]:
+        """Статистика хеширования"""
+        return {'cached': len(self._cache), 'inflight': len(self._inflight), **self.stats}
+
+
+# Общий хешер для сервисов процесса
+content_hasher = ContentHasher()
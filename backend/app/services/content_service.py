@@ -3,16 +3,27 @@ MediaFlux Hub - Content Service
 Сервис управления видео контентом с автоматической генерацией описаний
 """
 import os
+import asyncio
 import random
 import hashlib
-import aiofiles
 import logging
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.config import settings
-from app.database import SessionLocal, ContentFolder, PostTask
+from app.database import AsyncSessionLocal, ContentFolder, ContentCategoryStats, PostTask
+from app.repositories.content_folders import ContentFolderRepository
+from app.repositories.content_stats import ContentStatsRepository
+from app.repositories.post_tasks import PostTaskRepository
+from app.services.caption_index import caption_index
+from app.services.video_catalog import video_catalog, scan_video_dir
+from app.services.content_hasher import content_hasher
+from app.services.object_storage import object_storage
+from app.services.video_probe import video_prober
+from app.services.transcoder import transcoding_farm, needs_transcoding
 
 logger = logging.getLogger("mediaflux_hub.content")
 
@@ -119,94 +130,48 @@ class MediaFluxContentService:
             ["💎", "⚡", "🔥"]
         ]
     
-    async def scan_content_folders(self, db=None) -> List[ContentFolder]:
-        """Сканирование папок с видео контентом"""
-        logger.info("📁 MediaFlux Hub: Сканирование папок с контентом...")
+    async def sync_folder(
+        self,
+        db: AsyncSession,
+        folder_path: Path,
+        folder_repository: Optional[ContentFolderRepository] = None
+    ) -> Optional[ContentFolder]:
+        """Сканирование одной папки: запись в content_folders и каталог видео (commit - за вызывающим)"""
+        folder_repository = folder_repository or ContentFolderRepository(db)
         
-        if db is None:
-            db = SessionLocal()
-            should_close_db = True
-        else:
-            should_close_db = False
+        # Один проход scandir: он же наполняет каталог видео
+        dir_mtime_ns, video_files = await asyncio.to_thread(scan_video_dir, str(folder_path))
+        video_count = len(video_files)
         
-        try:
-            folders = []
-            
-            # Проверяем существование базовой папки
-            if not self.content_base_path.exists():
-                logger.warning(f"📁 MediaFlux Hub: Папка контента не найдена: {self.content_base_path}")
-                self.content_base_path.mkdir(parents=True, exist_ok=True)
-                
-                # Создаем категории
-                for category in ['motivation', 'lifestyle', 'business', 'entertainment']:
-                    (self.content_base_path / category).mkdir(exist_ok=True)
-                
-                logger.info("📁 MediaFlux Hub: Созданы папки для категорий контента")
-                return folders
-            
-            # Сканируем каждую папку
-            for folder_path in self.content_base_path.iterdir():
-                if not folder_path.is_dir():
-                    continue
-                
-                # Подсчитываем видео файлы
-                video_files = self._get_video_files(folder_path)
-                video_count = len(video_files)
-                
-                if video_count == 0:
-                    logger.debug(f"📁 MediaFlux Hub: Папка {folder_path.name} пуста")
-                    continue
-                
-                # Определяем категорию по названию папки
-                category = self._determine_category(folder_path.name)
-                
-                # Проверяем, существует ли папка в БД
-                existing_folder = db.query(ContentFolder).filter(
-                    ContentFolder.path == str(folder_path)
-                ).first()
-                
-                if existing_folder:
-                    # Обновляем существующую
-                    existing_folder.total_videos = video_count
-                    existing_folder.category = category
-                    existing_folder.updated_at = datetime.now()
-                    folders.append(existing_folder)
-                    logger.debug(f"📁 MediaFlux Hub: Обновлена папка {folder_path.name} ({video_count} видео)")
-                else:
-                    # Создаем новую
-                    folder = ContentFolder(
-                        name=folder_path.name,
-                        path=str(folder_path),
-                        total_videos=video_count,
-                        category=category,
-                        is_active=True
-                    )
-                    db.add(folder)
-                    folders.append(folder)
-                    logger.info(f"📁 MediaFlux Hub: Добавлена папка {folder_path.name} ({video_count} видео)")
-            
-            db.commit()
-            logger.info(f"✅ MediaFlux Hub: Отсканировано {len(folders)} папок с контентом")
-            
-            return folders
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка сканирования контента: {e}")
-            db.rollback()
-            return []
-        finally:
-            if should_close_db:
-                db.close()
-    
-    def _get_video_files(self, folder_path: Path) -> List[Path]:
-        """Получение списка видео файлов в папке"""
-        video_files = []
+        if video_count == 0:
+            logger.debug(f"📁 MediaFlux Hub: Папка {folder_path.name} пуста")
+            return None
+        
+        # Определяем категорию по названию папки
+        category = self._determine_category(folder_path.name)
         
-        for ext in settings.ALLOWED_VIDEO_EXTENSIONS:
-            video_files.extend(folder_path.glob(f"*{ext}"))
-            video_files.extend(folder_path.glob(f"*{ext.upper()}"))
+        # Проверяем, существует ли папка в БД
+        folder = await folder_repository.get_by_path(str(folder_path))
         
-        return video_files
+        if folder:
+            # Обновляем существующую (вместе со сводкой по категориям)
+            await folder_repository.set_category(folder, category)
+            await folder_repository.set_total_videos(folder, video_count)
+            logger.debug(f"📁 MediaFlux Hub: Обновлена папка {folder_path.name} ({video_count} видео)")
+        else:
+            # Создаем новую; ID присваивается при flush
+            folder = ContentFolder(
+                name=folder_path.name,
+                path=str(folder_path),
+                total_videos=video_count,
+                category=category,
+                is_active=True
+            )
+            await folder_repository.create(folder)
+            logger.info(f"📁 MediaFlux Hub: Добавлена папка {folder_path.name} ({video_count} видео)")
+        
+        await video_catalog.apply_scan(db, folder.folder_id, dir_mtime_ns, video_files)
+        return folder
     
     def _determine_category(self, folder_name: str) -> str:
         """Определение категории контента по названию папки"""
@@ -225,64 +190,13 @@ class MediaFluxContentService:
         else:
             return 'entertainment'
     
-    async def get_unused_video(self, folder_id: str, account_id: str, db) -> Optional[str]:
-        """Получение неиспользованного видео для аккаунта"""
-        try:
-            # Получаем папку
-            folder = db.query(ContentFolder).filter(
-                ContentFolder.folder_id == folder_id
-            ).first()
-            
-            if not folder:
-                logger.warning(f"📁 MediaFlux Hub: Папка {folder_id} не найдена")
-                return None
-            
-            # Получаем все видео файлы в папке
-            folder_path = Path(folder.path)
-            if not folder_path.exists():
-                logger.warning(f"📁 MediaFlux Hub: Папка не существует: {folder_path}")
-                return None
-            
-            video_files = self._get_video_files(folder_path)
-            
-            if not video_files:
-                logger.warning(f"📁 MediaFlux Hub: Нет видео в папке {folder.name}")
-                return None
-            
-            # Получаем уже использованные видео для этого аккаунта
-            used_videos = set()
-            used_tasks = db.query(PostTask).filter(
-                PostTask.account_id == account_id,
-                PostTask.folder_id == folder_id,
-                PostTask.status.in_(['completed', 'processing'])
-            ).all()
-            
-            for task in used_tasks:
-                used_videos.add(str(task.video_path))
-            
-            # Находим неиспользованные видео
-            available_videos = [
-                str(video) for video in video_files 
-                if str(video) not in used_videos
-            ]
-            
-            if not available_videos:
-                # Если все использованы, берем любое (начинаем новый цикл)
-                available_videos = [str(video) for video in video_files]
-                logger.info(f"🔄 MediaFlux Hub: Все видео использованы, начинаем новый цикл для папки {folder.name}")
-            
-            # Выбираем случайное видео
-            selected_video = random.choice(available_videos)
-            
-            logger.debug(f"📽️ MediaFlux Hub: Выбрано видео: {Path(selected_video).name}")
-            return selected_video
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка получения видео: {e}")
-            return None
-    
-    async def generate_unique_caption(self, folder_name: str, video_path: str) -> str:
-        """Генерация уникального описания для видео"""
+    async def generate_unique_caption(
+        self,
+        folder_name: str,
+        video_path: str,
+        post_time: Optional[datetime] = None
+    ) -> str:
+        """Генерация уникального описания для видео; post_time - время публикации (по умолчанию сейчас)"""
         try:
             # Определяем категорию
             category = self._determine_category(folder_name)
@@ -302,7 +216,7 @@ class MediaFluxContentService:
             hashtags = self._generate_hashtags(category)
             
             # Добавляем персонализацию на основе времени
-            time_based_addition = self._get_time_based_addition()
+            time_based_addition = self._get_time_based_addition(post_time)
             
             # Собираем финальное описание
             final_caption = f"{caption}\n\n{time_based_addition}\n\n{hashtags}"
@@ -317,6 +231,35 @@ class MediaFluxContentService:
             logger.error(f"💥 MediaFlux Hub: Ошибка генерации описания: {e}")
             return "Потрясающий контент! 🔥\n\n#viral #trending #awesome"
     
+    async def ensure_task_caption(self, db: AsyncSession, task: PostTask) -> str:
+        """
+        Описание задачи, генерируемое при предзагрузке или публикации.
+        Кандидаты, уже встречавшиеся у аккаунта (по фильтру Блума), отбрасываются;
+        после CAPTION_MAX_ATTEMPTS попыток берется последний. В фильтр попадает
+        только описание, закрепленное за задачей. Commit - за вызывающим, при
+        откате он сбрасывает историю аккаунта (caption_index.discard).
+        """
+        if task.generated_caption:
+            return task.generated_caption
+
+        folder = await ContentFolderRepository(db).get(task.folder_id)
+        folder_name = folder.name if folder else ''
+
+        for _ in range(max(1, settings.CAPTION_MAX_ATTEMPTS)):
+            caption = await self.generate_unique_caption(folder_name, task.video_path, task.scheduled_time)
+            if not await caption_index.seen(db, task.account_id, caption):
+                break
+        else:
+            logger.debug(f"📝 MediaFlux Hub: Не удалось подобрать неповторяющееся описание для задачи {task.task_id}")
+
+        # Описание могла уже записать параллельная предзагрузка - тогда берем его, а кандидат не запоминаем
+        task_repository = PostTaskRepository(db)
+        if not await task_repository.set_caption(task.task_id, caption):
+            return await task_repository.get_caption(task.task_id) or caption
+
+        await caption_index.add(db, task.account_id, caption)
+        return caption
+    
     def _generate_hashtags(self, category: str) -> str:
         """Генерация релевантных хештегов"""
         category_hashtags = self.hashtag_pools.get(category, self.hashtag_pools['entertainment'])
@@ -343,9 +286,9 @@ class MediaFluxContentService:
         
         return ' '.join(all_hashtags)
     
-    def _get_time_based_addition(self) -> str:
-        """Получение дополнения на основе времени"""
-        hour = datetime.now().hour
+    def _get_time_based_addition(self, when: Optional[datetime] = None) -> str:
+        """Получение дополнения на основе времени публикации"""
+        hour = (when or datetime.now()).hour
         
         if 6 <= hour < 12:
             morning_phrases = [
@@ -405,8 +348,8 @@ class MediaFluxContentService:
         
         return caption
     
-    async def upload_to_public_storage(self, video_path: str) -> Optional[str]:
-        """Загрузка видео на публичное хранилище"""
+    async def upload_to_public_storage(self, video_path: str, ttl: Optional[int] = None) -> Optional[str]:
+        """Загрузка видео на публичное хранилище; ttl - срок действия ссылки в секундах"""
         try:
             # Проверяем существование файла
             if not os.path.exists(video_path):
@@ -421,83 +364,96 @@ class MediaFluxContentService:
                 logger.error(f"📽️ MediaFlux Hub: Файл слишком большой: {file_size} байт")
                 return None
             
-            # Генерируем уникальный хеш для файла
-            with open(video_path, 'rb') as f:
-                file_content = f.read()
-                file_hash = hashlib.sha256(file_content).hexdigest()[:16]
-            
-            # В реальной реализации здесь должна быть загрузка на:
-            # - AWS S3 с временными ссылками
-            # - Google Cloud Storage  
-            # - Cloudinary
-            # - Или собственный CDN
+            # Объект в хранилище адресуется хешем содержимого и загружается один раз;
+            # при STORAGE_BACKEND=local видео отдает встроенный медиа-сервер
+            public_url = await object_storage.publish(video_path, ttl)
             
-            # Для демо генерируем временную ссылку
-            file_extension = Path(video_path).suffix
-            public_url = f"https://mediaflux-storage.example.com/videos/{file_hash}{file_extension}"
+            logger.info(f"📤 MediaFlux Hub: Видео опубликовано: {Path(video_path).name} -> {public_url.split('?')[0]}")
             
-            logger.info(f"📤 MediaFlux Hub: Видео загружено: {Path(video_path).name} -> {public_url}")
-            
-            # В реальности здесь должна быть actual загрузка
-            # Пока возвращаем временную ссылку
             return public_url
             
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка загрузки видео {video_path}: {e}")
             return None
     
-    async def get_content_statistics(self, db=None) -> Dict[str, Any]:
+    async def get_content_statistics(self, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
         """Получение статистики контента"""
         if db is None:
-            db = SessionLocal()
-            should_close_db = True
-        else:
-            should_close_db = False
+            async with AsyncSessionLocal() as db:
+                return await self.get_content_statistics(db)
         
         try:
-            folders = db.query(ContentFolder).all()
+            # Сводка по категориям ведется инкрементально: чтение не зависит от числа папок и видео
+            categories = await self.get_category_stats(db)
+            top_folders = await ContentFolderRepository(db).top_by_videos(10)
             
-            total_folders = len(folders)
-            total_videos = sum(folder.total_videos for folder in folders)
-            active_folders = sum(1 for folder in folders if folder.is_active)
+            total_folders = sum(row.folders for row in categories)
+            total_videos = sum(row.total_videos for row in categories)
+            active_folders = sum(row.active_folders for row in categories)
             
             # Статистика по категориям
-            categories_stats = {}
-            for folder in folders:
-                category = folder.category
-                if category not in categories_stats:
-                    categories_stats[category] = {
-                        'folders': 0,
-                        'videos': 0,
-                        'used_videos': 0
-                    }
-                
-                categories_stats[category]['folders'] += 1
-                categories_stats[category]['videos'] += folder.total_videos
-                categories_stats[category]['used_videos'] += folder.used_videos
-            
-            # Топ папки по количеству видео
-            top_folders = sorted(
-                [(f.name, f.total_videos, f.category) for f in folders],
-                key=lambda x: x[1],
-                reverse=True
-            )[:10]
+            categories_stats = {
+                row.category: {
+                    'folders': row.folders,
+                    'videos': row.total_videos,
+                    'used_videos': row.used_videos,
+                    'posts': row.posts
+                }
+                for row in categories
+            }
             
             return {
                 'total_folders': total_folders,
                 'active_folders': active_folders,
                 'total_videos': total_videos,
+                'used_videos': sum(row.used_videos for row in categories),
                 'categories': categories_stats,
-                'top_folders': top_folders,
+                'top_folders': [(f.name, f.total_videos, f.category) for f in top_folders],
                 'average_videos_per_folder': total_videos / max(total_folders, 1)
             }
             
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка получения статистики контента: {e}")
             return {}
-        finally:
-            if should_close_db:
-                db.close()
+    
+    async def get_category_stats(self, db: AsyncSession) -> List[ContentCategoryStats]:
+        """Сводка по категориям; при первом обращении строится по существующим данным"""
+        stats_repository = ContentStatsRepository(db)
+        categories = await stats_repository.list_categories()
+        if not categories:
+            categories = await stats_repository.rebuild(backfill=True)
+            await db.commit()
+        return categories
+    
+    async def resolve_publishable_video(self, video_path: str, scheduled_time: datetime) -> Tuple[str, str]:
+        """
+        Файл для публикации видео задачи:
+        ('ready', путь) - исходник или готовый результат перекодирования,
+        ('pending', причина) - видео поставлено на перекодирование,
+        ('rejected', причина) - видео не годится.
+        """
+        is_valid, reason = await self.validate_video_file(video_path)
+        if is_valid:
+            return 'ready', video_path
+        
+        try:
+            content_hash = await content_hasher.hash(video_path)
+        except OSError:
+            return 'rejected', reason
+        
+        if not needs_transcoding(video_prober.result_for(content_hash)):
+            return 'rejected', reason
+        
+        output = transcoding_farm.ready_output(content_hash)
+        if output:
+            return 'ready', output
+        
+        job = await transcoding_farm.submit(video_path, scheduled_time, content_hash)
+        if job and job.terminal:
+            return 'rejected', f"Не удалось перекодировать: {job.error}"
+        if job and job.state == 'failed':
+            return 'pending', f"Повтор перекодирования после ошибки: {job.error}"
+        return 'pending', f"Ожидает перекодирования: {reason}"
     
     async def validate_video_file(self, file_path: str) -> Tuple[bool, str]:
         """Валидация видео файла"""
@@ -522,7 +478,8 @@ class MediaFluxContentService:
             if file_size < 1024:  # Минимум 1KB
                 return False, "Файл слишком маленький"
             
-            return True, "OK"
+            # Длительность, разрешение, кодеки и битрейт из атомов контейнера
+            return await video_prober.check(file_path)
             
         except Exception as e:
             return False, f"Ошибка валидации: {e}" 
\ No newline at end of file
@@ -0,0 +1,308 @@
+"""
+MediaFlux Hub - Content Watcher
+Отслеживание изменений в папках контента и точечное обновление каталога видео
+"""
+import asyncio
+import logging
+import os
+import stat
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from watchfiles import awatch
+except ImportError:
+    awatch = None
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal, ContentFolder
+from app.repositories.content_folders import ContentFolderRepository
+from app.services.content_service import MediaFluxContentService
+from app.services.video_catalog import FileStats, video_catalog
+
+logger = logging.getLogger("mediaflux_hub.content_watcher")
+
+
+def stat_video_files(paths: Iterable[str], settle_seconds: float) -> Tuple[FileStats, List[str], List[str]]:
+    """
+    Статы файлов после пачки событий: (существующие, исчезнувшие, недописанные).
+    Недописанные - менявшиеся позже settle_seconds назад.
+    """
+    present: FileStats = {}
+    missing: List[str] = []
+    unsettled: List[str] = []
+    settled_before = time.time_ns() - int(settle_seconds * 1_000_000_000)
+
+    for path in paths:
+        try:
+            file_stat = os.stat(path)
+        except FileNotFoundError:
+            missing.append(path)
+            continue
+        if not stat.S_ISREG(file_stat.st_mode):
+            missing.append(path)
+        elif file_stat.st_mtime_ns > settled_before:
+            unsettled.append(path)
+        else:
+            present[path] = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+
+    return present, missing, unsettled
+
+
+class ContentWatcher:
+    """
+    MediaFlux Hub - Наблюдение за папками контента.
+
+    События файловой системы (inotify через watchfiles) собираются в пачки:
+    пачка применяется после CONTENT_WATCH_QUIET_MS тишины, но не реже чем
+    раз в CONTENT_WATCH_MAX_BATCH_MS при массовом копировании. По каждому
+    затронутому файлу делается один stat, в каталог пишется только разница,
+    total_videos папки пересчитывается по индексу каталога. Переименование
+    приходит парой удаление + создание. Файлы, которые еще дописываются,
+    откладываются до следующей пачки.
+
+    События могут теряться (переполнение очереди inotify, сетевые ФС), поэтому
+    раз в CONTENT_RECONCILE_MINUTES идет дешевая сверка: листинг только
+    верхнего уровня CONTENT_DIR и refresh каталога, который пересканирует
+    лишь папки с изменившимся mtime. Без watchfiles работает только сверка.
+    """
+
+    def __init__(self, content_service: MediaFluxContentService):
+        self.content_service = content_service
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+        self._unsettled: Set[str] = set()
+        # События и сверка не должны одновременно создавать одну и ту же папку
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            'batches': 0,
+            'events': 0,
+            'changes': 0,
+            'folders_added': 0,
+            'reconciles': 0,
+            'reconcile_changes': 0,
+            'errors': 0,
+            'last_batch': None,
+            'last_reconcile': None
+        }
+
+    @property
+    def base_path(self) -> Path:
+        return self.content_service.content_base_path
+
+    def start(self):
+        """Запуск наблюдения за CONTENT_DIR"""
+        if self._task or not settings.CONTENT_WATCH_ENABLED:
+            return
+        if awatch is None:
+            logger.warning(
+                f"⚠️ MediaFlux Hub: watchfiles не установлен, новые видео появятся "
+                f"после сверки (раз в {settings.CONTENT_RECONCILE_MINUTES} мин)"
+            )
+            return
+
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._watch(), name="content-watcher")
+        logger.info(f"👀 MediaFlux Hub: Наблюдение за папкой контента {self.base_path}")
+
+    async def stop(self):
+        """Остановка наблюдения"""
+        if not self._task:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _watch(self):
+        """Цикл чтения событий; после ошибки наблюдение перезапускается"""
+        while not self._stop_event.is_set():
+            try:
+                self.base_path.mkdir(parents=True, exist_ok=True)
+                async for changes in awatch(
+                    self.base_path,
+                    debounce=settings.CONTENT_WATCH_MAX_BATCH_MS,
+                    step=settings.CONTENT_WATCH_QUIET_MS,
+                    stop_event=self._stop_event,
+                    # Пустая пачка по таймауту - повод перепроверить недописанные файлы
+                    rust_timeout=settings.CONTENT_WATCH_SETTLE_SECONDS * 1000,
+                    yield_on_timeout=True
+                ):
+                    if not changes and not self._unsettled:
+                        continue
+                    try:
+                        await self.apply_events(path for _, path in changes)
+                    except Exception as e:
+                        # Потерянную пачку подберет сверка
+                        self.stats['errors'] += 1
+                        logger.error(f"💥 MediaFlux Hub: Ошибка применения изменений папок контента: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"💥 MediaFlux Hub: Ошибка наблюдения за папкой контента: {e}")
+                await asyncio.sleep(5)
+
+    async def apply_events(self, paths: Iterable[str]) -> int:
+        """Применение пачки событий (пути затронутых файлов и папок); возвращает число изменений в каталоге"""
+        base = os.path.realpath(self.base_path)
+        paths = set(paths)
+        self.stats['events'] += len(paths)
+        paths |= self._unsettled
+        self._unsettled.clear()
+
+        extensions = {ext.lower() for ext in settings.ALLOWED_VIDEO_EXTENSIONS}
+        parents: Dict[str, str] = {}
+        folder_files: Dict[str, Set[str]] = defaultdict(set)  # имя папки -> имена файлов
+        top_level: Set[str] = set()
+
+        for path in paths:
+            parent = os.path.dirname(path)
+            if parent not in parents:
+                parents[parent] = os.path.realpath(parent)
+            real_parent = parents[parent]
+
+            if real_parent == base:
+                top_level.add(os.path.basename(path))
+            elif os.path.dirname(real_parent) == base:
+                # Сканер не рекурсивный: учитываются только файлы прямо в папках категорий
+                if os.path.splitext(path)[1].lower() in extensions:
+                    folder_files[os.path.basename(real_parent)].add(os.path.basename(path))
+
+        if not top_level and not folder_files:
+            return 0
+
+        async with self._lock, AsyncSessionLocal() as db:
+            try:
+                changes = await self._apply(db, top_level, folder_files)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                video_catalog.invalidate()
+                raise
+
+        self.stats['batches'] += 1
+        self.stats['changes'] += changes
+        self.stats['last_batch'] = datetime.now().isoformat()
+        if changes:
+            logger.info(f"👀 MediaFlux Hub: Изменения в папках контента применены: {changes}")
+        return changes
+
+    async def _folders(self, folder_repository: ContentFolderRepository) -> Dict[str, ContentFolder]:
+        """Папки из БД, лежащие в CONTENT_DIR, по имени"""
+        base = os.path.realpath(self.base_path)
+        return {
+            os.path.basename(folder.path): folder
+            for folder in await folder_repository.list_all()
+            if os.path.dirname(os.path.realpath(folder.path)) == base
+        }
+
+    async def _apply(self, db: AsyncSession, top_level: Set[str], folder_files: Dict[str, Set[str]]) -> int:
+        folder_repository = ContentFolderRepository(db)
+        folders = await self._folders(folder_repository)
+        changes = 0
+
+        # Папки верхнего уровня: появились, исчезли или переименованы
+        for name in top_level | (set(folder_files) - set(folders)):
+            path = self.base_path / name
+            folder = folders.get(name)
+            folder_files.pop(name, None)
+
+            if folder is not None:
+                changes += await video_catalog.refresh(db, [folder], force=True)
+                await self._recount(folder, folder_repository)
+            elif await asyncio.to_thread(path.is_dir):
+                folder = await self._add_folder(db, path, folder_repository)
+                changes += folder.total_videos if folder else 0
+
+        # Файлы известных папок
+        for name, file_names in folder_files.items():
+            folder = folders[name]
+            file_paths = [os.path.join(folder.path, file_name) for file_name in file_names]
+            present, missing, unsettled = await asyncio.to_thread(
+                stat_video_files, file_paths, settings.CONTENT_WATCH_SETTLE_SECONDS
+            )
+            self._unsettled.update(unsettled)
+
+            folder_changes = await video_catalog.apply_changes(db, folder.folder_id, present, missing)
+            if folder_changes:
+                await self._recount(folder, folder_repository)
+                changes += folder_changes
+
+        return changes
+
+    async def _add_folder(
+        self,
+        db: AsyncSession,
+        path: Path,
+        folder_repository: ContentFolderRepository
+    ) -> Optional[ContentFolder]:
+        """Новая папка добавляется, когда все ее видео докопированы"""
+        entries = await asyncio.to_thread(lambda: [entry.path for entry in os.scandir(path)])
+        _, _, unsettled = await asyncio.to_thread(stat_video_files, entries, settings.CONTENT_WATCH_SETTLE_SECONDS)
+        if unsettled:
+            self._unsettled.add(str(path))
+            return None
+
+        folder = await self.content_service.sync_folder(db, path, folder_repository)
+        if folder:
+            self.stats['folders_added'] += 1
+        return folder
+
+    async def _recount(self, folder: ContentFolder, folder_repository: ContentFolderRepository):
+        """total_videos папки по индексу каталога"""
+        await folder_repository.set_total_videos(folder, len(video_catalog.videos(folder.folder_id)))
+
+    async def reconcile(self) -> int:
+        """Сверка каталога с диском; возвращает число изменений"""
+        async with self._lock, AsyncSessionLocal() as db:
+            try:
+                folder_repository = ContentFolderRepository(db)
+                known = await self._folders(folder_repository)
+                folders = await folder_repository.list_all()
+
+                try:
+                    new_dirs = await asyncio.to_thread(
+                        lambda: [Path(entry.path) for entry in os.scandir(self.base_path)
+                                 if entry.is_dir() and entry.name not in known]
+                    )
+                except FileNotFoundError:
+                    new_dirs = []
+
+                changes = 0
+                for path in new_dirs:
+                    folder = await self._add_folder(db, path, folder_repository)
+                    if folder:
+                        folders.append(folder)
+                        changes += folder.total_videos
+
+                # Пересканируются только папки с изменившимся mtime
+                changes += await video_catalog.refresh(db, folders)
+                for folder in folders:
+                    await self._recount(folder, folder_repository)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                video_catalog.invalidate()
+                raise
+
+        self.stats['reconciles'] += 1
+        self.stats['reconcile_changes'] += changes
+        self.stats['last_reconcile'] = datetime.now().isoformat()
+        if changes:
+            logger.info(f"🔄 MediaFlux Hub: Сверка папок контента нашла изменений: {changes}")
+        return changes
+
+    def get_watcher_stats(self) -> Dict[str, Any]:
+        """Статистика наблюдения"""
+        return {
+            'watching': self._task is not None and not self._task.done(),
+            'unsettled': len(self._unsettled),
+            **self.stats
+        }
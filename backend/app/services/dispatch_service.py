@@ -0,0 +1,96 @@
+"""
+MediaFlux Hub - Dispatch Service
+Событийный диспетчер: пробуждение точно к ближайшему scheduled_time
+"""
+import heapq
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mediaflux_hub.dispatch")
+
+
+class TaskTimeline:
+    """
+    MediaFlux Hub - Временная шкала предстоящих задач.
+
+    Min-heap пар (scheduled_time, task_id) в памяти. Перенос задачи
+    добавляет новую запись, а устаревшие записи отбрасываются лениво
+    при чтении вершины кучи. Задача с неизменным временем в кучу
+    повторно не добавляется.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._deadlines: Dict[str, datetime] = {}
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, task_id: str, scheduled_time: datetime):
+        """Добавление или перенос задачи"""
+        # Повторная сверка с тем же временем не должна раздувать кучу устаревшими записями
+        if self._deadlines.get(task_id) == scheduled_time:
+            return
+        self._deadlines[task_id] = scheduled_time
+        heapq.heappush(self._heap, (scheduled_time, task_id))
+        self._changed.set()
+
+    def discard(self, task_id: str):
+        """Удаление задачи из шкалы"""
+        self._deadlines.pop(task_id, None)
+
+    def clear(self):
+        """Полная очистка шкалы"""
+        self._heap.clear()
+        self._deadlines.clear()
+        self._changed.set()
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Ближайшее время запуска"""
+        while self._heap:
+            scheduled_time, task_id = self._heap[0]
+            if self._deadlines.get(task_id) == scheduled_time:
+                return scheduled_time
+            # Запись устарела (задача перенесена или удалена)
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[str]:
+        """Извлечение всех задач, время которых наступило"""
+        now = now or datetime.now()
+        due = []
+
+        while True:
+            scheduled_time = self.next_deadline()
+            if scheduled_time is None or scheduled_time > now:
+                break
+
+            _, task_id = heapq.heappop(self._heap)
+            del self._deadlines[task_id]
+            due.append(task_id)
+
+        return due
+
+    async def wait_for_due(self):
+        """Сон до ближайшего дедлайна (или до изменения шкалы)"""
+        while True:
+            self._changed.clear()
+
+            deadline = self.next_deadline()
+            timeout = None
+            if deadline is not None:
+                timeout = (deadline - datetime.now()).total_seconds()
+                if timeout <= 0:
+                    return
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+
+
+# Общая шкала процесса: планировщик и API сообщают сюда о новых и перенесенных задачах
+task_timeline = TaskTimeline()
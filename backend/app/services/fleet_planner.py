@@ -0,0 +1,446 @@
+"""
+MediaFlux Hub - Fleet Planner
+Планирование задач аккаунтов: шарды аккаунтов считаются в пуле процессов по снимку каталога и колод
+"""
+import asyncio
+import logging
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.repositories.post_tasks import new_task_id
+from app.services.folder_allocator import FolderAllocator, folder_allocator
+from app.services.instagram_service import AntiBanManager
+from app.services.process_pools import new_process_pool
+from app.services.video_catalog import VideoCatalog, VideoEntry, video_catalog
+from app.services.video_fingerprint import video_fingerprinter
+from app.services.video_probe import video_prober
+from app.services.video_rotation import Deck, VideoRotation, video_rotation
+
+logger = logging.getLogger("mediaflux_hub.planner")
+
+# Оптимальные временные окна для Instagram (по часам)
+OPTIMAL_HOURS = [
+    (9, 11),    # Утро
+    (13, 15),   # Обед
+    (17, 19),   # Вечер
+    (20, 22)    # Ночь
+]
+
+DAY_SECONDS = 24 * 3600
+
+# Сдвиг между днями на общих осях: значения одного дня лежат в [0, DAY_SECONDS]
+DAY_LIFT = 2 * DAY_SECONDS
+
+
+@dataclass
+class PlannedFolder:
+    """Папка в снимке планирования (поля как у ContentFolder)"""
+    folder_id: str
+    name: str
+    posts_per_week: Optional[int]
+    is_active: bool = True
+
+
+@dataclass
+class AccountPlan:
+    """Аккаунт к планированию: дни [start, until) дозаполняются до дневного количества постов"""
+    account_id: str
+    username: str
+    daily_limit: int
+    start: datetime
+    until: datetime
+    existing: Dict[date, List[datetime]] = field(default_factory=dict)  # дата -> время задач, уже стоящих в этот день
+
+
+@dataclass
+class PlanningSnapshot:
+    """Снимок для воркеров пула: папки, индекс каталога, годность и дубликаты видео"""
+    folders: List[PlannedFolder]
+    videos: List[VideoEntry]
+    versions: Dict[str, int]
+    rejected: Set[int]
+    duplicates: Dict[int, Set[int]]
+
+
+def calculate_daily_posts(daily_limit: int, target_date: datetime) -> int:
+    """Расчет количества постов в день для аккаунта"""
+
+    # Базовое количество постов
+    base_posts = min(daily_limit, settings.MAX_DAILY_POSTS_PER_ACCOUNT)
+    if base_posts <= 0:
+        return 0
+
+    # Корректировки по дням недели
+    weekday = target_date.weekday()
+
+    if weekday in [5, 6]:  # Выходные
+        return max(1, int(base_posts * 0.7))  # Уменьшаем активность на выходных
+    elif weekday in [0, 3]:  # Понедельник и четверг - более активные дни
+        return min(daily_limit, int(base_posts * 1.2))
+    else:
+        return random.randint(max(1, base_posts - 1), base_posts)
+
+
+def _busy_intervals(
+    base: np.ndarray,
+    existing: Sequence[Sequence[datetime]],
+    delay: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Занятые уже стоящими задачами отрезки дней [t - d + 1, t + d) в секундах
+    от начала дня: (день, начало, конец), пересекающиеся слиты, по возрастанию
+    """
+    lengths = np.fromiter((len(times) for times in existing), dtype=np.int64, count=len(existing))
+    group = np.repeat(np.arange(len(existing)), lengths)
+    times = np.array([time for day_times in existing for time in day_times], dtype='datetime64[s]')
+    offset = (times - base[group]).astype(np.int64)
+
+    start = np.clip(offset - delay + 1, 0, DAY_SECONDS)
+    end = np.clip(offset + delay, 0, DAY_SECONDS)
+    order = np.lexsort((start, group))
+    group, start, end = group[order], start[order], end[order]
+    if not len(group):
+        return group, start, end
+
+    # Отрезок начинает новую группу слияния, если начинается после всех предыдущих отрезков своего дня
+    reach = np.maximum.accumulate(end + group * DAY_LIFT)
+    opens = np.ones(len(group), dtype=bool)
+    opens[1:] = start[1:] + group[1:] * DAY_LIFT > reach[:-1]
+    first = np.flatnonzero(opens)
+    return group[first], start[first], np.maximum.reduceat(end, first)
+
+
+def _compress(blocks: Tuple[np.ndarray, np.ndarray, np.ndarray], group: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Перевод времени дня на сжатую ось без занятых отрезков; время внутри отрезка прижимается к его концу"""
+    block_group, start, end = blocks
+    if not len(block_group):
+        return points
+    cumulative = np.concatenate(([0], np.cumsum(end - start)))
+    first = np.searchsorted(block_group, group)
+    index = np.searchsorted(block_group * DAY_LIFT + start, group * DAY_LIFT + points, side='right')
+
+    # Последний отрезок своего дня, начавшийся не позже точки, и попадает ли точка в него
+    candidate = np.maximum(index - 1, 0)
+    inside = (index > first) & (points < end[candidate])
+    points = np.where(inside, end[candidate], points)
+    return points - (cumulative[index] - cumulative[first])
+
+
+def _expand(blocks: Tuple[np.ndarray, np.ndarray, np.ndarray], group: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Обратный перевод со сжатой оси: добавляются занятые отрезки, лежащие до точки"""
+    block_group, start, end = blocks
+    if not len(block_group):
+        return points
+    cumulative = np.concatenate(([0], np.cumsum(end - start)))
+    compressed_start = start - (cumulative[:-1] - cumulative[np.searchsorted(block_group, block_group)])
+    first = np.searchsorted(block_group, group)
+    index = np.searchsorted(block_group * DAY_LIFT + compressed_start, group * DAY_LIFT + points, side='right')
+    return points + cumulative[index] - cumulative[first]
+
+
+def generate_posting_times(
+    days: Sequence[datetime],
+    counts: Sequence[int],
+    existing: Optional[Sequence[Sequence[datetime]]] = None,
+    rng: Optional[np.random.Generator] = None
+) -> List[List[datetime]]:
+    """
+    Генерация оптимальных времен публикации сразу для набора дней (всех
+    аккаунтов шарда): counts[i] постов на дни days[i], по возрастанию;
+    existing[i] - время задач, уже стоящих в этот день.
+
+    Время - случайная секунда случайного окна OPTIMAL_HOURS со сдвигом
+    AntiBanManager в ±POSTING_TIME_JITTER_MINUTES; времена в прошлом
+    отбрасываются. Интервал MIN_DELAY_BETWEEN_POSTS обеспечивается без
+    циклов на сжатой оси дня, из которой вырезаны отрезки ±d вокруг уже
+    стоящих задач: после сортировки t'[k] = max(t'[k-1] + d, t[k])
+    раскрывается в cummax(t[k] - k*d) + k*d. Посты, которые сдвиг вытолкнул
+    за конец дня, тем же приемом с cummin сдвигаются назад - количество
+    постов дня сохраняется.
+    """
+    rng = rng or np.random.default_rng()
+    delay = settings.MIN_DELAY_BETWEEN_POSTS
+    counts = np.asarray(counts, dtype=np.int64)
+    group = np.repeat(np.arange(len(counts)), counts)
+    total = len(group)
+
+    # Случайное окно, час в нем, минута, секунда и антибан-сдвиг - смещение от начала дня в секундах
+    windows = np.asarray(OPTIMAL_HOURS, dtype=np.int64)[rng.integers(0, len(OPTIMAL_HOURS), total)]
+    jitter = AntiBanManager.POSTING_TIME_JITTER_MINUTES
+    offset = (
+        rng.integers(windows[:, 0], windows[:, 1]) * 3600
+        + rng.integers(0, 60, total) * 60
+        + rng.integers(0, 60, total)
+        + rng.integers(-jitter, jitter + 1, total) * 60
+    )
+    offset = np.clip(offset, 0, DAY_SECONDS - 1)
+
+    # Проверяем, что время не в прошлом
+    base = np.array(days, dtype='datetime64[s]')
+    future = base[group] + offset.astype('timedelta64[s]') > np.datetime64(datetime.now(), 's')
+    group, offset = group[future], offset[future]
+
+    # Сжатая ось дня: занятые отрезки вырезаны, время внутри отрезка прижимается к его концу
+    blocks = _busy_intervals(base, existing if existing is not None else [()] * len(counts), delay)
+    block_group, block_start, block_end = blocks
+    compressed = _compress(blocks, group, offset)
+    day_end = DAY_SECONDS - np.bincount(block_group, weights=block_end - block_start, minlength=len(counts)).astype(np.int64)
+
+    # Сортируем по времени внутри дня; rank - номер поста в своем дне, last - номер последнего
+    order = np.lexsort((compressed, group))
+    group, compressed = group[order], compressed[order]
+    first = np.searchsorted(group, group)
+    rank = np.arange(len(group)) - first
+    last = np.searchsorted(group, group, side='right') - first - 1
+
+    if len(group):
+        # Минимальные интервалы: один cummax на все дни, дни разнесены на span, чтобы максимум не переходил между ними
+        shifted = compressed - rank * delay
+        span = int(shifted.max() - shifted.min()) + DAY_SECONDS
+        shifted = np.maximum.accumulate(shifted + group * span) - group * span
+
+        # Не позже конца дня: последний пост - до day_end, каждый предыдущий - на d раньше следующего
+        shifted = np.minimum(shifted, day_end[group] - 1 - last * delay)
+        shifted = np.minimum.accumulate((shifted + group * span)[::-1])[::-1] - group * span
+        compressed = np.maximum(shifted + rank * delay, 0)
+
+    offset = _expand(blocks, group, compressed)
+
+    times = (base[group] + offset.astype('timedelta64[s]')).tolist()
+    bounds = np.searchsorted(group, np.arange(len(counts) + 1)).tolist()
+    return [times[low:high] for low, high in zip(bounds, bounds[1:])]
+
+
+class ShardPlanner:
+    """
+    Планирование набора аккаунтов над каталогом и колодами ротации.
+    Один и тот же код работает в процессе приложения (общие колоды и
+    распределитель) и в воркере пула (их копии из снимка).
+    """
+
+    def __init__(
+        self,
+        rotation: VideoRotation,
+        allocator: FolderAllocator,
+        accept: Callable[[VideoEntry], bool],
+        duplicates: Callable[[VideoEntry], Iterable[int]]
+    ):
+        self.rotation = rotation
+        self.allocator = allocator
+        self.accept = accept
+        self.duplicates = duplicates
+        # Свой генератор со свежей энтропией ОС: в воркере пула создается заново, а не копируется из родителя
+        self.rng = np.random.default_rng()
+
+    async def plan(
+        self,
+        db: Optional[AsyncSession],
+        accounts: Sequence[AccountPlan],
+        folders: Sequence[Any]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Строки задач по аккаунтам"""
+        # Сколько постов недостает в каждом дне плана каждого аккаунта
+        slots = []
+        for account in accounts:
+            day = account.start.replace(hour=0, minute=0, second=0, microsecond=0)
+            while day < account.until:
+                existing = account.existing.get(day.date(), [])
+                missing = calculate_daily_posts(account.daily_limit, day) - len(existing)
+                if missing > 0:
+                    slots.append((account, day, missing, existing))
+                day += timedelta(days=1)
+
+        # Времена публикаций всех аккаунтов и дней - одной векторной генерацией
+        times = generate_posting_times(
+            [day for _, day, _, _ in slots],
+            [missing for _, _, missing, _ in slots],
+            [existing for _, _, _, existing in slots],
+            self.rng
+        )
+
+        planned = {account.account_id: [] for account in accounts}
+        previous = None
+        for (account, day, _, _), day_times in zip(slots, times):
+            day_tasks = await self._create_daily_tasks(db, account, day_times, folders)
+            planned[account.account_id].extend(day_tasks)
+            logger.debug(f"📝 MediaFlux Hub: {len(day_tasks)} задач для @{account.username} на {day.strftime('%Y-%m-%d')}")
+
+            # В процессе приложения не держим event loop на весь план
+            if account is not previous:
+                previous = account
+                await asyncio.sleep(0)
+        return planned
+
+    async def _create_daily_tasks(
+        self,
+        db: Optional[AsyncSession],
+        account: AccountPlan,
+        posting_times: Sequence[datetime],
+        folders: Sequence[Any]
+    ) -> List[Dict[str, Any]]:
+        """Строки задач публикации на день (времена раньше начала плана пропускаются)"""
+        tasks = []
+
+        for post_time in posting_times:
+            if post_time < account.start:
+                continue
+
+            # Папка по квотам posts_per_week и остатку невыданных видео аккаунта
+            folder = await self.allocator.draw(db, account.account_id, folders)
+            if not folder:
+                logger.warning(f"⚠️ MediaFlux Hub: Нет папок с квотой публикаций для @{account.username}")
+                break
+
+            # Следующая карта колоды; негодные для Reels и дубликаты выданных аккаунту видео пропускаются
+            video = await self.rotation.draw(
+                db, account.account_id, folder.folder_id,
+                accept=self.accept,
+                duplicates=self.duplicates
+            )
+            if not video:
+                logger.warning(f"⚠️ MediaFlux Hub: Нет видео в папке {folder.name} для @{account.username}")
+                self.allocator.exclude(account.account_id, folder.folder_id)
+                continue
+
+            # Строка задачи для пакетной вставки (описание генерируется при предзагрузке или публикации)
+            tasks.append({
+                'task_id': new_task_id(),
+                'account_id': account.account_id,
+                'video_path': video.path,
+                'folder_id': folder.folder_id,
+                'scheduled_time': post_time,
+                'status': 'pending'
+            })
+
+        return tasks
+
+
+def plan_shard(
+    snapshot: PlanningSnapshot,
+    decks: Dict[Tuple[str, str], Deck],
+    accounts: List[AccountPlan]
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[Tuple[str, str], Deck]]:
+    """
+    Планирование шарда в воркере пула. Возвращает строки задач по аккаунтам
+    и измененные колоды. Без обращений к БД: все нужное - в снимке.
+    """
+    # Воркеры порождаются fork из процесса forkserver и наследуют его состояние генератора - у каждого шарда должно быть свое
+    random.seed()
+
+    catalog = VideoCatalog()
+    catalog.load_snapshot(snapshot.videos, snapshot.versions)
+    rotation = VideoRotation(catalog)
+    rotation.adopt(decks, [account.account_id for account in accounts], dirty=False)
+
+    planner = ShardPlanner(
+        rotation,
+        FolderAllocator(catalog, rotation),
+        accept=lambda entry: entry.video_id not in snapshot.rejected,
+        duplicates=lambda entry: snapshot.duplicates.get(entry.video_id, ())
+    )
+    planned = asyncio.run(planner.plan(None, accounts, snapshot.folders))
+    return planned, rotation.export(dirty_only=True)
+
+
+class FleetPlanner:
+    """
+    MediaFlux Hub - Планирование парка аккаунтов.
+
+    Небольшие планы считаются в процессе приложения на общих колодах.
+    Большие делятся на шарды аккаунтов по SCHEDULE_SHARD_SIZE и считаются
+    в пуле из SCHEDULE_PLANNER_WORKERS процессов: каждому шарду отдается
+    снимок каталога (годность и дубликаты видео уже посчитаны) и колоды
+    его аккаунтов. Колоды одного аккаунта попадают только в его шард,
+    поэтому результаты шардов не пересекаются и просто сливаются.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self.stats = {'runs': 0, 'parallel_runs': 0, 'shards': 0, 'accounts': 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = new_process_pool(settings.SCHEDULE_PLANNER_WORKERS)
+        return self._executor
+
+    async def plan(
+        self,
+        db: AsyncSession,
+        accounts: List[AccountPlan],
+        folders: Sequence[Any]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Строки задач по аккаунтам; колоды общей ротации обновляются (сохранение - за вызывающим)"""
+        self.stats['runs'] += 1
+        self.stats['accounts'] += len(accounts)
+
+        shard_size = max(1, settings.SCHEDULE_SHARD_SIZE)
+        if settings.SCHEDULE_PLANNER_WORKERS <= 0 or len(accounts) <= shard_size:
+            planner = ShardPlanner(video_rotation, folder_allocator, video_prober.accepts, video_fingerprinter.duplicates_of)
+            return await planner.plan(db, accounts, folders)
+
+        await video_rotation.preload(db, [account.account_id for account in accounts])
+        snapshot = self._snapshot(folders)
+        shard_count = min(math.ceil(len(accounts) / shard_size), settings.SCHEDULE_PLANNER_WORKERS * 4)
+        shard_size = math.ceil(len(accounts) / shard_count)
+        shards = [accounts[start:start + shard_size] for start in range(0, len(accounts), shard_size)]
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                self._pool(),
+                plan_shard,
+                snapshot,
+                video_rotation.export([account.account_id for account in shard]),
+                shard
+            )
+            for shard in shards
+        ))
+
+        planned: Dict[str, List[Dict[str, Any]]] = {}
+        for shard_planned, decks in results:
+            planned.update(shard_planned)
+            video_rotation.adopt(decks, shard_planned.keys())
+
+        self.stats['parallel_runs'] += 1
+        self.stats['shards'] += len(shards)
+        logger.info(f"🧮 MediaFlux Hub: План {len(accounts)} аккаунтов посчитан в {len(shards)} шардах")
+        return planned
+
+    @staticmethod
+    def _snapshot(folders: Sequence[Any]) -> PlanningSnapshot:
+        videos = video_catalog.entries()
+        return PlanningSnapshot(
+            folders=[
+                PlannedFolder(folder.folder_id, folder.name, folder.posts_per_week, bool(folder.is_active))
+                for folder in folders
+            ],
+            videos=videos,
+            versions={folder.folder_id: video_catalog.version(folder.folder_id) for folder in folders},
+            rejected={entry.video_id for entry in videos if not video_prober.accepts(entry)},
+            duplicates={
+                entry.video_id: duplicates
+                for entry in videos
+                if (duplicates := video_fingerprinter.duplicates_of(entry))
+            }
+        )
+
+    def get_planner_stats(self) -> Dict[str, int]:
+        """Статистика планирования"""
+        return dict(self.stats)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+# Общий планировщик парка процесса
+fleet_planner = FleetPlanner()
@@ -0,0 +1,165 @@
+"""
+MediaFlux Hub - Folder Allocator
+Распределение публикаций аккаунта по папкам с учетом квот posts_per_week и остатка видео
+"""
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ContentFolder
+from app.services.video_catalog import VideoCatalog, video_catalog
+from app.services.video_rotation import VideoRotation, video_rotation
+
+logger = logging.getLogger("mediaflux_hub.allocator")
+
+# Квота папки, у которой posts_per_week не заполнен (значение по умолчанию колонки)
+DEFAULT_POSTS_PER_WEEK = 7
+
+
+class AliasTable:
+    """Таблица псевдонимов (метод Vose): выбор индекса с вероятностью по весу за O(1)"""
+
+    def __init__(self, weights: Sequence[float]):
+        count = len(weights)
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        # Столбцы, оставшиеся без пары из-за округления float, получают вероятность 1
+        self.probability = [1.0] * count
+        self.alias = list(range(count))
+
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+    def draw(self, rng: random.Random = random) -> int:
+        column = rng.randrange(len(self.probability))
+        return column if rng.random() < self.probability[column] else self.alias[column]
+
+
+@dataclass
+class Allocation:
+    """Таблица выбора папок аккаунта"""
+    signature: Tuple
+    folders: List[ContentFolder]
+    remaining: Dict[str, int]
+    excluded: Set[str] = field(default_factory=set)
+    candidates: List[ContentFolder] = field(default_factory=list)
+    table: Optional[AliasTable] = None
+    stale: bool = False
+
+
+class FolderAllocator:
+    """
+    MediaFlux Hub - Распределитель папок для планировщика.
+
+    Вес папки для аккаунта - min(posts_per_week, невыданных видео в колоде):
+    публикации недели делятся пропорционально квотам, а папка, в которой
+    аккаунту осталось мало видео, получает меньше и не уходит в новый цикл
+    колоды раньше остальных. Если невыданных видео не осталось нигде,
+    веса - чистые квоты.
+
+    Таблица псевдонимов строится на аккаунт и дает выбор папки за O(1).
+    Полный пересчет (с чтением остатков колод) - только при изменении
+    набора папок, квот или состава каталога, а также когда у папки
+    кончился учтенный остаток; между ними остаток ведется по выдачам.
+    """
+
+    def __init__(self, catalog: VideoCatalog = video_catalog, rotation: VideoRotation = video_rotation):
+        self.catalog = catalog
+        self.rotation = rotation
+        self._allocations: Dict[str, Allocation] = {}
+
+        self.stats = {'draws': 0, 'builds': 0, 'rebuilds': 0, 'excluded': 0}
+
+    def _signature(self, folders: Sequence[ContentFolder]) -> Tuple:
+        return tuple(
+            (folder.folder_id, self._quota(folder), self.catalog.version(folder.folder_id))
+            for folder in folders
+        )
+
+    @staticmethod
+    def _quota(folder: ContentFolder) -> int:
+        quota = folder.posts_per_week if folder.posts_per_week is not None else DEFAULT_POSTS_PER_WEEK
+        return max(quota, 0)
+
+    async def _allocation(self, db: AsyncSession, account_id: str, folders: Sequence[ContentFolder]) -> Allocation:
+        """Таблица аккаунта; пересчитывается, если изменились папки, квоты или каталог"""
+        folders = [folder for folder in folders if folder.is_active and self._quota(folder) > 0]
+        signature = self._signature(folders)
+
+        allocation = self._allocations.get(account_id)
+        if allocation is None or allocation.signature != signature:
+            allocation = Allocation(signature=signature, folders=folders, remaining={})
+            await self._load_remaining(db, account_id, allocation)
+            self._build(allocation)
+            self._allocations[account_id] = allocation
+            self.stats['builds'] += 1
+        return allocation
+
+    async def _load_remaining(self, db: AsyncSession, account_id: str, allocation: Allocation):
+        for folder in allocation.folders:
+            allocation.remaining[folder.folder_id] = await self.rotation.remaining(db, account_id, folder.folder_id)
+
+    def _build(self, allocation: Allocation):
+        folders = [folder for folder in allocation.folders if folder.folder_id not in allocation.excluded]
+        weights = [min(self._quota(folder), allocation.remaining[folder.folder_id]) for folder in folders]
+        if not any(weights):
+            # Колоды всех папок выданы до конца - следующие выдачи начнут новые циклы
+            weights = [self._quota(folder) for folder in folders]
+
+        allocation.candidates = [folder for folder, weight in zip(folders, weights) if weight > 0]
+        allocation.table = AliasTable([weight for weight in weights if weight > 0]) if allocation.candidates else None
+
+    async def draw(self, db: AsyncSession, account_id: str, folders: Sequence[ContentFolder]) -> Optional[ContentFolder]:
+        """Папка для следующей публикации аккаунта; None - выбирать не из чего"""
+        allocation = await self._allocation(db, account_id, folders)
+        if allocation.stale:
+            # Учтенный остаток папки кончился: перечитываем колоды (в них могли вернуться видео)
+            await self._load_remaining(db, account_id, allocation)
+            self._build(allocation)
+            allocation.stale = False
+            self.stats['rebuilds'] += 1
+        if allocation.table is None:
+            return None
+
+        folder = allocation.candidates[allocation.table.draw()]
+        self.stats['draws'] += 1
+
+        # Остаток ведется по выдачам; колоды перечитываются при следующем выборе после исчерпания
+        remaining = allocation.remaining[folder.folder_id] - 1
+        allocation.remaining[folder.folder_id] = max(remaining, 0)
+        allocation.stale = remaining == 0
+        return folder
+
+    def exclude(self, account_id: str, folder_id: str):
+        """
+        Папка, из которой не удалось выдать видео, не участвует в выборе
+        до конца прохода планирования (или изменения каталога и квот)
+        """
+        allocation = self._allocations.get(account_id)
+        if allocation is None or folder_id in allocation.excluded:
+            return
+        allocation.excluded.add(folder_id)
+        self._build(allocation)
+        self.stats['excluded'] += 1
+        logger.debug(f"📁 MediaFlux Hub: Папка {folder_id} исключена из распределения для {account_id}")
+
+    def invalidate(self):
+        """Сброс таблиц (после прохода планирования или отката его транзакции)"""
+        self._allocations.clear()
+
+    def get_allocator_stats(self) -> Dict[str, int]:
+        """Статистика распределителя"""
+        return {'accounts': len(self._allocations), **self.stats}
+
+
+# Общий распределитель папок процесса
+folder_allocator = FolderAllocator()
@@ -0,0 +1,117 @@
+"""
+MediaFlux Hub - HTTP Sessions
+Реестр долгоживущих aiohttp сессий по (прокси, user-agent)
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+from app.config import settings
+
+logger = logging.getLogger("mediaflux_hub.http")
+
+SessionKey = Tuple[Optional[str], Optional[str], bool]
+
+
+@dataclass
+class PooledSession:
+    """Сессия реестра и время ее последнего использования"""
+    session: aiohttp.ClientSession
+    last_used: float
+
+
+class HTTPSessionRegistry:
+    """
+    MediaFlux Hub - Реестр HTTP сессий.
+
+    Одна сессия с пулом keep-alive соединений и DNS-кэшем на каждую пару
+    (прокси, user-agent). Неиспользуемые сессии закрываются по таймауту,
+    все остальные - при остановке приложения (close_all).
+    """
+
+    def __init__(self):
+        self._sessions: Dict[SessionKey, PooledSession] = {}
+        self._evictor_task: Optional[asyncio.Task] = None
+
+    def get(
+        self,
+        proxy: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        verify_ssl: bool = True
+    ) -> aiohttp.ClientSession:
+        """Получение (или создание) сессии для прокси и user-agent"""
+        key = (proxy, user_agent, verify_ssl)
+        pooled = self._sessions.get(key)
+
+        if not pooled or pooled.session.closed:
+            pooled = PooledSession(session=self._create_session(user_agent, verify_ssl), last_used=0)
+            self._sessions[key] = pooled
+            logger.debug(f"🔌 MediaFlux Hub: Новая HTTP сессия (proxy={proxy or '-'}), всего: {len(self._sessions)}")
+
+        pooled.last_used = time.monotonic()
+
+        if not self._evictor_task or self._evictor_task.done():
+            self._evictor_task = asyncio.create_task(self._evict_idle_sessions())
+
+        return pooled.session
+
+    def _create_session(self, user_agent: Optional[str], verify_ssl: bool) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ssl=None if verify_ssl else False
+        )
+        headers = {'User-Agent': user_agent} if user_agent else None
+
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=settings.UPLOAD_TIMEOUT)
+        )
+
+    async def _evict_idle_sessions(self):
+        """Закрытие сессий, которые давно не использовались"""
+        while self._sessions:
+            await asyncio.sleep(settings.HTTP_SESSION_IDLE_SECONDS / 2)
+
+            now = time.monotonic()
+            idle_keys = [
+                key for key, pooled in self._sessions.items()
+                if now - pooled.last_used > settings.HTTP_SESSION_IDLE_SECONDS
+            ]
+
+            for key in idle_keys:
+                pooled = self._sessions.pop(key)
+                await pooled.session.close()
+
+            if idle_keys:
+                logger.debug(f"🔌 MediaFlux Hub: Закрыто {len(idle_keys)} неактивных HTTP сессий")
+
+    async def close_all(self):
+        """Закрытие всех сессий (при остановке приложения)"""
+        if self._evictor_task:
+            self._evictor_task.cancel()
+            self._evictor_task = None
+
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+
+        for pooled in sessions:
+            await pooled.session.close()
+
+        if sessions:
+            logger.info(f"🔌 MediaFlux Hub: Закрыто {len(sessions)} HTTP сессий")
+
+    def get_registry_stats(self):
+        """Статистика реестра"""
+        return {'sessions': len(self._sessions)}
+
+
+# Общий реестр процесса, закрывается в lifespan приложения
+http_sessions = HTTPSessionRegistry()
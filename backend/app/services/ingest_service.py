@@ -0,0 +1,389 @@
+"""
+MediaFlux Hub - Ingest Service
+Потоковый прием видео с докачкой: запись частями, хеш на лету, дедупликация и атомарная фиксация
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, AsyncIterable, Dict, List, Optional
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.repositories.content_folders import ContentFolderRepository
+from app.repositories.videos import VideoRepository
+from app.services.content_service import MediaFluxContentService
+from app.services.video_catalog import video_catalog
+
+logger = logging.getLogger("mediaflux_hub.ingest")
+
+# Незавершенные загрузки лежат внутри папки категории: финальный rename не пересекает ФС,
+# а каталог (не рекурсивный) и наблюдатель их не видят
+UPLOADS_DIR = ".uploads"
+CATEGORY_PATTERN = re.compile(r'^[\w-]{1,64}$')
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class IngestError(Exception):
+    """Отказ в приеме видео; status_code - HTTP статус для API"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class Upload:
+    """Загрузка видео; offset - сколько байт уже принято"""
+    upload_id: str
+    category: str
+    filename: str
+    length: int
+    created_at: float
+    sha256: Optional[str] = None  # Заявленный клиентом хеш, для дедупликации до загрузки
+    offset: int = 0
+    state: str = 'uploading'  # uploading, complete, duplicate
+    video_path: Optional[str] = None
+    content_hash: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _sanitize_filename(filename: str) -> str:
+    """Имя файла без пути и служебных символов"""
+    name = re.sub(r'[^\w.\- ]', '_', os.path.basename(filename or '')).strip(' .')
+    return name or 'video.mp4'
+
+
+def _append(path: str, data: bytes, digest) -> None:
+    """Дозапись части и обновление хеша (в потоке)"""
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    digest.update(data)
+
+
+def _resume_digest(path: str, chunk_size: int):
+    """Хеш уже принятой части файла (после перезапуска процесса)"""
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest
+
+
+def _commit_file(part_path: str, directory: str, filename: str) -> str:
+    """
+    Атомарный перенос принятого файла в папку категории без перезаписи
+    существующих: os.link падает, если имя занято, и тогда берется следующее.
+    """
+    stem, ext = os.path.splitext(filename)
+    for attempt in itertools.count():
+        target = os.path.join(directory, filename if attempt == 0 else f"{stem}_{attempt}{ext}")
+        try:
+            os.link(part_path, target)
+        except FileExistsError:
+            continue
+        except OSError:
+            # ФС без жестких ссылок
+            if os.path.exists(target):
+                continue
+            os.replace(part_path, target)
+            return target
+        os.remove(part_path)
+        return target
+
+
+class VideoIngest:
+    """
+    MediaFlux Hub - Прием видео.
+
+    Протокол докачки в духе tus: загрузка создается с известной длиной,
+    затем данные дописываются PATCH-запросами с указанием смещения. Оборванная
+    передача продолжается с принятого смещения, которое хранится на диске
+    (размер .part файла), поэтому переживает и обрыв связи, и перезапуск
+    процесса. Данные пишутся частями по INGEST_WRITE_BUFFER в потоке, sha256
+    считается на лету. По готовности видео сверяется с каталогом по хешу:
+    копия уже известного видео удаляется, новое атомарно переносится в папку
+    категории и сразу регистрируется в каталоге вместе с хешем.
+    """
+
+    def __init__(self, content_service: MediaFluxContentService):
+        self.content_service = content_service
+        self._uploads: Dict[str, Upload] = {}
+        self._digests: Dict[str, Any] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        self.stats = {'created': 0, 'completed': 0, 'duplicates': 0, 'resumed': 0, 'expired': 0, 'bytes_received': 0}
+
+    @property
+    def base_path(self) -> Path:
+        return self.content_service.content_base_path
+
+    def _uploads_dir(self, category: str) -> Path:
+        return self.base_path / category / UPLOADS_DIR
+
+    def _part_path(self, upload: Upload) -> str:
+        return str(self._uploads_dir(upload.category) / f"{upload.upload_id}.part")
+
+    def _info_path(self, upload: Upload) -> str:
+        return str(self._uploads_dir(upload.category) / f"{upload.upload_id}.json")
+
+    async def create(self, category: str, filename: str, length: int, sha256: Optional[str] = None) -> Upload:
+        """Создание загрузки; заранее известная копия сразу отмечается как duplicate"""
+        if not CATEGORY_PATTERN.match(category or ''):
+            raise IngestError(f"Недопустимое имя категории: {category}")
+
+        filename = _sanitize_filename(filename)
+        if os.path.splitext(filename)[1].lower() not in {ext.lower() for ext in settings.ALLOWED_VIDEO_EXTENSIONS}:
+            raise IngestError(f"Неподдерживаемый формат: {filename}", 415)
+        if length <= 0:
+            raise IngestError("Пустой файл")
+        if length > settings.MAX_VIDEO_SIZE_MB * 1024 * 1024:
+            raise IngestError(f"Файл больше {settings.MAX_VIDEO_SIZE_MB} MB", 413)
+
+        upload = Upload(
+            upload_id=secrets.token_hex(16),
+            category=category,
+            filename=filename,
+            length=length,
+            created_at=time.time(),
+            sha256=sha256.lower() if sha256 else None
+        )
+
+        existing = self._find_duplicate(upload.sha256) if upload.sha256 else None
+        if existing:
+            upload.state, upload.video_path, upload.content_hash = 'duplicate', existing, upload.sha256
+            upload.offset = length
+            self.stats['duplicates'] += 1
+        else:
+            await asyncio.to_thread(self._create_files, upload)
+
+        self._uploads[upload.upload_id] = upload
+        self.stats['created'] += 1
+        return upload
+
+    def _create_files(self, upload: Upload):
+        self._uploads_dir(upload.category).mkdir(parents=True, exist_ok=True)
+        open(self._part_path(upload), 'wb').close()
+        with open(self._info_path(upload), 'w') as f:
+            json.dump(upload.as_dict(), f)
+
+    async def get(self, upload_id: str) -> Upload:
+        """Загрузка по ID; после перезапуска процесса восстанавливается с диска"""
+        upload = self._uploads.get(upload_id)
+        if upload:
+            return upload
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise IngestError("Загрузка не найдена", 404)
+
+        upload = await asyncio.to_thread(self._load, upload_id)
+        if upload is None:
+            raise IngestError("Загрузка не найдена", 404)
+        self._uploads[upload_id] = upload
+        return upload
+
+    def _load(self, upload_id: str) -> Optional[Upload]:
+        for info_path in self.base_path.glob(f"*/{UPLOADS_DIR}/{upload_id}.json"):
+            with open(info_path) as f:
+                upload = Upload(**json.load(f))
+            try:
+                upload.offset = os.path.getsize(self._part_path(upload))
+            except FileNotFoundError:
+                return None
+            return upload
+        return None
+
+    async def write(self, upload_id: str, offset: int, chunks: AsyncIterable[bytes]) -> Upload:
+        """
+        Дозапись данных с указанного смещения. Принятое до обрыва передачи
+        сохраняется: клиент продолжит с нового смещения.
+        """
+        upload = await self.get(upload_id)
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        if lock.locked():
+            raise IngestError("Загрузка уже принимает данные", 409)
+
+        async with lock:
+            if upload.state != 'uploading':
+                raise IngestError("Загрузка уже завершена", 409)
+            if offset != upload.offset:
+                raise IngestError(f"Смещение {offset} не совпадает с принятым {upload.offset}", 409)
+
+            part_path = self._part_path(upload)
+            digest = self._digests.get(upload_id)
+            if digest is None:
+                if upload.offset:
+                    self.stats['resumed'] += 1
+                digest = await asyncio.to_thread(_resume_digest, part_path, settings.HASH_CHUNK_SIZE)
+                self._digests[upload_id] = digest
+
+            buffer = bytearray()
+            try:
+                async for chunk in chunks:
+                    if upload.offset + len(buffer) + len(chunk) > upload.length:
+                        raise IngestError("Данных больше заявленной длины", 413)
+                    buffer += chunk
+                    if len(buffer) >= settings.INGEST_WRITE_BUFFER:
+                        await self._flush(upload, part_path, buffer, digest)
+            finally:
+                # Обрыв передачи: принятое сохраняется
+                await self._flush(upload, part_path, buffer, digest)
+
+            if upload.offset == upload.length:
+                await self._finalize(upload, part_path, digest.hexdigest())
+
+        return upload
+
+    async def _flush(self, upload: Upload, part_path: str, buffer: bytearray, digest):
+        if not buffer:
+            return
+        data = bytes(buffer)
+        buffer.clear()
+        await asyncio.to_thread(_append, part_path, data, digest)
+        upload.offset += len(data)
+        self.stats['bytes_received'] += len(data)
+
+    def _find_duplicate(self, content_hash: str) -> Optional[str]:
+        entry = video_catalog.by_hash(content_hash)
+        return entry.path if entry and os.path.exists(entry.path) else None
+
+    async def _finalize(self, upload: Upload, part_path: str, content_hash: str):
+        """Дедупликация по хешу и перенос в папку категории"""
+        self._digests.pop(upload.upload_id, None)
+        self._locks.pop(upload.upload_id, None)
+        upload.content_hash = content_hash
+
+        if upload.sha256 and upload.sha256 != content_hash:
+            await asyncio.to_thread(self._remove_files, upload)
+            raise IngestError("sha256 принятого файла не совпадает с заявленным", 460)
+
+        existing = self._find_duplicate(content_hash)
+        if existing:
+            await asyncio.to_thread(self._remove_files, upload)
+            upload.state, upload.video_path = 'duplicate', existing
+            self.stats['duplicates'] += 1
+            logger.info(f"♻️ MediaFlux Hub: {upload.filename} - копия уже известного видео {os.path.basename(existing)}")
+            return
+
+        folder_path = self.base_path / upload.category
+        upload.video_path = await asyncio.to_thread(_commit_file, part_path, str(folder_path), upload.filename)
+        await asyncio.to_thread(self._remove_files, upload)
+        await self._register(folder_path, upload.video_path, content_hash)
+
+        upload.state = 'complete'
+        self.stats['completed'] += 1
+        logger.info(f"📥 MediaFlux Hub: Принято видео {os.path.basename(upload.video_path)} в {upload.category}")
+
+    async def _register(self, folder_path: Path, video_path: str, content_hash: str):
+        """Регистрация видео в каталоге вместе с уже посчитанным хешем"""
+        async with AsyncSessionLocal() as db:
+            try:
+                folder_repository = ContentFolderRepository(db)
+                folder = await folder_repository.get_by_path(str(folder_path))
+                if folder is None:
+                    folder = await self.content_service.sync_folder(db, folder_path, folder_repository)
+                else:
+                    stat = await asyncio.to_thread(os.stat, video_path)
+                    await video_catalog.apply_changes(
+                        db, folder.folder_id, {video_path: (stat.st_size, stat.st_mtime_ns, stat.st_ino)}, []
+                    )
+                    await folder_repository.set_total_videos(folder, len(video_catalog.videos(folder.folder_id)))
+
+                entry = video_catalog.get(folder.folder_id, video_path) if folder else None
+                if entry:
+                    await VideoRepository(db).set_content_hash(
+                        entry.video_id, content_hash, entry.size, entry.mtime_ns, entry.inode
+                    )
+                    video_catalog.set_content_hash(entry, content_hash)
+                await db.commit()
+            except Exception as e:
+                # Файл уже на месте: его подхватят наблюдатель или сверка
+                await db.rollback()
+                video_catalog.invalidate()
+                logger.error(f"💥 MediaFlux Hub: Ошибка регистрации видео {video_path}: {e}")
+
+    async def terminate(self, upload_id: str):
+        """Отмена загрузки с удалением принятых данных"""
+        upload = await self.get(upload_id)
+        lock = self._locks.get(upload_id)
+        if lock and lock.locked():
+            raise IngestError("Загрузка принимает данные", 409)
+
+        if upload.state == 'uploading':
+            await asyncio.to_thread(self._remove_files, upload)
+        self._uploads.pop(upload_id, None)
+        self._digests.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+
+    def _remove_files(self, upload: Upload):
+        for path in (self._part_path(upload), self._info_path(upload)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def cleanup_expired(self) -> int:
+        """Удаление загрузок, не завершенных за INGEST_UPLOAD_EXPIRE_HOURS"""
+        expire_before = time.time() - settings.INGEST_UPLOAD_EXPIRE_HOURS * 3600
+
+        def expired_uploads() -> List[Upload]:
+            uploads = []
+            for info_path in self.base_path.glob(f"*/{UPLOADS_DIR}/*.json"):
+                try:
+                    with open(info_path) as f:
+                        upload = Upload(**json.load(f))
+                except (OSError, ValueError, TypeError):
+                    continue
+                if upload.created_at < expire_before:
+                    uploads.append(upload)
+            return uploads
+
+        removed = 0
+        for upload in await asyncio.to_thread(expired_uploads):
+            lock = self._locks.get(upload.upload_id)
+            if lock and lock.locked():
+                continue
+            await asyncio.to_thread(self._remove_files, upload)
+            self._uploads.pop(upload.upload_id, None)
+            self._digests.pop(upload.upload_id, None)
+            removed += 1
+
+        # Завершенные загрузки хранятся в памяти для GET статуса, но не дольше срока
+        for upload_id, upload in list(self._uploads.items()):
+            if upload.state != 'uploading' and upload.created_at < expire_before:
+                del self._uploads[upload_id]
+
+        self.stats['expired'] += removed
+        if removed:
+            logger.info(f"🧹 MediaFlux Hub: Удалено незавершенных загрузок: {removed}")
+        return removed
+
+    def expires_at(self, upload: Upload) -> float:
+        """Время, после которого незавершенная загрузка будет удалена"""
+        return upload.created_at + settings.INGEST_UPLOAD_EXPIRE_HOURS * 3600
+
+    def get_ingest_stats(self) -> Dict[str, int]:
+        """Статистика приема видео"""
+        return {
+            'active': sum(1 for upload in self._uploads.values() if upload.state == 'uploading'),
+            **self.stats
+        }
+
+
+# Общий прием видео процесса
+video_ingest = VideoIngest(MediaFluxContentService())
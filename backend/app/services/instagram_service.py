@@ -11,8 +11,11 @@ from datetime import datetime, timedelta
 import json
 
 from app.config import settings
-from app.database import SessionLocal, Account
+from app.database import AsyncSessionLocal, Account
+from app.repositories.accounts import AccountRepository
 from app.services.proxy_service import ProxyManager
+from app.services.container_poller import container_poller
+from app.services.http_sessions import http_sessions
 
 logger = logging.getLogger("mediaflux_hub.instagram")
 
@@ -53,7 +56,7 @@ class MediaFluxHubAPIService:
             await self._apply_antiban_delay()
             
             # Создаем контейнер
-            container_id = await self._create_container(
+            container_id = await self.create_container(
                 account, video_url, caption, share_to_feed, proxy
             )
             
@@ -63,7 +66,7 @@ class MediaFluxHubAPIService:
             logger.info(f"✅ MediaFlux Hub: Контейнер создан {container_id}")
             
             # Ожидаем обработки
-            if not await self._wait_for_processing(container_id, account.access_token, proxy):
+            if not await self.wait_for_processing(container_id, account.access_token, proxy):
                 return False, "⏰ Таймаут обработки видео"
             
             logger.info(f"✅ MediaFlux Hub: Видео обработано {container_id}")
@@ -72,7 +75,7 @@ class MediaFluxHubAPIService:
             await asyncio.sleep(random.uniform(5, 15))
             
             # Публикуем
-            media_id = await self._publish_container(container_id, account, proxy)
+            media_id = await self.publish_container(container_id, account, proxy)
             
             if media_id:
                 # Обновляем время последней публикации
@@ -87,11 +90,11 @@ class MediaFluxHubAPIService:
             logger.error(f"💥 MediaFlux Hub: Критическая ошибка загрузки Reel для @{account.username}: {e}")
             
             # Обработка специфичных ошибок Instagram
-            await self._handle_instagram_error(e, account.id)
+            await self.handle_instagram_error(e, account.id)
             
             return False, str(e)
     
-    async def _create_container(
+    async def create_container(
         self, 
         account: Account, 
         video_url: str, 
@@ -113,46 +116,51 @@ class MediaFluxHubAPIService:
             'thumb_offset': random.randint(1000, 5000)  # Случайное превью
         }
         
-        connector = aiohttp.TCPConnector(ssl=False)
+        session = http_sessions.get(proxy, account.user_agent, verify_ssl=False)
         timeout = aiohttp.ClientTimeout(total=settings.UPLOAD_TIMEOUT)
         
-        async with aiohttp.ClientSession(
-            connector=connector,
-            timeout=timeout,
-            headers=headers
-        ) as session:
-            
-            kwargs = {'data': data}
-            if proxy:
-                kwargs['proxy'] = proxy
-            
-            try:
-                async with session.post(url, **kwargs) as response:
-                    response_text = await response.text()
+        kwargs = {'data': data, 'headers': headers, 'timeout': timeout}
+        if proxy:
+            kwargs['proxy'] = proxy
+        
+        try:
+            async with session.post(url, **kwargs) as response:
+                response_text = await response.text()
+                
+                if response.status == 200:
+                    result = json.loads(response_text)
+                    return result.get('id')
+                else:
+                    error_data = json.loads(response_text) if response_text else {}
+                    error_msg = error_data.get('error', {}).get('message', 'Unknown error')
+                    
+                    logger.error(f"💥 MediaFlux Hub: Instagram API Error: {response.status} - {error_msg}")
                     
-                    if response.status == 200:
-                        result = json.loads(response_text)
-                        return result.get('id')
-                    else:
-                        error_data = json.loads(response_text) if response_text else {}
-                        error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                        
-                        logger.error(f"💥 MediaFlux Hub: Instagram API Error: {response.status} - {error_msg}")
-                        
-                        # Обработка rate limiting
-                        if response.status == 429:
-                            await self._handle_rate_limit(account.id)
-                        
-                        return None
-                        
-            except asyncio.TimeoutError:
-                logger.error(f"⏰ MediaFlux Hub: Таймаут создания контейнера для @{account.username}")
-                return None
-            except Exception as e:
-                logger.error(f"💥 MediaFlux Hub: Ошибка запроса создания контейнера: {e}")
-                return None
+                    # Обработка rate limiting
+                    if response.status == 429:
+                        await self._handle_rate_limit(account.id)
+                    
+                    return None
+                    
+        except asyncio.TimeoutError:
+            logger.error(f"⏰ MediaFlux Hub: Таймаут создания контейнера для @{account.username}")
+            return None
+        except Exception as e:
+            logger.error(f"💥 MediaFlux Hub: Ошибка запроса создания контейнера: {e}")
+            return None
+    
+    def watch_processing(
+        self, 
+        container_id: str, 
+        access_token: str,
+        proxy: Optional[str],
+        max_wait: int = 300
+    ) -> asyncio.Future:
+        """Регистрация контейнера в общем опросчике статусов"""
+        logger.info(f"⏳ MediaFlux Hub: Ожидание обработки контейнера {container_id}...")
+        return container_poller.watch(container_id, access_token, proxy, max_wait)
     
-    async def _wait_for_processing(
+    async def wait_for_processing(
         self, 
         container_id: str, 
         access_token: str,
@@ -160,55 +168,10 @@ class MediaFluxHubAPIService:
         max_wait: int = 300
     ) -> bool:
         """Ожидание обработки видео Instagram"""
-        url = f"{self.base_url}/{container_id}"
-        params = {
-            'access_token': access_token,
-            'fields': 'status_code'
-        }
-        
-        start_time = asyncio.get_event_loop().time()
-        check_interval = 10  # Проверяем каждые 10 секунд
-        
         logger.info(f"⏳ MediaFlux Hub: Ожидание обработки контейнера {container_id}...")
-        
-        async with aiohttp.ClientSession() as session:
-            while (asyncio.get_event_loop().time() - start_time) < max_wait:
-                kwargs = {'params': params}
-                if proxy:
-                    kwargs['proxy'] = proxy
-                
-                try:
-                    async with session.get(url, **kwargs) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            status = result.get('status_code')
-                            
-                            logger.debug(f"📊 MediaFlux Hub: Статус контейнера {container_id}: {status}")
-                            
-                            if status == 'FINISHED':
-                                logger.info(f"✅ MediaFlux Hub: Контейнер {container_id} обработан!")
-                                return True
-                            elif status == 'ERROR':
-                                logger.error(f"💥 MediaFlux Hub: Ошибка обработки контейнера {container_id}")
-                                return False
-                            elif status in ['IN_PROGRESS', 'PUBLISHED']:
-                                # Продолжаем ждать
-                                pass
-                            
-                        else:
-                            logger.warning(f"⚠️ MediaFlux Hub: Ошибка проверки статуса: {response.status}")
-                    
-                    # Ждем перед следующей проверкой
-                    await asyncio.sleep(check_interval)
-                    
-                except Exception as e:
-                    logger.warning(f"⚠️ MediaFlux Hub: Ошибка при проверке статуса: {e}")
-                    await asyncio.sleep(check_interval)
-        
-        logger.error(f"⏰ MediaFlux Hub: Таймаут обработки контейнера {container_id}")
-        return False
+        return await container_poller.wait(container_id, access_token, proxy, max_wait)
     
-    async def _publish_container(
+    async def publish_container(
         self, 
         container_id: str, 
         account: Account,
@@ -224,34 +187,35 @@ class MediaFluxHubAPIService:
             'creation_id': container_id
         }
         
-        async with aiohttp.ClientSession(headers=headers) as session:
-            kwargs = {'data': data}
-            if proxy:
-                kwargs['proxy'] = proxy
-            
-            try:
-                async with session.post(url, **kwargs) as response:
-                    response_text = await response.text()
+        session = http_sessions.get(proxy, account.user_agent)
+        
+        kwargs = {'data': data, 'headers': headers}
+        if proxy:
+            kwargs['proxy'] = proxy
+        
+        try:
+            async with session.post(url, **kwargs) as response:
+                response_text = await response.text()
+                
+                if response.status == 200:
+                    result = json.loads(response_text)
+                    media_id = result.get('id')
                     
-                    if response.status == 200:
-                        result = json.loads(response_text)
-                        media_id = result.get('id')
-                        
-                        if media_id:
-                            # Генерируем ссылку на пост
-                            instagram_url = f"https://www.instagram.com/p/{media_id}/"
-                            logger.info(f"🔗 MediaFlux Hub: Пост доступен по ссылке: {instagram_url}")
-                        
-                        return media_id
-                    else:
-                        error_data = json.loads(response_text) if response_text else {}
-                        error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                        logger.error(f"💥 MediaFlux Hub: Ошибка публикации: {response.status} - {error_msg}")
-                        return None
-                        
-            except Exception as e:
-                logger.error(f"💥 MediaFlux Hub: Ошибка запроса публикации: {e}")
-                return None
+                    if media_id:
+                        # Генерируем ссылку на пост
+                        instagram_url = f"https://www.instagram.com/p/{media_id}/"
+                        logger.info(f"🔗 MediaFlux Hub: Пост доступен по ссылке: {instagram_url}")
+                    
+                    return media_id
+                else:
+                    error_data = json.loads(response_text) if response_text else {}
+                    error_msg = error_data.get('error', {}).get('message', 'Unknown error')
+                    logger.error(f"💥 MediaFlux Hub: Ошибка публикации: {response.status} - {error_msg}")
+                    return None
+                    
+        except Exception as e:
+            logger.error(f"💥 MediaFlux Hub: Ошибка запроса публикации: {e}")
+            return None
     
     async def get_media_insights(
         self, 
@@ -269,31 +233,32 @@ class MediaFluxHubAPIService:
         
         headers = self._get_headers(account.user_agent)
         
-        async with aiohttp.ClientSession(headers=headers) as session:
-            kwargs = {'params': params}
-            if proxy:
-                kwargs['proxy'] = proxy
-            
-            try:
-                async with session.get(url, **kwargs) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        insights_data = {}
-                        
-                        for insight in result.get('data', []):
-                            metric = insight.get('name')
-                            values = insight.get('values', [])
-                            if values:
-                                insights_data[metric] = values[0].get('value', 0)
-                        
-                        return insights_data
-                    else:
-                        logger.warning(f"⚠️ MediaFlux Hub: Не удалось получить статистику: {response.status}")
-                        return None
-                        
-            except Exception as e:
-                logger.error(f"💥 MediaFlux Hub: Ошибка получения статистики: {e}")
-                return None
+        session = http_sessions.get(proxy, account.user_agent)
+        
+        kwargs = {'params': params, 'headers': headers}
+        if proxy:
+            kwargs['proxy'] = proxy
+        
+        try:
+            async with session.get(url, **kwargs) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    insights_data = {}
+                    
+                    for insight in result.get('data', []):
+                        metric = insight.get('name')
+                        values = insight.get('values', [])
+                        if values:
+                            insights_data[metric] = values[0].get('value', 0)
+                    
+                    return insights_data
+                else:
+                    logger.warning(f"⚠️ MediaFlux Hub: Не удалось получить статистику: {response.status}")
+                    return None
+                    
+        except Exception as e:
+            logger.error(f"💥 MediaFlux Hub: Ошибка получения статистики: {e}")
+            return None
     
     def _get_headers(self, user_agent: Optional[str] = None) -> Dict[str, str]:
         """Генерация заголовков запроса"""
@@ -318,17 +283,11 @@ class MediaFluxHubAPIService:
         """Обработка rate limiting"""
         logger.warning(f"🚫 MediaFlux Hub: Rate limit для аккаунта {account_id}")
         
-        db = SessionLocal()
-        try:
-            account = db.query(Account).filter(Account.id == account_id).first()
-            if account:
-                account.status = 'limited'
-                account.updated_at = datetime.now()
-                db.commit()
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            if await AccountRepository(db).set_status(account_id, 'limited'):
+                await db.commit()
     
-    async def _handle_instagram_error(self, error: Exception, account_id: str):
+    async def handle_instagram_error(self, error: Exception, account_id: str):
         """Обработка ошибок Instagram API"""
         error_str = str(error).lower()
         
@@ -342,31 +301,18 @@ class MediaFluxHubAPIService:
     
     async def _mark_account_error(self, account_id: str, error_type: str):
         """Отметка аккаунта с ошибкой"""
-        db = SessionLocal()
-        try:
-            account = db.query(Account).filter(Account.id == account_id).first()
+        async with AsyncSessionLocal() as db:
+            account = await AccountRepository(db).set_status(account_id, 'error')
             if account:
-                account.status = 'error'
-                account.updated_at = datetime.now()
-                db.commit()
+                await db.commit()
                 
                 logger.error(f"💥 MediaFlux Hub: Аккаунт {account.username} помечен как error: {error_type}")
-        finally:
-            db.close()
     
     async def _update_account_last_post(self, account_id: str):
         """Обновление времени последней публикации"""
-        db = SessionLocal()
-        try:
-            account = db.query(Account).filter(Account.id == account_id).first()
-            if account:
-                account.last_post_time = datetime.now()
-                account.last_activity = datetime.now()
-                account.current_daily_posts += 1
-                account.updated_at = datetime.now()
-                db.commit()
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            await AccountRepository(db).record_post(account_id, datetime.now())
+            await db.commit()
 
 
 class AntiBanManager:
@@ -379,6 +325,9 @@ class AntiBanManager:
     # Дневные лимиты по типам аккаунтов
     DAILY_LIMITS = settings.DAILY_LIMITS
     
+    # Случайный сдвиг времени публикации
+    POSTING_TIME_JITTER_MINUTES = 30
+    
     @staticmethod
     async def can_post_now(account: Account) -> Tuple[bool, str]:
         """Проверка возможности публикации с учетом антибан-правил"""
@@ -404,7 +353,8 @@ class AntiBanManager:
     @staticmethod
     def randomize_posting_time(base_time: datetime) -> datetime:
         """Рандомизация времени публикации (±30 минут)"""
-        offset_minutes = random.randint(-30, 30)
+        jitter = AntiBanManager.POSTING_TIME_JITTER_MINUTES
+        offset_minutes = random.randint(-jitter, jitter)
         return base_time + timedelta(minutes=offset_minutes)
     
     @staticmethod
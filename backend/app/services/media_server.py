@@ -0,0 +1,142 @@
+"""
+MediaFlux Hub - Media Server
+Публикация видео по подписанным временным ссылкам на встроенный медиа-сервер
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.repositories.published_media import PublishedMediaRepository
+from app.services.content_hasher import content_hasher
+from app.services.video_catalog import video_catalog
+
+logger = logging.getLogger("mediaflux_hub.media")
+
+
+@dataclass
+class MediaFile:
+    """Файл, который отдает медиа-сервер"""
+    content_hash: str
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+class MediaServer:
+    """
+    MediaFlux Hub - Медиа-сервер.
+
+    Видео отдаются прямо из папок контента по адресу
+    /media/<sha256><ext>?expires=...&sig=..., где sig - HMAC-SHA256 от имени
+    файла и срока действия. Ссылка не раскрывает путь на диске, а по
+    истечении срока перестает работать. Файл ищется по хешу в каталоге
+    видео; видео вне каталога (результаты перекодирования) регистрируются
+    при публикации в published_media, поэтому ссылки переживают
+    перезапуск и работают в любом процессе.
+    """
+
+    def __init__(self):
+        self._published: Dict[str, MediaFile] = {}
+        self.stats = {'published': 0, 'served': 0, 'rejected': 0}
+
+    @property
+    def _secret(self) -> bytes:
+        return (settings.MEDIA_URL_SECRET or settings.SECRET_KEY).encode()
+
+    def sign(self, name: str, expires: int) -> str:
+        """Подпись имени файла и срока действия ссылки"""
+        digest = hmac.new(self._secret, f"{name}:{expires}".encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    def verify(self, name: str, expires: int, signature: str) -> bool:
+        """Проверка подписи и срока действия ссылки"""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self.sign(name, expires), signature)
+
+    def signed_query(self, name: str, ttl: Optional[int] = None) -> str:
+        """Параметры expires и sig временной ссылки на файл"""
+        expires = int(time.time()) + (ttl or settings.MEDIA_URL_TTL_SECONDS)
+        return f"expires={expires}&sig={self.sign(name, expires)}"
+
+    def signed_url(self, content_hash: str, extension: str, ttl: Optional[int] = None) -> str:
+        """Подписанная временная ссылка на видео"""
+        name = f"{content_hash}{extension.lower()}"
+        base_url = settings.MEDIA_PUBLIC_BASE_URL.rstrip('/')
+        return f"{base_url}/media/{name}?{self.signed_query(name, ttl)}"
+
+    async def publish(self, video_path: str, ttl: Optional[int] = None) -> str:
+        """Ссылка на видео для Instagram; хеш считается один раз и кэшируется"""
+        content_hash = await content_hasher.hash(video_path)
+
+        if not video_catalog.by_hash(content_hash):
+            stat = await asyncio.to_thread(os.stat, video_path)
+            media = MediaFile(content_hash, video_path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            if self._published.get(content_hash) != media:
+                await self._register(media)
+
+        self.stats['published'] += 1
+        return self.signed_url(content_hash, Path(video_path).suffix, ttl)
+
+    async def resolve(self, content_hash: str) -> Optional[MediaFile]:
+        """Файл по хешу; None если файла нет или он изменился после хеширования"""
+        entry = video_catalog.by_hash(content_hash)
+        if entry is None and content_hash not in self._published:
+            async with AsyncSessionLocal() as db:
+                await video_catalog.ensure_loaded(db)
+                entry = video_catalog.by_hash(content_hash)
+                if entry is None:
+                    # Опубликовано до перезапуска или другим процессом
+                    stored = await PublishedMediaRepository(db).get(content_hash)
+                    if stored:
+                        self._published[content_hash] = MediaFile(
+                            content_hash, stored.path, stored.size, stored.mtime_ns, stored.inode
+                        )
+
+        if entry:
+            media = MediaFile(content_hash, entry.path, entry.size, entry.mtime_ns, entry.inode)
+        else:
+            media = self._published.get(content_hash)
+            if media is None:
+                return None
+
+        try:
+            stat = await asyncio.to_thread(os.stat, media.path)
+        except FileNotFoundError:
+            return None
+
+        if (stat.st_size, stat.st_mtime_ns, stat.st_ino) != (media.size, media.mtime_ns, media.inode):
+            logger.warning(f"⚠️ MediaFlux Hub: Файл изменился после хеширования: {media.path}")
+            return None
+
+        return media
+
+    async def _register(self, media: MediaFile):
+        """Регистрация видео вне каталога в памяти и в published_media"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await PublishedMediaRepository(db).save(
+                    media.content_hash, media.path, media.size, media.mtime_ns, media.inode
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ MediaFlux Hub: Не удалось сохранить регистрацию {media.path}: {e}")
+        self._published[media.content_hash] = media
+
+    def get_media_stats(self) -> Dict[str, int]:
+        """Статистика медиа-сервера"""
+        return {'registered': len(self._published), **self.stats}
+
+
+# Общий медиа-сервер процесса
+media_server = MediaServer()
@@ -0,0 +1,373 @@
+"""
+MediaFlux Hub - Object Storage
+Загрузка видео в объектное хранилище (S3 / файловая система) с дедупликацией по хешу
+"""
+import abc
+import asyncio
+import logging
+import mimetypes
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.content_hasher import content_hasher
+from app.services.media_server import media_server
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+logger = logging.getLogger("mediaflux_hub.storage")
+
+# Номер части -> ETag части
+UploadedParts = List[Tuple[int, str]]
+
+
+@dataclass
+class StoredObject:
+    """Объект в хранилище"""
+    key: str
+    size: int
+    uploaded_at: float  # unix time
+
+
+class StorageBackend(abc.ABC):
+    """
+    MediaFlux Hub - Интерфейс объектного хранилища.
+
+    Реализации дают примитивы multipart загрузки в стиле S3, а загрузка
+    файла собирается из них здесь: файл режется на части по
+    STORAGE_PART_SIZE, части читаются с диска и отправляются параллельно
+    в пуле потоков. В памяти одновременно не больше одной части на поток.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_UPLOAD_WORKERS,
+            thread_name_prefix=f"mediaflux-{self.name}"
+        )
+
+    async def _run(self, func, *args):
+        """Блокирующий вызов в пуле потоков хранилища"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # Примитивы реализации (блокирующие, вызываются из пула потоков)
+
+    @abc.abstractmethod
+    def head_object(self, key: str) -> Optional[StoredObject]:
+        ...
+
+    @abc.abstractmethod
+    def put_object(self, key: str, path: str, content_type: str):
+        ...
+
+    @abc.abstractmethod
+    def create_multipart(self, key: str, content_type: str) -> str:
+        ...
+
+    @abc.abstractmethod
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        ...
+
+    @abc.abstractmethod
+    def complete_multipart(self, key: str, upload_id: str, parts: UploadedParts):
+        ...
+
+    @abc.abstractmethod
+    def abort_multipart(self, key: str, upload_id: str):
+        ...
+
+    @abc.abstractmethod
+    def presigned_url(self, key: str, ttl: int) -> str:
+        ...
+
+    # Загрузка файла
+
+    async def head(self, key: str) -> Optional[StoredObject]:
+        """Метаданные объекта или None"""
+        return await self._run(self.head_object, key)
+
+    async def upload_file(self, key: str, path: str) -> StoredObject:
+        """Потоковая загрузка файла: целиком если он меньше части, иначе multipart"""
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        size = (await asyncio.to_thread(os.stat, path)).st_size
+        part_size = settings.STORAGE_PART_SIZE
+
+        if size <= part_size:
+            await self._run(self.put_object, key, path, content_type)
+            return StoredObject(key, size, time.time())
+
+        upload_id = await self._run(self.create_multipart, key, content_type)
+        try:
+            parts = await asyncio.gather(*(
+                self._run(self._upload_file_part, key, upload_id, path, number, offset, min(part_size, size - offset))
+                for number, offset in enumerate(range(0, size, part_size), start=1)
+            ))
+            await self._run(self.complete_multipart, key, upload_id, list(parts))
+        except BaseException:
+            await self._run(self.abort_multipart, key, upload_id)
+            raise
+
+        return StoredObject(key, size, time.time())
+
+    def _upload_file_part(self, key: str, upload_id: str, path: str, number: int, offset: int, length: int) -> Tuple[int, str]:
+        """Чтение одной части с диска и отправка"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            body = f.read(length)
+        return number, self.upload_part(key, upload_id, number, body)
+
+    async def url(self, key: str, ttl: int) -> str:
+        """Временная ссылка на объект"""
+        return await self._run(self.presigned_url, key, ttl)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class S3StorageBackend(StorageBackend):
+    """MediaFlux Hub - S3-совместимое хранилище (AWS S3, MinIO, R2...)"""
+
+    name = "s3"
+
+    def __init__(self):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 нужен пакет boto3")
+        super().__init__()
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            config=BotoConfig(max_pool_connections=settings.STORAGE_UPLOAD_WORKERS)
+        )
+
+    def head_object(self, key: str) -> Optional[StoredObject]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StoredObject(key, response["ContentLength"], response["LastModified"].timestamp())
+
+    def put_object(self, key: str, path: str, content_type: str):
+        with open(path, 'rb') as f:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=f, ContentType=content_type)
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+        return response["UploadId"]
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+        )
+        return response["ETag"]
+
+    def complete_multipart(self, key: str, upload_id: str, parts: UploadedParts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag in sorted(parts)]}
+        )
+
+    def abort_multipart(self, key: str, upload_id: str):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except ClientError as e:
+            logger.warning(f"⚠️ MediaFlux Hub: Не удалось отменить multipart загрузку {key}: {e}")
+
+    def presigned_url(self, key: str, ttl: int) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=ttl
+        )
+
+
+class FilesystemStorageBackend(StorageBackend):
+    """
+    MediaFlux Hub - Хранилище в локальной папке с тем же API, что и S3.
+
+    Части multipart загрузки пишутся в STORAGE_FS_ROOT/.uploads/<upload_id>
+    и склеиваются при завершении; объект появляется атомарно через
+    os.replace. Объекты отдает медиа-сервер приложения по подписанным
+    ссылкам /media/storage/<key> с адресом STORAGE_FS_BASE_URL.
+    Подходит для разработки и проверки без S3.
+    """
+
+    name = "filesystem"
+
+    def __init__(self):
+        if not settings.STORAGE_FS_BASE_URL:
+            raise RuntimeError("Для STORAGE_BACKEND=filesystem нужен STORAGE_FS_BASE_URL - внешний адрес приложения")
+        super().__init__()
+        self.root = Path(settings.STORAGE_FS_ROOT)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def object_file(self, key: str) -> Path:
+        """Путь объекта на диске; ключ вне STORAGE_FS_ROOT - ValueError"""
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Недопустимый ключ объекта: {key}")
+        return path
+
+    def _upload_dir(self, upload_id: str) -> Path:
+        return self.root / ".uploads" / upload_id
+
+    def _publish(self, key: str, source: Path):
+        target = self.object_file(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+    def head_object(self, key: str) -> Optional[StoredObject]:
+        try:
+            stat = self.object_file(key).stat()
+        except FileNotFoundError:
+            return None
+        return StoredObject(key, stat.st_size, stat.st_mtime)
+
+    def put_object(self, key: str, path: str, content_type: str):
+        temp = self.root / ".uploads" / f"{uuid.uuid4().hex}.tmp"
+        temp.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, temp)
+        self._publish(key, temp)
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        upload_id = uuid.uuid4().hex
+        self._upload_dir(upload_id).mkdir(parents=True)
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        (self._upload_dir(upload_id) / f"{part_number:05d}").write_bytes(body)
+        return f"part-{part_number}"
+
+    def complete_multipart(self, key: str, upload_id: str, parts: UploadedParts):
+        upload_dir = self._upload_dir(upload_id)
+        assembled = upload_dir / "object"
+        with open(assembled, 'wb') as output:
+            for number, _ in sorted(parts):
+                with open(upload_dir / f"{number:05d}", 'rb') as part:
+                    shutil.copyfileobj(part, output)
+        self._publish(key, assembled)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def abort_multipart(self, key: str, upload_id: str):
+        shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+    def presigned_url(self, key: str, ttl: int) -> str:
+        # Подпись и срок проверяет маршрут /media/storage/{key} медиа-сервера
+        return f"{settings.STORAGE_FS_BASE_URL.rstrip('/')}/media/storage/{key}?{media_server.signed_query(key, ttl)}"
+
+
+STORAGE_BACKENDS = {
+    S3StorageBackend.name: S3StorageBackend,
+    FilesystemStorageBackend.name: FilesystemStorageBackend,
+}
+
+
+class ObjectStorage:
+    """
+    MediaFlux Hub - Публикация видео во внешнее хранилище.
+
+    Ключ объекта - sha256 содержимого, поэтому одно видео, которое
+    публикуют многие аккаунты, загружается один раз: пока объект есть в
+    хранилище и не истечет до конца срока ссылки, загрузка пропускается.
+    Одновременные публикации одного видео ждут одну загрузку. При
+    STORAGE_BACKEND=local видео отдает встроенный медиа-сервер.
+    """
+
+    def __init__(self):
+        self._backend: Optional[StorageBackend] = None
+        self._objects: Dict[str, StoredObject] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.stats = {'uploads': 0, 'dedup_hits': 0, 'bytes_uploaded': 0}
+
+    @property
+    def backend(self) -> Optional[StorageBackend]:
+        """Хранилище из настроек (None - встроенный медиа-сервер)"""
+        if self._backend is None and settings.STORAGE_BACKEND != "local":
+            backend_class = STORAGE_BACKENDS.get(settings.STORAGE_BACKEND)
+            if backend_class is None:
+                raise ValueError(f"Неизвестный STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+            self._backend = backend_class()
+        return self._backend
+
+    def start(self):
+        """Создание хранилища из настроек при запуске: ошибка конфигурации не ждет первой публикации"""
+        if self.backend:
+            logger.info(f"📦 MediaFlux Hub: Хранилище видео: {self.backend.name}")
+
+    def _is_fresh(self, stored: Optional[StoredObject], ttl: int) -> bool:
+        """Объект переживет выдаваемую ссылку (с учетом lifecycle правила хранилища)"""
+        if stored is None:
+            return False
+        if not settings.STORAGE_OBJECT_TTL_SECONDS:
+            return True
+        return stored.uploaded_at + settings.STORAGE_OBJECT_TTL_SECONDS > time.time() + ttl
+
+    async def publish(self, video_path: str, ttl: Optional[int] = None) -> str:
+        """Публичная временная ссылка на видео; загрузка только если объекта еще нет"""
+        backend = self.backend
+        if backend is None:
+            return await media_server.publish(video_path, ttl)
+
+        ttl = ttl or settings.MEDIA_URL_TTL_SECONDS
+        content_hash = await content_hasher.hash(video_path)
+        key = f"{settings.STORAGE_KEY_PREFIX}{content_hash}{Path(video_path).suffix.lower()}"
+
+        if self._is_fresh(self._objects.get(key), ttl):
+            self.stats['dedup_hits'] += 1
+        else:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = asyncio.ensure_future(self._ensure_uploaded(backend, key, video_path, ttl))
+                self._inflight[key] = pending
+                pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+            await asyncio.shield(pending)
+
+        return await backend.url(key, ttl)
+
+    async def _ensure_uploaded(self, backend: StorageBackend, key: str, video_path: str, ttl: int):
+        """Проверка объекта в хранилище и загрузка при отсутствии"""
+        stored = await backend.head(key)
+        if self._is_fresh(stored, ttl):
+            self.stats['dedup_hits'] += 1
+        else:
+            started = time.monotonic()
+            stored = await backend.upload_file(key, video_path)
+            self.stats['uploads'] += 1
+            self.stats['bytes_uploaded'] += stored.size
+            logger.info(
+                f"📤 MediaFlux Hub: Видео загружено в {backend.name}: {Path(video_path).name} -> {key} "
+                f"({stored.size / 1024 / 1024:.1f} MB за {time.monotonic() - started:.1f} c)"
+            )
+
+        self._objects[key] = stored
+
+    def get_storage_stats(self) -> Dict[str, object]:
+        """Статистика хранилища"""
+        return {'backend': settings.STORAGE_BACKEND, 'known_objects': len(self._objects), **self.stats}
+
+    def close(self):
+        if self._backend:
+            self._backend.close()
+
+
+# Общее хранилище процесса
+object_storage = ObjectStorage()
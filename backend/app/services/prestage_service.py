@@ -0,0 +1,117 @@
+"""
+MediaFlux Hub - Prestage Service
+Заблаговременная проверка и загрузка видео задач, которые скоро будут опубликованы
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from app.config import settings
+from app.database import AsyncSessionLocal, PostTask
+from app.repositories.post_tasks import PostTaskRepository
+from app.services.caption_index import caption_index
+from app.services.content_service import MediaFluxContentService
+from app.services.dispatch_service import task_timeline
+
+logger = logging.getLogger("mediaflux_hub.prestage")
+
+
+class VideoPrestager:
+    """
+    MediaFlux Hub - Предзагрузка видео.
+
+    Периодически берет pending задачи, до публикации которых осталось не
+    больше PRESTAGE_LOOKAHEAD_MINUTES, проверяет видео, загружает его в
+    публичное хранилище и сохраняет в задаче готовую ссылку. В момент
+    публикации конвейеру остаются только вызовы Graph API, а нагрузка на
+    хранилище распределяется по времени, а не приходится на начало
+    каждого окна публикаций. Ссылка выдается со сроком, покрывающим
+    окно предзагрузки, и обновляется, если начинает истекать.
+    """
+
+    def __init__(self, content_service: MediaFluxContentService):
+        self.content_service = content_service
+        self._semaphore = asyncio.Semaphore(settings.PRESTAGE_CONCURRENCY)
+
+        self.stats = {'staged': 0, 'invalid': 0, 'awaiting_transcode': 0, 'errors': 0, 'last_run': None}
+
+    async def run_once(self) -> int:
+        """Один проход предзагрузки; возвращает число подготовленных задач"""
+        now = datetime.now()
+        horizon = now + timedelta(minutes=settings.PRESTAGE_LOOKAHEAD_MINUTES)
+        url_valid_until = horizon + timedelta(seconds=settings.PRESTAGE_URL_MIN_REMAINING_SECONDS)
+
+        async with AsyncSessionLocal() as db:
+            tasks = await PostTaskRepository(db).list_unstaged(horizon, url_valid_until, settings.PRESTAGE_BATCH_SIZE)
+
+        self.stats['last_run'] = now.isoformat()
+        if not tasks:
+            return 0
+
+        # Ссылка должна пережить все окно предзагрузки и ожидание обработки Instagram
+        ttl = int((horizon - now).total_seconds()) + settings.MEDIA_URL_TTL_SECONDS
+        results = await asyncio.gather(*(self._stage(task, ttl) for task in tasks), return_exceptions=True)
+
+        staged = sum(1 for result in results if result is True)
+        if staged:
+            logger.info(f"📦 MediaFlux Hub: Предзагружено видео для {staged} из {len(tasks)} задач")
+        return staged
+
+    async def _stage(self, task: PostTask, ttl: int) -> bool:
+        """Проверка и загрузка видео одной задачи"""
+        async with self._semaphore:
+            try:
+                status, value = await self.content_service.resolve_publishable_video(task.video_path, task.scheduled_time)
+                if status == 'rejected':
+                    await self._reject(task, value)
+                    return False
+                if status == 'pending':
+                    # Видео перекодируется - задача подготовится следующим проходом
+                    self.stats['awaiting_transcode'] += 1
+                    return False
+
+                expires_at = datetime.now() + timedelta(seconds=ttl)
+                video_url = await self.content_service.upload_to_public_storage(value, ttl)
+                if not video_url:
+                    self.stats['errors'] += 1
+                    return False
+
+                async with AsyncSessionLocal() as db:
+                    if not await PostTaskRepository(db).set_staged(task.task_id, task.video_path, video_url, expires_at):
+                        return False
+                    # Описание генерируется здесь, ближе ко времени публикации, а не при планировании
+                    try:
+                        await self.content_service.ensure_task_caption(db, task)
+                        await db.commit()
+                    except Exception:
+                        caption_index.discard(task.account_id)
+                        raise
+
+                self.stats['staged'] += 1
+                return True
+
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"💥 MediaFlux Hub: Ошибка предзагрузки задачи {task.task_id}: {e}")
+                return False
+
+    async def _reject(self, task: PostTask, reason: str):
+        """Задача с негодным видео проваливается заранее; в колоду видео не возвращается"""
+        self.stats['invalid'] += 1
+        logger.warning(f"⚠️ MediaFlux Hub: Видео задачи {task.task_id} не прошло проверку: {reason}")
+
+        async with AsyncSessionLocal() as db:
+            repository = PostTaskRepository(db)
+            current = await repository.get(task.task_id)
+            if not current or current.status != 'pending':
+                return
+
+            await repository.mark_failed(task.task_id, f"Видео не прошло проверку: {reason}")
+            await db.commit()
+
+        task_timeline.discard(task.task_id)
+
+    def get_prestage_stats(self) -> Dict[str, Any]:
+        """Статистика предзагрузки"""
+        return dict(self.stats)
@@ -0,0 +1,21 @@
+"""
+MediaFlux Hub - Process Pools
+Пулы процессов для тяжелых вычислений без fork многопоточного процесса приложения
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def new_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Пул процессов с запуском воркеров через forkserver (spawn, где его нет).
+
+    К моменту создания пула в процессе приложения уже работают пулы потоков
+    хеширования и хранилища, потоки asyncio.to_thread, наблюдатель watchfiles
+    и event loop. Воркер, созданный fork, мог бы унаследовать блокировку,
+    захваченную одним из этих потоков, и зависнуть навсегда. Воркеры
+    forkserver порождаются из чистого однопоточного процесса и импортируют
+    модули приложения заново.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
@@ -11,7 +11,10 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 from app.config import settings
-from app.database import SessionLocal, Proxy, Account
+from app.database import AsyncSessionLocal, Proxy
+from app.repositories.accounts import AccountRepository
+from app.repositories.proxies import ProxyRepository
+from app.services.http_sessions import http_sessions
 
 logger = logging.getLogger("mediaflux_hub.proxy")
 
@@ -115,61 +118,60 @@ class ProxyManager:
             logger.warning("⚠️ MediaFlux Hub: Прокси не найдены в файле")
             return
         
-        db = SessionLocal()
-        try:
-            # Получаем существующие прокси
-            existing_proxies = {proxy.proxy_url: proxy for proxy in db.query(Proxy).all()}
-            
-            added_count = 0
-            updated_count = 0
-            
-            for proxy_data in file_proxies:
-                proxy_url = proxy_data['proxy_url']
-                
-                if proxy_url in existing_proxies:
-                    # Обновляем существующий
-                    proxy = existing_proxies[proxy_url]
-                    proxy.country = proxy_data['country']
-                    proxy.city = proxy_data['city']
-                    proxy.updated_at = datetime.now()
-                    updated_count += 1
-                else:
-                    # Добавляем новый
-                    proxy = Proxy(
-                        proxy_url=proxy_url,
-                        country=proxy_data['country'],
-                        city=proxy_data['city']
-                    )
-                    db.add(proxy)
-                    added_count += 1
-            
-            db.commit()
-            logger.info(f"✅ MediaFlux Hub: Синхронизация завершена. Добавлено: {added_count}, Обновлено: {updated_count}")
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка синхронизации прокси: {e}")
-            db.rollback()
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._sync_proxies(file_proxies, db)
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка синхронизации прокси: {e}")
+                await db.rollback()
+    
+    async def _sync_proxies(self, file_proxies: List[Dict[str, Any]], db):
+        """Запись прокси из файла в базу данных"""
+        proxy_repository = ProxyRepository(db)
+        
+        # Получаем существующие прокси
+        existing_proxies = {proxy.proxy_url: proxy for proxy in await proxy_repository.list()}
+        
+        added_count = 0
+        updated_count = 0
+        
+        for proxy_data in file_proxies:
+            proxy_url = proxy_data['proxy_url']
+            
+            if proxy_url in existing_proxies:
+                # Обновляем существующий
+                proxy = existing_proxies[proxy_url]
+                proxy.country = proxy_data['country']
+                proxy.city = proxy_data['city']
+                proxy.updated_at = datetime.now()
+                updated_count += 1
+            else:
+                # Добавляем новый
+                proxy = Proxy(
+                    proxy_url=proxy_url,
+                    country=proxy_data['country'],
+                    city=proxy_data['city']
+                )
+                proxy_repository.add(proxy)
+                added_count += 1
+        
+        await db.commit()
+        logger.info(f"✅ MediaFlux Hub: Синхронизация завершена. Добавлено: {added_count}, Обновлено: {updated_count}")
     
     async def test_proxy(self, proxy_url: str) -> bool:
         """Тестирование прокси"""
         try:
-            connector = aiohttp.TCPConnector(ssl=False)
+            session = http_sessions.get(proxy_url, verify_ssl=False)
             timeout = aiohttp.ClientTimeout(total=self.timeout)
             
-            async with aiohttp.ClientSession(
-                connector=connector,
-                timeout=timeout
-            ) as session:
-                async with session.get(self.test_url, proxy=proxy_url) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.debug(f"✅ MediaFlux Hub: Прокси работает: {proxy_url} -> IP: {result.get('origin', 'unknown')}")
-                        return True
-                    else:
-                        logger.warning(f"⚠️ MediaFlux Hub: Прокси вернул статус {response.status}: {proxy_url}")
-                        return False
+            async with session.get(self.test_url, proxy=proxy_url, timeout=timeout) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    logger.debug(f"✅ MediaFlux Hub: Прокси работает: {proxy_url} -> IP: {result.get('origin', 'unknown')}")
+                    return True
+                else:
+                    logger.warning(f"⚠️ MediaFlux Hub: Прокси вернул статус {response.status}: {proxy_url}")
+                    return False
                         
         except asyncio.TimeoutError:
             logger.warning(f"⏰ MediaFlux Hub: Таймаут тестирования прокси: {proxy_url}")
@@ -182,134 +184,127 @@ class ProxyManager:
         """Тестирование всех прокси"""
         logger.info("🧪 MediaFlux Hub: Начинаем тестирование всех прокси...")
         
-        db = SessionLocal()
-        try:
-            proxies = db.query(Proxy).all()
-            
-            if not proxies:
-                logger.warning("⚠️ MediaFlux Hub: Прокси не найдены в базе данных")
+        async with AsyncSessionLocal() as db:
+            try:
+                return await self._test_all_proxies(db)
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка тестирования прокси: {e}")
+                await db.rollback()
                 return {}
-            
-            # Тестируем прокси параллельно (максимум 10 одновременно)
-            semaphore = asyncio.Semaphore(10)
-            tasks = []
-            
-            async def test_single_proxy(proxy):
-                async with semaphore:
-                    result = await self.test_proxy(proxy.proxy_url)
-                    return proxy.proxy_url, result, proxy.id
-            
-            tasks = [test_single_proxy(proxy) for proxy in proxies]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Обновляем статусы в базе данных
-            test_results = {}
-            working_count = 0
-            
-            for result in results:
-                if isinstance(result, tuple):
-                    proxy_url, is_working, proxy_id = result
-                    test_results[proxy_url] = is_working
-                    
-                    # Обновляем статус в БД
-                    proxy = db.query(Proxy).filter(Proxy.id == proxy_id).first()
-                    if proxy:
-                        if is_working:
-                            proxy.is_active = True
-                            proxy.error_count = 0
-                            working_count += 1
-                        else:
-                            proxy.error_count += 1
-                            if proxy.error_count >= proxy.max_errors:
-                                proxy.is_active = False
-                        
-                        proxy.last_used = datetime.now()
-                        proxy.updated_at = datetime.now()
-            
-            db.commit()
-            
-            logger.info(f"✅ MediaFlux Hub: Тестирование завершено. Работающих прокси: {working_count}/{len(proxies)}")
-            return test_results
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка тестирования прокси: {e}")
-            db.rollback()
+    
+    async def _test_all_proxies(self, db) -> Dict[str, bool]:
+        """Тестирование прокси и запись результатов в рамках сессии БД"""
+        proxy_repository = ProxyRepository(db)
+        proxies = await proxy_repository.list()
+        
+        if not proxies:
+            logger.warning("⚠️ MediaFlux Hub: Прокси не найдены в базе данных")
             return {}
-        finally:
-            db.close()
+        
+        # Тестируем прокси параллельно (максимум 10 одновременно)
+        semaphore = asyncio.Semaphore(10)
+        
+        async def test_single_proxy(proxy):
+            async with semaphore:
+                result = await self.test_proxy(proxy.proxy_url)
+                return proxy.proxy_url, result, proxy.id
+        
+        tasks = [test_single_proxy(proxy) for proxy in proxies]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Обновляем статусы в базе данных
+        test_results = {}
+        working_count = 0
+        
+        for result in results:
+            if isinstance(result, tuple):
+                proxy_url, is_working, proxy_id = result
+                test_results[proxy_url] = is_working
+                
+                # Обновляем статус в БД
+                proxy = await proxy_repository.get(proxy_id)
+                if proxy:
+                    if is_working:
+                        proxy.is_active = True
+                        proxy.error_count = 0
+                        working_count += 1
+                    else:
+                        proxy.error_count += 1
+                        if proxy.error_count >= proxy.max_errors:
+                            proxy.is_active = False
+                    
+                    proxy.last_used = datetime.now()
+                    proxy.updated_at = datetime.now()
+        
+        await db.commit()
+        
+        logger.info(f"✅ MediaFlux Hub: Тестирование завершено. Работающих прокси: {working_count}/{len(proxies)}")
+        return test_results
     
     async def get_proxy_for_account(self, account_id: str) -> Optional[str]:
         """Получение прокси для аккаунта"""
-        db = SessionLocal()
-        try:
+        async with AsyncSessionLocal() as db:
             # Проверяем, назначен ли уже прокси
-            account = db.query(Account).filter(Account.id == account_id).first()
+            account = await AccountRepository(db).get(account_id)
             if not account:
                 return None
             
             if account.proxy_url:
                 # Проверяем, что прокси еще активен
-                proxy = db.query(Proxy).filter(Proxy.proxy_url == account.proxy_url).first()
+                proxy = await ProxyRepository(db).get_by_url(account.proxy_url)
                 if proxy and proxy.is_active:
                     return account.proxy_url
-            
-            # Назначаем новый прокси
-            new_proxy_url = await self.assign_proxy_to_account(account_id)
-            return new_proxy_url
-            
-        finally:
-            db.close()
+        
+        # Назначаем новый прокси
+        new_proxy_url = await self.assign_proxy_to_account(account_id)
+        return new_proxy_url
     
     async def assign_proxy_to_account(self, account_id: str) -> Optional[str]:
         """Назначение прокси аккаунту"""
-        db = SessionLocal()
-        try:
-            # Находим подходящий прокси
-            available_proxies = db.query(Proxy).filter(
-                Proxy.is_active == True,
-                Proxy.accounts_assigned < Proxy.max_accounts
-            ).order_by(Proxy.accounts_assigned.asc(), Proxy.last_used.asc()).all()
-            
-            if not available_proxies:
-                logger.warning(f"⚠️ MediaFlux Hub: Нет доступных прокси для аккаунта {account_id}")
-                return None
-            
-            # Выбираем случайный из топ-5 наименее загруженных
-            top_proxies = available_proxies[:5]
-            selected_proxy = random.choice(top_proxies)
-            
-            # Обновляем аккаунт
-            account = db.query(Account).filter(Account.id == account_id).first()
-            if account:
-                # Освобождаем старый прокси
-                if account.proxy_url:
-                    await self._release_proxy_from_account(account.proxy_url, db)
+        async with AsyncSessionLocal() as db:
+            proxy_repository = ProxyRepository(db)
+            try:
+                # Находим подходящий прокси
+                available_proxies = await proxy_repository.list_available()
                 
-                # Назначаем новый
-                account.proxy_url = selected_proxy.proxy_url
-                account.updated_at = datetime.now()
+                if not available_proxies:
+                    logger.warning(f"⚠️ MediaFlux Hub: Нет доступных прокси для аккаунта {account_id}")
+                    return None
                 
-                # Обновляем счетчик прокси
-                selected_proxy.accounts_assigned += 1
-                selected_proxy.last_used = datetime.now()
-                selected_proxy.updated_at = datetime.now()
+                # Выбираем случайный из топ-5 наименее загруженных
+                top_proxies = available_proxies[:5]
+                selected_proxy = random.choice(top_proxies)
                 
-                db.commit()
+                # Обновляем аккаунт
+                account = await AccountRepository(db).get(account_id)
+                if account:
+                    # Освобождаем старый прокси
+                    if account.proxy_url:
+                        await self._release_proxy_from_account(account.proxy_url, db)
+                    
+                    # Назначаем новый
+                    account.proxy_url = selected_proxy.proxy_url
+                    account.updated_at = datetime.now()
+                    
+                    # Обновляем счетчик прокси
+                    selected_proxy.accounts_assigned += 1
+                    selected_proxy.last_used = datetime.now()
+                    selected_proxy.updated_at = datetime.now()
+                    
+                    await db.commit()
+                    
+                    logger.info(f"🔗 MediaFlux Hub: Прокси {selected_proxy.proxy_url} назначен аккаунту {account.username}")
+                    return selected_proxy.proxy_url
                 
-                logger.info(f"🔗 MediaFlux Hub: Прокси {selected_proxy.proxy_url} назначен аккаунту {account.username}")
-                return selected_proxy.proxy_url
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка назначения прокси: {e}")
-            db.rollback()
-        finally:
-            db.close()
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка назначения прокси: {e}")
+                await db.rollback()
         
         return None
     
     async def _release_proxy_from_account(self, proxy_url: str, db):
         """Освобождение прокси от аккаунта"""
-        proxy = db.query(Proxy).filter(Proxy.proxy_url == proxy_url).first()
+        proxy = await ProxyRepository(db).get_by_url(proxy_url)
         if proxy and proxy.accounts_assigned > 0:
             proxy.accounts_assigned -= 1
             proxy.updated_at = datetime.now()
@@ -318,89 +313,83 @@ class ProxyManager:
         """Смена прокси при ошибке"""
         logger.info(f"🔄 MediaFlux Hub: Ротация прокси для аккаунта {account_id}")
         
-        db = SessionLocal()
-        try:
-            account = db.query(Account).filter(Account.id == account_id).first()
-            if not account:
+        async with AsyncSessionLocal() as db:
+            try:
+                account = await AccountRepository(db).get(account_id)
+                if not account:
+                    return
+                
+                old_proxy_url = account.proxy_url
+                
+                # Помечаем старый прокси как проблемный
+                if old_proxy_url:
+                    proxy = await ProxyRepository(db).get_by_url(old_proxy_url)
+                    if proxy:
+                        proxy.error_count += 1
+                        if proxy.error_count >= proxy.max_errors:
+                            proxy.is_active = False
+                            logger.warning(f"⚠️ MediaFlux Hub: Прокси {old_proxy_url} деактивирован из-за ошибок")
+                        
+                        proxy.accounts_assigned = max(0, proxy.accounts_assigned - 1)
+                        proxy.updated_at = datetime.now()
+                
+                # Назначаем новый прокси
+                account.proxy_url = None
+                await db.commit()
+                
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка ротации прокси: {e}")
+                await db.rollback()
                 return
-            
-            old_proxy_url = account.proxy_url
-            
-            # Помечаем старый прокси как проблемный
-            if old_proxy_url:
-                proxy = db.query(Proxy).filter(Proxy.proxy_url == old_proxy_url).first()
-                if proxy:
-                    proxy.error_count += 1
-                    if proxy.error_count >= proxy.max_errors:
-                        proxy.is_active = False
-                        logger.warning(f"⚠️ MediaFlux Hub: Прокси {old_proxy_url} деактивирован из-за ошибок")
-                    
-                    proxy.accounts_assigned = max(0, proxy.accounts_assigned - 1)
-                    proxy.updated_at = datetime.now()
-            
-            # Назначаем новый прокси
-            account.proxy_url = None
-            db.commit()
-            
-            new_proxy_url = await self.assign_proxy_to_account(account_id)
-            
-            if new_proxy_url:
-                logger.info(f"✅ MediaFlux Hub: Прокси ротирован: {old_proxy_url} -> {new_proxy_url}")
-            else:
-                logger.error(f"💥 MediaFlux Hub: Не удалось назначить новый прокси для аккаунта {account_id}")
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка ротации прокси: {e}")
-            db.rollback()
-        finally:
-            db.close()
+        
+        new_proxy_url = await self.assign_proxy_to_account(account_id)
+        
+        if new_proxy_url:
+            logger.info(f"✅ MediaFlux Hub: Прокси ротирован: {old_proxy_url} -> {new_proxy_url}")
+        else:
+            logger.error(f"💥 MediaFlux Hub: Не удалось назначить новый прокси для аккаунта {account_id}")
     
     async def get_proxy_statistics(self) -> Dict[str, Any]:
         """Получение статистики прокси"""
-        db = SessionLocal()
-        try:
-            total_proxies = db.query(Proxy).count()
-            active_proxies = db.query(Proxy).filter(Proxy.is_active == True).count()
-            assigned_proxies = db.query(Proxy).filter(Proxy.accounts_assigned > 0).count()
-            
-            # Распределение по странам
-            country_stats = {}
-            proxies = db.query(Proxy).all()
-            for proxy in proxies:
-                country = proxy.country or "Unknown"
-                if country not in country_stats:
-                    country_stats[country] = {'total': 0, 'active': 0}
-                country_stats[country]['total'] += 1
-                if proxy.is_active:
-                    country_stats[country]['active'] += 1
-            
-            return {
-                'total': total_proxies,
-                'active': active_proxies,
-                'assigned': assigned_proxies,
-                'available': active_proxies - assigned_proxies,
-                'countries': country_stats,
-                'utilization': (assigned_proxies / max(active_proxies, 1)) * 100
-            }
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка получения статистики прокси: {e}")
-            return {}
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                proxy_repository = ProxyRepository(db)
+                total_proxies = await proxy_repository.count()
+                active_proxies = await proxy_repository.count(is_active=True)
+                assigned_proxies = await proxy_repository.count(assigned=True)
+                
+                # Распределение по странам
+                country_stats = {}
+                proxies = await proxy_repository.list()
+                for proxy in proxies:
+                    country = proxy.country or "Unknown"
+                    if country not in country_stats:
+                        country_stats[country] = {'total': 0, 'active': 0}
+                    country_stats[country]['total'] += 1
+                    if proxy.is_active:
+                        country_stats[country]['active'] += 1
+                
+                return {
+                    'total': total_proxies,
+                    'active': active_proxies,
+                    'assigned': assigned_proxies,
+                    'available': active_proxies - assigned_proxies,
+                    'countries': country_stats,
+                    'utilization': (assigned_proxies / max(active_proxies, 1)) * 100
+                }
+                
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка получения статистики прокси: {e}")
+                return {}
     
     async def optimize_proxy_assignment(self):
         """Оптимизация назначения прокси"""
         logger.info("🔧 MediaFlux Hub: Оптимизация назначения прокси...")
         
-        db = SessionLocal()
         try:
             # Находим аккаунты с неактивными прокси
-            accounts_needing_proxy = db.query(Account).join(
-                Proxy, Account.proxy_url == Proxy.proxy_url, isouter=True
-            ).filter(
-                (Proxy.is_active == False) | (Proxy.id == None)
-            ).all()
+            async with AsyncSessionLocal() as db:
+                accounts_needing_proxy = await AccountRepository(db).list_with_inactive_proxy()
             
             reassigned_count = 0
             for account in accounts_needing_proxy:
@@ -412,5 +401,3 @@ class ProxyManager:
             
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка оптимизации прокси: {e}")
-        finally:
-            db.close() 
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+MediaFlux Hub - Publishing Pipeline
+Поэтапный конвейер публикации Reels с отдельными пулами воркеров
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.database import AsyncSessionLocal, Account, PostTask
+from app.repositories.accounts import AccountRepository
+from app.repositories.post_tasks import PostTaskRepository
+from app.repositories.content_stats import ContentStatsRepository
+from app.services.caption_index import caption_index
+from app.services.instagram_service import MediaFluxHubAPIService, AntiBanManager
+from app.services.content_service import MediaFluxContentService
+from app.services.task_queue import PostTaskQueue
+from app.services.dispatch_service import task_timeline
+from app.services.video_rotation import video_rotation
+
+logger = logging.getLogger("mediaflux_hub.pipeline")
+
+
+@dataclass
+class PublishJob:
+    """Задача публикации, проходящая через этапы конвейера"""
+    task_id: str
+    result: asyncio.Future
+    account: Optional[Account] = None
+    caption: Optional[str] = None
+    proxy: Optional[str] = None
+    folder_id: Optional[str] = None
+    video_path: Optional[str] = None
+    video_url: Optional[str] = None
+    container_id: Optional[str] = None
+    started_at: datetime = field(default_factory=datetime.now)
+
+
+class PublishingPipeline:
+    """
+    MediaFlux Hub - Конвейер публикации.
+
+    Этапы: prepare (антибан-проверка и загрузка видео, если его не успела
+    загрузить предзагрузка) -> create (создание контейнера) -> await
+    (ожидание обработки Instagram) -> publish. У каждого
+    этапа свой ограниченный пул воркеров и очередь на входе, поэтому
+    медленная обработка контейнеров не занимает слоты создания и публикации.
+    Этап await только регистрирует контейнер в общем опросчике статусов,
+    так что ожидающих контейнеров может быть сколько угодно.
+    """
+
+    STAGES = ('prepare', 'create', 'await', 'publish')
+
+    def __init__(
+        self,
+        instagram_service: MediaFluxHubAPIService,
+        content_service: MediaFluxContentService,
+        antiban_manager: AntiBanManager,
+        task_queue: PostTaskQueue
+    ):
+        self.instagram_service = instagram_service
+        self.content_service = content_service
+        self.antiban_manager = antiban_manager
+        self.task_queue = task_queue
+        self.task_timeline = task_timeline
+
+        self.pool_sizes = {
+            'prepare': settings.PIPELINE_PREPARE_WORKERS,
+            'create': settings.PIPELINE_CREATE_WORKERS,
+            'await': settings.PIPELINE_AWAIT_WORKERS,
+            'publish': settings.PIPELINE_PUBLISH_WORKERS,
+        }
+        self.handlers: Dict[str, Callable[[PublishJob], Awaitable[None]]] = {
+            'prepare': self._prepare_stage,
+            'create': self._create_stage,
+            'await': self._await_stage,
+            'publish': self._publish_stage,
+        }
+
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._delayed: set = set()
+        self.is_running = False
+
+        # Статистика по этапам
+        self.stats = {
+            stage: {'active': 0, 'processed': 0, 'failed': 0}
+            for stage in self.STAGES
+        }
+        # Загрузки видео в момент публикации (предзагрузка не успела)
+        self.stats['prepare']['uploaded'] = 0
+
+    async def start(self):
+        """Запуск пулов воркеров всех этапов"""
+        if self.is_running:
+            return
+
+        for stage in self.STAGES:
+            self.queues[stage] = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+            for i in range(self.pool_sizes[stage]):
+                self._workers.append(
+                    asyncio.create_task(self._stage_worker(stage), name=f"pipeline-{stage}-{i}")
+                )
+
+        self.is_running = True
+        logger.info(f"🏭 MediaFlux Hub: Конвейер публикации запущен {self.pool_sizes}")
+
+    async def stop(self):
+        """Остановка воркеров конвейера"""
+        if not self.is_running:
+            return
+
+        for worker in [*self._workers, *self._delayed]:
+            worker.cancel()
+        await asyncio.gather(*self._workers, *self._delayed, return_exceptions=True)
+
+        self._workers.clear()
+        self._delayed.clear()
+        self.is_running = False
+        logger.info("🛑 MediaFlux Hub: Конвейер публикации остановлен")
+
+    async def submit(self, task: PostTask) -> asyncio.Future:
+        """Постановка захваченной задачи в конвейер; future завершится True/False"""
+        await self.start()
+
+        job = PublishJob(
+            task_id=task.task_id,
+            result=asyncio.get_running_loop().create_future()
+        )
+        await self.queues['prepare'].put(job)
+        return job.result
+
+    async def _stage_worker(self, stage: str):
+        """Воркер этапа: берет задачи из очереди этапа и передает дальше"""
+        queue = self.queues[stage]
+        handler = self.handlers[stage]
+
+        while True:
+            job = await queue.get()
+            self.stats[stage]['active'] += 1
+            try:
+                await handler(job)
+                self.stats[stage]['processed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats[stage]['failed'] += 1
+                logger.error(f"💥 MediaFlux Hub: Ошибка этапа {stage} для задачи {job.task_id}: {e}")
+                if job.account and stage != 'prepare':
+                    await self.instagram_service.handle_instagram_error(e, job.account.id)
+                await self._mark_task_failed(job, str(e))
+            finally:
+                self.stats[stage]['active'] -= 1
+                queue.task_done()
+
+    def _spawn(self, coro):
+        """Фоновая корутина конвейера (отменяется при остановке)"""
+        background = asyncio.create_task(coro)
+        self._delayed.add(background)
+        background.add_done_callback(self._delayed.discard)
+
+    def _forward(self, stage: str, job: PublishJob, delay: float = 0):
+        """Передача задачи на следующий этап (с задержкой без занятия воркера)"""
+        async def put_later():
+            if delay:
+                await asyncio.sleep(delay)
+            await self.queues[stage].put(job)
+
+        self._spawn(put_later())
+
+    async def _prepare_stage(self, job: PublishJob):
+        """Этап 1: антибан-проверка, учет попытки и загрузка видео"""
+        async with AsyncSessionLocal() as db:
+            task = await PostTaskRepository(db).get(job.task_id)
+            if not task:
+                self._finish(job, False)
+                return
+
+            account = await AccountRepository(db).get(task.account_id)
+            if not account:
+                await self._mark_task_failed(job, "Аккаунт не найден")
+                return
+
+            job.account = account
+            if task.generated_caption:
+                job.caption = task.generated_caption
+            else:
+                # Задача без предзагрузки: описание генерируется при публикации
+                try:
+                    job.caption = await self.content_service.ensure_task_caption(db, task)
+                    await db.commit()
+                except Exception:
+                    caption_index.discard(task.account_id)
+                    raise
+            job.folder_id = task.folder_id
+            job.video_path = task.video_path
+
+            # Видео, заранее загруженное предзагрузкой, не загружаем повторно
+            url_valid_until = datetime.now() + timedelta(seconds=settings.PRESTAGE_URL_MIN_REMAINING_SECONDS)
+            if task.video_url and task.video_url_expires_at and task.video_url_expires_at > url_valid_until:
+                job.video_url = task.video_url
+
+        logger.info(f"📤 MediaFlux Hub: Публикация для @{job.account.username}")
+
+        # Проверяем возможность публикации (антибан)
+        can_post, reason = await self.antiban_manager.can_post_now(job.account)
+        if not can_post:
+            # Откладываем задачу на 30 минут
+            await self._reschedule_task(job, datetime.now() + timedelta(minutes=30), reason)
+            return
+
+        # Видео без предзагрузки: исходник или результат перекодирования
+        publish_path = None
+        if not job.video_url:
+            status, value = await self.content_service.resolve_publishable_video(job.video_path, datetime.now())
+            if status == 'pending':
+                await self._reschedule_task(job, datetime.now() + timedelta(minutes=settings.TRANSCODE_RETRY_MINUTES), value)
+                return
+            if status == 'rejected':
+                await self._mark_task_failed(job, value)
+                return
+            publish_path = value
+
+        # Учитываем попытку (только если аренда задачи все еще наша)
+        if not await self.task_queue.begin_attempt(job.task_id):
+            logger.warning(f"⚠️ MediaFlux Hub: Аренда задачи {job.task_id} потеряна, пропускаем")
+            self._finish(job, False)
+            return
+
+        # Загружаем видео на публичный хостинг, если предзагрузка не успела
+        if not job.video_url:
+            self.stats['prepare']['uploaded'] += 1
+            job.video_url = await self.content_service.upload_to_public_storage(publish_path)
+        if not job.video_url:
+            await self._mark_task_failed(job, "Ошибка загрузки видео")
+            return
+
+        job.proxy = await self.instagram_service.proxy_manager.get_proxy_for_account(job.account.id)
+
+        # Антибан-задержка перед созданием контейнера не занимает воркер
+        self._forward('create', job, delay=random.uniform(2, 8))
+
+    async def _create_stage(self, job: PublishJob):
+        """Этап 2: создание контейнера"""
+        job.container_id = await self.instagram_service.create_container(
+            job.account, job.video_url, job.caption, True, job.proxy
+        )
+
+        if not job.container_id:
+            await self._handle_publish_error(job, "❌ Ошибка создания контейнера")
+            return
+
+        logger.info(f"✅ MediaFlux Hub: Контейнер создан {job.container_id}")
+        self._forward('await', job)
+
+    async def _await_stage(self, job: PublishJob):
+        """Этап 3: регистрация контейнера в общем опросчике статусов"""
+        # Воркер не ждет обработки: результат придет через future опросчика
+        processing = self.instagram_service.watch_processing(
+            job.container_id, job.account.access_token, job.proxy
+        )
+        processing.add_done_callback(
+            lambda future: self._spawn(self._on_processed(job, future))
+        )
+
+    async def _on_processed(self, job: PublishJob, processing: asyncio.Future):
+        """Контейнер обработан (или нет) - передаем на публикацию"""
+        try:
+            processed = not processing.cancelled() and processing.result()
+            if not processed:
+                await self._handle_publish_error(job, "⏰ Таймаут обработки видео")
+                return
+
+            logger.info(f"✅ MediaFlux Hub: Видео обработано {job.container_id}")
+
+            # Задержка перед публикацией
+            self._forward('publish', job, delay=random.uniform(5, 15))
+        except Exception as e:
+            logger.error(f"💥 MediaFlux Hub: Ошибка ожидания обработки {job.container_id}: {e}")
+            await self._mark_task_failed(job, str(e))
+
+    async def _publish_stage(self, job: PublishJob):
+        """Этап 4: публикация контейнера"""
+        media_id = await self.instagram_service.publish_container(
+            job.container_id, job.account, job.proxy
+        )
+
+        if not media_id:
+            await self._handle_publish_error(job, "❌ Ошибка публикации")
+            return
+
+        await self._complete_task(job, media_id)
+
+    async def _complete_task(self, job: PublishJob, media_id: str):
+        """Отметка успешной публикации"""
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            await PostTaskRepository(db).mark_completed(job.task_id, media_id, now)
+
+            # Обновляем счетчик аккаунта и колоду ротации видео
+            await AccountRepository(db).record_post(job.account.id, now)
+            await video_rotation.mark_posted(db, job.account.id, job.folder_id, job.video_path)
+            await ContentStatsRepository(db).record_post(job.folder_id, job.video_path, now)
+
+            await db.commit()
+
+        logger.info(f"🎉 MediaFlux Hub: Reel опубликован! @{job.account.username} -> {media_id}")
+        self._finish(job, True)
+
+    async def _handle_publish_error(self, job: PublishJob, error_message: str):
+        """Ошибка Instagram API: повтор через час или провал после max_attempts"""
+        async with AsyncSessionLocal() as db:
+            task = await PostTaskRepository(db).get(job.task_id)
+            attempts_exhausted = not task or task.attempts >= task.max_attempts
+
+        if attempts_exhausted:
+            await self._mark_task_failed(job, error_message)
+        else:
+            await self._reschedule_task(job, datetime.now() + timedelta(hours=1), error_message)
+
+    async def _mark_task_failed(self, job: PublishJob, error_message: str):
+        """Отметка задачи как неудачной"""
+        async with AsyncSessionLocal() as db:
+            if await PostTaskRepository(db).mark_failed(job.task_id, error_message):
+                # Видео не опубликовано - возвращаем его в колоду аккаунта
+                if job.account and job.folder_id:
+                    await video_rotation.release_cards(db, job.account.id, job.folder_id, [job.video_path])
+                await db.commit()
+
+        self.task_timeline.discard(job.task_id)
+        self._finish(job, False)
+
+    async def _reschedule_task(self, job: PublishJob, new_time: datetime, reason: str):
+        """Перенос задачи на другое время"""
+        async with AsyncSessionLocal() as db:
+            if await PostTaskRepository(db).reschedule(job.task_id, new_time, reason):
+                await db.commit()
+                self.task_timeline.schedule(job.task_id, new_time)
+
+        self._finish(job, False)
+
+    def _finish(self, job: PublishJob, success: bool):
+        """Завершение задачи в конвейере"""
+        self.task_queue.release(job.task_id)
+        if not job.result.done():
+            job.result.set_result(success)
+
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """Статистика конвейера по этапам"""
+        return {
+            stage: {
+                'workers': self.pool_sizes[stage],
+                'queued': self.queues[stage].qsize() if stage in self.queues else 0,
+                **self.stats[stage]
+            }
+            for stage in self.STAGES
+        }
@@ -4,18 +4,41 @@ MediaFlux Hub - Scheduler Service
 """
 import logging
 import asyncio
+import hashlib
 import random
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import Iterable, List, Optional, Dict, Any, Set, Tuple
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.executors.asyncio import AsyncIOExecutor
 
 from app.config import settings
-from app.database import SessionLocal, Account, PostTask, ContentFolder
+from app.database import AsyncSessionLocal, ContentFolder
+from app.repositories.accounts import AccountRepository
+from app.repositories.post_tasks import PostTaskRepository
+from app.repositories.content_folders import ContentFolderRepository
+from app.repositories.content_stats import ContentStatsRepository
+from app.repositories.system_logs import SystemLogRepository
 from app.services.instagram_service import MediaFluxHubAPIService, AntiBanManager
 from app.services.content_service import MediaFluxContentService
+from app.services.task_queue import PostTaskQueue
+from app.services.dispatch_service import task_timeline
+from app.services.publishing_pipeline import PublishingPipeline
+from app.services.prestage_service import VideoPrestager
+from app.services.content_watcher import ContentWatcher
+from app.services.ingest_service import video_ingest
+from app.services.caption_index import caption_index
+from app.services.container_poller import container_poller
+from app.services.video_catalog import video_catalog
+from app.services.video_rotation import video_rotation
+from app.services.folder_allocator import folder_allocator
+from app.services.fleet_planner import AccountPlan, fleet_planner
+from app.services.content_hasher import content_hasher
+from app.services.object_storage import object_storage
+from app.services.video_probe import video_prober
+from app.services.video_fingerprint import video_fingerprinter
+from app.services.transcoder import transcoding_farm, needs_transcoding
 
 logger = logging.getLogger("mediaflux_hub.scheduler")
 
@@ -45,11 +68,32 @@ class MediaFluxHubScheduler:
         self.instagram_service = MediaFluxHubAPIService()
         self.content_service = MediaFluxContentService()
         self.antiban_manager = AntiBanManager()
+        self.task_queue = PostTaskQueue()
+        self.task_timeline = task_timeline
         self.is_running = False
         
+        # Событийный диспетчер и запущенные им пачки публикаций
+        self._dispatch_loop_task: Optional[asyncio.Task] = None
+        self._dispatch_batches: Set[asyncio.Task] = set()
+        
+        # Поэтапный конвейер публикации со своими пулами воркеров
+        self.pipeline = PublishingPipeline(
+            self.instagram_service,
+            self.content_service,
+            self.antiban_manager,
+            self.task_queue
+        )
+        
+        # Предзагрузка видео задач, которые скоро будут опубликованы
+        self.prestager = VideoPrestager(self.content_service)
+        
+        # Отслеживание новых и удаленных видео в папках контента
+        self.content_watcher = ContentWatcher(self.content_service)
+        
         # Статистика
         self.stats = {
             'posts_scheduled': 0,
+            'accounts_planned': 0,
             'posts_completed': 0,
             'posts_failed': 0,
             'last_schedule_generation': None,
@@ -65,20 +109,52 @@ class MediaFluxHubScheduler:
         try:
             logger.info("🚀 MediaFlux Hub: Запуск планировщика...")
             
-            # Генерация недельного расписания каждое воскресенье в 00:00
+            # Продление расписания аккаунтов до горизонта (только отставших и измененных)
             self.scheduler.add_job(
-                self.generate_weekly_schedule,
-                CronTrigger(day_of_week=6, hour=0, minute=0),  # Воскресенье
-                id="weekly_schedule_generation",
+                self.extend_schedule,
+                'interval',
+                minutes=settings.SCHEDULE_EXTEND_MINUTES,
+                id="schedule_extension",
+                max_instances=1,
+                replace_existing=True
+            )
+            
+            # Очередь публикаций обрабатывает событийный диспетчер (_dispatch_loop),
+            # а здесь - редкая сверка шкалы задач с БД на случай вставок из других процессов
+            self.scheduler.add_job(
+                self.resync_timeline,
+                'interval',
+                minutes=settings.DISPATCH_RESYNC_MINUTES,
+                id="timeline_resync",
+                replace_existing=True
+            )
+            
+            # Продление аренды задач, которые обрабатывает этот воркер
+            self.scheduler.add_job(
+                self.task_queue.heartbeat,
+                'interval',
+                seconds=settings.QUEUE_HEARTBEAT_SECONDS,
+                id="queue_heartbeat",
+                replace_existing=True
+            )
+            
+            # Возврат в очередь задач упавших воркеров
+            self.scheduler.add_job(
+                self.reap_expired_leases,
+                'interval',
+                seconds=settings.QUEUE_REAPER_INTERVAL_SECONDS,
+                id="queue_reaper",
                 replace_existing=True
             )
             
-            # Обработка очереди публикаций каждые 2 минуты
+            # Проверка и загрузка видео заранее, чтобы в срок оставались только вызовы Graph API
             self.scheduler.add_job(
-                self.process_posting_queue,
+                self.prestage_videos,
                 'interval',
-                minutes=2,
-                id="posting_queue_processor",
+                seconds=settings.PRESTAGE_INTERVAL_SECONDS,
+                id="video_prestage",
+                max_instances=1,
+                next_run_time=datetime.now(),
                 replace_existing=True
             )
             
@@ -107,20 +183,27 @@ class MediaFluxHubScheduler:
                 replace_existing=True
             )
             
-            # Сканирование контента каждые 6 часов
+            # Изменения контента применяет наблюдатель; периодическая сверка подбирает пропущенные
             self.scheduler.add_job(
-                self.scan_content_folders,
+                self.reconcile_content_folders,
                 'interval',
-                hours=6,
-                id="content_scanner",
-                replace_existing=True
+                minutes=settings.CONTENT_RECONCILE_MINUTES,
+                id="content_reconcile",
+                replace_existing=True,
+                max_instances=1
             )
             
             self.scheduler.start()
+            await self.pipeline.start()
+            self.content_watcher.start()
             self.is_running = True
             
-            # Генерируем начальное расписание
-            await self.generate_weekly_schedule()
+            # Продлеваем расписание: после перезапуска план строится только там, где отстал горизонт
+            await self.extend_schedule()
+            
+            # Загружаем уже существующие задачи и запускаем диспетчер
+            await self.resync_timeline()
+            self._dispatch_loop_task = asyncio.create_task(self._dispatch_loop())
             
             logger.info("✅ MediaFlux Hub: Планировщик успешно запущен!")
             
@@ -138,223 +221,269 @@ class MediaFluxHubScheduler:
         try:
             self.scheduler.shutdown(wait=False)
             self.is_running = False
+            
+            if self._dispatch_loop_task:
+                self._dispatch_loop_task.cancel()
+                self._dispatch_loop_task = None
+            
+            await self.pipeline.stop()
+            await self.content_watcher.stop()
+            await container_poller.stop()
+
             logger.info("✅ MediaFlux Hub: Планировщик остановлен")
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка остановки планировщика: {e}")
     
-    async def generate_weekly_schedule(self):
-        """Генерация расписания публикаций на неделю"""
-        logger.info("📅 MediaFlux Hub: Генерация недельного расписания...")
+    async def extend_schedule(self):
+        """Продление расписания публикаций до горизонта планирования"""
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._extend_schedule(db)
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка планирования расписания: {e}")
+                await db.rollback()
+                video_rotation.invalidate()
+                folder_allocator.invalidate()
+            else:
+                # Колоды и таблицы папок нужны только на время планирования - память не растет
+                # с размером парка, а папки, исключенные в этом проходе, вернутся в следующем
+                video_rotation.evict()
+                folder_allocator.invalidate()
+    
+    async def _extend_schedule(self, db):
+        """
+        Скользящий горизонт: расписание каждого аккаунта построено целыми днями
+        до planned_until. Работа идет только по аккаунтам, у которых горизонт
+        отстал, изменился дневной лимит или набор папок и их квоты; остальные
+        не читаются и не пишутся. Уже выполняемые и выполненные задачи
+        не удаляются и учитываются в дневном количестве постов.
+        """
+        now = datetime.now()
+        planned_until = self._horizon_end(now)
+        account_repository = AccountRepository(db)
         
-        try:
-            db = SessionLocal()
-            
-            # Получаем активные аккаунты
-            accounts = db.query(Account).filter(Account.status == 'active').all()
-            
-            # Получаем активные папки с контентом
-            folders = db.query(ContentFolder).filter(ContentFolder.is_active == True).all()
-            
-            if not accounts:
-                logger.warning("⚠️ MediaFlux Hub: Нет активных аккаунтов для планирования")
-                return
-            
-            if not folders:
-                logger.warning("⚠️ MediaFlux Hub: Нет папок с контентом для планирования")
-                return
-            
-            # Очищаем старые pending задачи
-            db.query(PostTask).filter(PostTask.status == 'pending').delete()
-            db.commit()
-            
-            total_tasks = 0
-            
-            # Планируем для каждого аккаунта
-            for account in accounts:
-                logger.info(f"📋 MediaFlux Hub: Планирование для @{account.username}")
-                
-                # Планируем на 7 дней вперед
-                for day_offset in range(7):
-                    target_date = datetime.now() + timedelta(days=day_offset)
-                    
-                    # Пропускаем прошедшие дни
-                    if target_date.date() < datetime.now().date():
-                        continue
-                    
-                    # Определяем количество постов на день
-                    daily_posts = self._calculate_daily_posts(account, target_date)
-                    
-                    if daily_posts == 0:
-                        continue
-                    
-                    # Создаем посты для этого дня
-                    day_tasks = await self._create_daily_tasks(
-                        account, target_date, daily_posts, folders, db
-                    )
-                    
-                    total_tasks += len(day_tasks)
-                    
-                    logger.debug(f"📝 MediaFlux Hub: {len(day_tasks)} задач для @{account.username} на {target_date.strftime('%Y-%m-%d')}")
-            
-            db.commit()
-            
-            # Обновляем статистику
-            self.stats['posts_scheduled'] = total_tasks
-            self.stats['last_schedule_generation'] = datetime.now()
-            
-            logger.info(f"✅ MediaFlux Hub: Сгенерировано {total_tasks} задач на неделю")
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка генерации расписания: {e}")
-            if 'db' in locals():
-                db.rollback()
-        finally:
-            if 'db' in locals():
-                db.close()
+        # Неактивным аккаунтам запланированные задачи больше не нужны
+        for account in await account_repository.list_inactive_planned():
+            await self._drop_planned_tasks(db, account.id)
+            await account_repository.set_planned(account.id, None, None)
+            saved = await video_rotation.save(db)
+            await db.commit()
+            video_rotation.saved(saved)
+        
+        folders = await ContentFolderRepository(db).list_active()
+        content_revision = self._content_revision(folders)
+        accounts = await account_repository.list_to_plan(planned_until, content_revision)
+        
+        if not accounts:
+            return
+        
+        if not folders:
+            logger.warning("⚠️ MediaFlux Hub: Нет папок с контентом для планирования")
+            return
+        
+        logger.info(f"📅 MediaFlux Hub: Продление расписания для {len(accounts)} аккаунтов...")
+        
+        # Дочитываем изменения папок в каталог; выбор видео дальше идет по индексу
+        await video_catalog.refresh(db, folders)
+        
+        # Новые видео разбираются до планирования, чтобы не выдавать задачам негодные для Reels
+        folder_ids = [folder.folder_id for folder in folders]
+        await video_prober.probe_catalog(db, folder_ids)
+        
+        # Перцептивные хеши новых видео: перекодированные копии не публикуются одним аккаунтом дважды
+        await video_fingerprinter.fingerprint_catalog(db, folder_ids)
+        
+        # Колоды ротации аккаунтов читаются пачками, а не запросом на каждую пару аккаунт/папка
+        await video_rotation.preload(db, [account.id for account in accounts])
+        
+        plans: List[AccountPlan] = []
+        revisions: Dict[str, str] = {}
+        for account in accounts:
+            revision = f"{account.daily_limit or 0}:{content_revision}"
+            start = account.planned_until or now
+            
+            if account.planned_until and account.planned_revision != revision:
+                # Изменились лимит или контент: перепланируем все, что еще не предзагружено
+                start = now + timedelta(minutes=settings.PRESTAGE_LOOKAHEAD_MINUTES)
+                dropped = await self._drop_planned_tasks(db, account.id, start)
+                logger.info(f"🔁 MediaFlux Hub: Перепланирование @{account.username}, снято задач: {dropped}")
+            
+            revisions[account.id] = revision
+            plans.append(AccountPlan(account.id, account.username, account.daily_limit or 0, max(start, now), planned_until))
+        
+        # Задачи, которые уже есть в планируемых днях (оставшиеся и выполненные)
+        task_repository = PostTaskRepository(db)
+        first_day = min(plan.start for plan in plans).replace(hour=0, minute=0, second=0, microsecond=0)
+        existing = await task_repository.scheduled_times_by_day(list(revisions), first_day, planned_until)
+        for plan in plans:
+            plan.existing = existing.get(plan.account_id, {})
+        
+        # Снятые задачи фиксируются до расчета: транзакция не держится открытой, пока считает пул
+        saved = await video_rotation.save(db)
+        await db.commit()
+        video_rotation.saved(saved)
+        
+        planned = await fleet_planner.plan(db, plans, folders)
+        
+        batch_rows: List[Dict[str, Any]] = []
+        batch_accounts: List[Tuple[str, datetime, str]] = []
+        total_tasks = 0
+        
+        # Результат пишется пачками строк в ограниченных транзакциях вместе с отметками горизонта их аккаунтов;
+        # ORM объекты задач не создаются, память не растет с размером парка
+        for plan in plans:
+            batch_rows.extend(planned.get(plan.account_id, []))
+            batch_accounts.append((plan.account_id, planned_until, revisions[plan.account_id]))
+            
+            if len(batch_rows) >= settings.SCHEDULE_WRITE_BATCH:
+                total_tasks += await self._write_planned(db, task_repository, batch_rows, batch_accounts)
+                batch_rows, batch_accounts = [], []
+        
+        if batch_accounts:
+            total_tasks += await self._write_planned(db, task_repository, batch_rows, batch_accounts)
+        
+        # Обновляем статистику
+        self.stats['posts_scheduled'] += total_tasks
+        self.stats['accounts_planned'] += len(accounts)
+        self.stats['last_schedule_generation'] = datetime.now()
+        
+        logger.info(f"✅ MediaFlux Hub: Запланировано {total_tasks} задач для {len(accounts)} аккаунтов")
     
-    def _calculate_daily_posts(self, account: Account, target_date: datetime) -> int:
-        """Расчет количества постов в день для аккаунта"""
+    async def _write_planned(
+        self,
+        db,
+        task_repository: PostTaskRepository,
+        rows: List[Dict[str, Any]],
+        accounts: List[Tuple[str, datetime, str]]
+    ) -> int:
+        """Запись пачки задач и горизонтов аккаунтов одной транзакцией"""
+        await task_repository.insert_many(rows)
+        await AccountRepository(db).set_planned_many(accounts)
+        saved = await video_rotation.save(db)
+        await db.commit()
+        video_rotation.saved(saved)
         
-        # Базовое количество постов
-        base_posts = min(account.daily_limit, settings.MAX_DAILY_POSTS_PER_ACCOUNT)
+        for row in rows:
+            self.task_timeline.schedule(row['task_id'], row['scheduled_time'])
+        await self._queue_transcoding((row['video_path'], row['scheduled_time']) for row in rows)
+        return len(rows)
+    
+    @staticmethod
+    def _horizon_end(now: datetime) -> datetime:
+        """Конец последнего дня, попадающего в горизонт планирования"""
+        horizon = now + timedelta(hours=settings.SCHEDULE_HORIZON_HOURS)
+        return horizon.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    
+    @staticmethod
+    def _content_revision(folders: List[ContentFolder]) -> str:
+        """Ревизия контента для планирования: активные папки и их квоты"""
+        signature = ';'.join(sorted(f"{folder.folder_id}={folder.posts_per_week}" for folder in folders))
+        return hashlib.sha1(signature.encode()).hexdigest()[:12]
+    
+    async def _drop_planned_tasks(self, db, account_id: str, since: Optional[datetime] = None) -> int:
+        """
+        Снятие запланированных задач аккаунта (начиная с since - кроме предзагруженных);
+        их видео возвращаются в колоды ротации
+        """
+        rows = await PostTaskRepository(db).delete_planned(account_id, since, keep_staged=since is not None)
         
-        # Корректировки по дням недели
-        weekday = target_date.weekday()
+        returned: Dict[str, List[str]] = {}
+        for task_id, folder_id, video_path in rows:
+            returned.setdefault(folder_id, []).append(video_path)
+            self.task_timeline.discard(task_id)
+        for folder_id, video_paths in returned.items():
+            await video_rotation.return_cards(db, account_id, folder_id, video_paths)
         
-        if weekday in [5, 6]:  # Выходные
-            return max(1, int(base_posts * 0.7))  # Уменьшаем активность на выходных
-        elif weekday in [0, 3]:  # Понедельник и четверг - более активные дни
-            return min(account.daily_limit, int(base_posts * 1.2))
-        else:
-            return random.randint(max(1, base_posts - 1), base_posts)
+        return len(rows)
     
-    async def _create_daily_tasks(
-        self, 
-        account: Account, 
-        target_date: datetime, 
-        posts_count: int,
-        folders: List[ContentFolder],
-        db
-    ) -> List[PostTask]:
-        """Создание задач публикации на день"""
-        
-        tasks = []
-        
-        # Генерируем времена публикации
-        posting_times = self._generate_posting_times(target_date, posts_count)
-        
-        for post_time in posting_times:
-            # Выбираем случайную папку с контентом
-            folder = random.choice(folders)
-            
-            # Получаем неиспользованное видео
-            video_path = await self.content_service.get_unused_video(
-                folder.folder_id, account.id, db
-            )
-            
-            if not video_path:
-                logger.warning(f"⚠️ MediaFlux Hub: Нет видео в папке {folder.name} для @{account.username}")
-                continue
-            
-            # Генерируем уникальное описание
-            caption = await self.content_service.generate_unique_caption(
-                folder.name, video_path
-            )
-            
-            # Создаем задачу
-            task = PostTask(
-                account_id=account.id,
-                video_path=video_path,
-                generated_caption=caption,
-                folder_id=folder.folder_id,
-                scheduled_time=post_time,
-                status='pending'
-            )
-            
-            db.add(task)
-            tasks.append(task)
+    async def _queue_transcoding(self, videos: Iterable[Tuple[str, datetime]]):
+        """
+        Постановка на перекодирование видео задач (путь, время публикации), не подходящих
+        под Reels (раньше публикация - раньше очередь)
+        """
+        if not settings.TRANSCODE_ENABLED:
+            return
         
-        return tasks
+        for video_path, scheduled_time in videos:
+            entry = video_catalog.find(video_path)
+            if entry and needs_transcoding(video_prober.result_for(entry.content_hash)):
+                await transcoding_farm.submit(video_path, scheduled_time, entry.content_hash)
     
-    def _generate_posting_times(self, target_date: datetime, posts_count: int) -> List[datetime]:
-        """Генерация оптимальных времен публикации"""
-        
-        # Оптимальные временные окна для Instagram (по часам)
-        optimal_hours = [
-            (9, 11),    # Утро
-            (13, 15),   # Обед  
-            (17, 19),   # Вечер
-            (20, 22)    # Ночь
-        ]
-        
-        posting_times = []
-        
-        for i in range(posts_count):
-            # Выбираем случайное временное окно
-            start_hour, end_hour = random.choice(optimal_hours)
-            
-            # Генерируем случайное время в этом окне
-            hour = random.randint(start_hour, end_hour - 1)
-            minute = random.randint(0, 59)
-            
-            post_time = target_date.replace(
-                hour=hour, 
-                minute=minute, 
-                second=random.randint(0, 59),
-                microsecond=0
-            )
-            
-            # Применяем антибан-рандомизацию
-            post_time = self.antiban_manager.randomize_posting_time(post_time)
-            
-            # Проверяем, что время не в прошлом
-            if post_time > datetime.now():
-                posting_times.append(post_time)
-        
-        # Сортируем по времени
-        posting_times.sort()
-        
-        # Обеспечиваем минимальные интервалы между постами
-        adjusted_times = []
-        last_time = None
-        
-        for post_time in posting_times:
-            if last_time:
-                time_diff = (post_time - last_time).total_seconds()
-                if time_diff < settings.MIN_DELAY_BETWEEN_POSTS:
-                    # Сдвигаем время
-                    post_time = last_time + timedelta(seconds=settings.MIN_DELAY_BETWEEN_POSTS)
-            
-            adjusted_times.append(post_time)
-            last_time = post_time
+    async def resync_timeline(self):
+        """
+        Загрузка pending задач из БД в шкалу диспетчера. Ошибка не глушится:
+        без сверки задачи после перезапуска и возвращенные из аренды не публикуются,
+        поэтому запуск планировщика падает, а периодические задания пишут трассировку
+        """
+        try:
+            async with AsyncSessionLocal() as db:
+                pending = await PostTaskRepository(db).list_pending_deadlines()
+        except Exception:
+            logger.exception("💥 MediaFlux Hub: Ошибка синхронизации шкалы задач")
+            raise
         
-        return adjusted_times
+        for task_id, scheduled_time in pending:
+            self.task_timeline.schedule(task_id, scheduled_time)
+        
+        logger.debug(f"🕒 MediaFlux Hub: В шкале диспетчера {len(self.task_timeline)} задач")
+    
+    async def prestage_videos(self):
+        """Предзагрузка видео ближайших задач"""
+        try:
+            await self.prestager.run_once()
+        except Exception as e:
+            logger.error(f"💥 MediaFlux Hub: Ошибка предзагрузки видео: {e}")
+    
+    async def reap_expired_leases(self):
+        """Возврат задач с истекшей арендой и их повторное планирование"""
+        requeued, _ = await self.task_queue.reap_expired()
+        if requeued:
+            await self.resync_timeline()
+    
+    async def _dispatch_loop(self):
+        """Диспетчер: сон до ближайшей задачи и запуск обработки точно в срок"""
+        logger.info("⏱️ MediaFlux Hub: Событийный диспетчер запущен")
+        
+        while self.is_running:
+            try:
+                await self.task_timeline.wait_for_due()
+                
+                if self.task_timeline.pop_due():
+                    self._spawn_dispatch_batch()
+                
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка диспетчера: {e}")
+                await asyncio.sleep(1)
+    
+    def _spawn_dispatch_batch(self):
+        """Запуск обработки пачки в фоне, чтобы диспетчер не пропускал следующие дедлайны"""
+        # Параллельные пачки безопасны: задачи захватываются с арендой
+        batch = asyncio.create_task(self.process_posting_queue())
+        self._dispatch_batches.add(batch)
+        batch.add_done_callback(self._dispatch_batches.discard)
     
     async def process_posting_queue(self):
         """Обработка очереди публикаций"""
         try:
-            db = SessionLocal()
-            
-            # Получаем задачи готовые к выполнению
-            current_time = datetime.now()
-            ready_tasks = db.query(PostTask).filter(
-                PostTask.status == 'pending',
-                PostTask.scheduled_time <= current_time
-            ).order_by(PostTask.scheduled_time.asc()).limit(10).all()
+            # Атомарно захватываем готовые задачи (аренда защищает от двойной обработки)
+            ready_tasks = await self.task_queue.claim_batch()
             
             if not ready_tasks:
                 return
             
-            logger.info(f"📤 MediaFlux Hub: Обработка {len(ready_tasks)} задач публикации...")
+            # Пачка заполнена целиком - в очереди могут остаться готовые задачи
+            if len(ready_tasks) >= settings.QUEUE_BATCH_SIZE:
+                self._spawn_dispatch_batch()
             
-            # Обрабатываем задачи параллельно (максимум 3 одновременно)
-            semaphore = asyncio.Semaphore(3)
-            tasks = [
-                self._process_single_task(task, semaphore) 
-                for task in ready_tasks
-            ]
+            logger.info(f"📤 MediaFlux Hub: Обработка {len(ready_tasks)} задач публикации...")
             
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Передаем задачи в конвейер публикации и ждем результатов
+            results = await asyncio.gather(
+                *[await self.pipeline.submit(task) for task in ready_tasks],
+                return_exceptions=True
+            )
             
             # Подсчитываем результаты
             success_count = sum(1 for r in results if r is True)
@@ -371,263 +500,128 @@ class MediaFluxHubScheduler:
             
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка обработки очереди: {e}")
-        finally:
-            if 'db' in locals():
-                db.close()
-    
-    async def _process_single_task(self, task: PostTask, semaphore: asyncio.Semaphore) -> bool:
-        """Обработка одной задачи публикации"""
-        async with semaphore:
-            db = SessionLocal()
-            try:
-                # Получаем аккаунт
-                account = db.query(Account).filter(Account.id == task.account_id).first()
-                if not account:
-                    await self._mark_task_failed(task.task_id, "Аккаунт не найден", db)
-                    return False
-                
-                logger.info(f"📤 MediaFlux Hub: Публикация для @{account.username}")
-                
-                # Проверяем возможность публикации (антибан)
-                can_post, reason = await self.antiban_manager.can_post_now(account)
-                if not can_post:
-                    # Откладываем задачу на 30 минут
-                    new_time = datetime.now() + timedelta(minutes=30)
-                    await self._reschedule_task(task.task_id, new_time, reason, db)
-                    return False
-                
-                # Отмечаем задачу как обрабатываемую
-                task.status = 'processing'
-                task.attempts += 1
-                task.updated_at = datetime.now()
-                db.commit()
-                
-                # Загружаем видео на публичный хостинг
-                video_url = await self.content_service.upload_to_public_storage(task.video_path)
-                
-                if not video_url:
-                    await self._mark_task_failed(task.task_id, "Ошибка загрузки видео", db)
-                    return False
-                
-                # Публикуем через Instagram API
-                success, result = await self.instagram_service.upload_reel(
-                    account=account,
-                    video_url=video_url,
-                    caption=task.generated_caption,
-                    share_to_feed=True
-                )
-                
-                if success:
-                    # Успешная публикация
-                    task.status = 'completed'
-                    task.media_id = result
-                    task.instagram_url = f"https://www.instagram.com/p/{result}/"
-                    task.completed_at = datetime.now()
-                    task.updated_at = datetime.now()
-                    
-                    # Обновляем счетчик аккаунта
-                    account.current_daily_posts += 1
-                    account.last_post_time = datetime.now()
-                    account.last_activity = datetime.now()
-                    account.updated_at = datetime.now()
-                    
-                    db.commit()
-                    
-                    logger.info(f"🎉 MediaFlux Hub: Reel опубликован! @{account.username} -> {result}")
-                    return True
-                else:
-                    # Ошибка публикации
-                    if task.attempts >= task.max_attempts:
-                        await self._mark_task_failed(task.task_id, result, db)
-                    else:
-                        # Планируем повторную попытку через час
-                        retry_time = datetime.now() + timedelta(hours=1)
-                        await self._reschedule_task(task.task_id, retry_time, result, db)
-                    
-                    return False
-                
-            except Exception as e:
-                logger.error(f"💥 MediaFlux Hub: Ошибка обработки задачи {task.task_id}: {e}")
-                await self._mark_task_failed(task.task_id, str(e), db)
-                return False
-            finally:
-                db.close()
-    
-    async def _mark_task_failed(self, task_id: str, error_message: str, db):
-        """Отметка задачи как неудачной"""
-        task = db.query(PostTask).filter(PostTask.task_id == task_id).first()
-        if task:
-            task.status = 'failed'
-            task.error_message = error_message
-            task.updated_at = datetime.now()
-            db.commit()
-    
-    async def _reschedule_task(self, task_id: str, new_time: datetime, reason: str, db):
-        """Перенос задачи на другое время"""
-        task = db.query(PostTask).filter(PostTask.task_id == task_id).first()
-        if task:
-            task.scheduled_time = new_time
-            task.status = 'pending'
-            task.error_message = f"Перенесено: {reason}"
-            task.updated_at = datetime.now()
-            db.commit()
     
     async def reset_daily_limits(self):
         """Сброс дневных лимитов аккаунтов"""
         logger.info("🔄 MediaFlux Hub: Сброс дневных лимитов аккаунтов...")
         
-        try:
-            db = SessionLocal()
-            
-            # Сбрасываем счетчики постов
-            accounts = db.query(Account).all()
-            reset_count = 0
-            
-            for account in accounts:
-                account.current_daily_posts = 0
-                account.updated_at = datetime.now()
-                reset_count += 1
-            
-            db.commit()
-            
-            logger.info(f"✅ MediaFlux Hub: Сброшены лимиты для {reset_count} аккаунтов")
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка сброса лимитов: {e}")
-            if 'db' in locals():
-                db.rollback()
-        finally:
-            if 'db' in locals():
-                db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                # Сбрасываем счетчики постов одним UPDATE
+                reset_count = await AccountRepository(db).reset_daily_posts()
+                await db.commit()
+                
+                logger.info(f"✅ MediaFlux Hub: Сброшены лимиты для {reset_count} аккаунтов")
+                
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка сброса лимитов: {e}")
+                await db.rollback()
     
     async def update_post_statistics(self):
         """Обновление статистики постов"""
         logger.info("📊 MediaFlux Hub: Обновление статистики постов...")
         
         try:
-            db = SessionLocal()
-            
-            # Получаем опубликованные посты за последние 7 дней
-            week_ago = datetime.now() - timedelta(days=7)
-            completed_tasks = db.query(PostTask).filter(
-                PostTask.status == 'completed',
-                PostTask.completed_at >= week_ago,
-                PostTask.media_id.isnot(None)
-            ).all()
-            
-            updated_count = 0
-            
-            for task in completed_tasks:
-                try:
-                    account = db.query(Account).filter(Account.id == task.account_id).first()
-                    if not account:
-                        continue
-                    
-                    # Получаем статистику из Instagram API
-                    insights = await self.instagram_service.get_media_insights(
-                        task.media_id, account
-                    )
-                    
-                    if insights:
-                        # Обновляем статистику в базе данных
-                        await self._update_task_statistics(task, insights, db)
-                        updated_count += 1
-                    
-                    # Небольшая задержка между запросами
-                    await asyncio.sleep(random.uniform(1, 3))
-                    
-                except Exception as e:
-                    logger.warning(f"⚠️ MediaFlux Hub: Ошибка обновления статистики для {task.task_id}: {e}")
-            
-            logger.info(f"✅ MediaFlux Hub: Обновлена статистика для {updated_count} постов")
-            
+            async with AsyncSessionLocal() as db:
+                await self._update_post_statistics(db)
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка обновления статистики: {e}")
-        finally:
-            if 'db' in locals():
-                db.close()
     
-    async def _update_task_statistics(self, task: PostTask, insights: Dict[str, Any], db):
-        """Обновление статистики конкретной задачи"""
-        from app.database import PostStatistics
-        
-        # Проверяем, есть ли уже запись статистики
-        stats = db.query(PostStatistics).filter(PostStatistics.task_id == task.task_id).first()
-        
-        if not stats:
-            stats = PostStatistics(task_id=task.task_id)
-            db.add(stats)
-        
-        # Обновляем данные
-        stats.impressions = insights.get('impressions', 0)
-        stats.reach = insights.get('reach', 0)
-        stats.likes = insights.get('likes', 0)
-        stats.comments = insights.get('comments', 0)
-        stats.shares = insights.get('shares', 0)
-        stats.saves = insights.get('saves', 0)
-        stats.profile_visits = insights.get('profile_visits', 0)
-        stats.follows = insights.get('follows', 0)
-        stats.updated_at = datetime.now()
-        
-        db.commit()
+    async def _update_post_statistics(self, db):
+        """Обновление статистики постов в рамках сессии БД"""
+        task_repository = PostTaskRepository(db)
+        account_repository = AccountRepository(db)
+        
+        # Получаем опубликованные посты за последние 7 дней
+        week_ago = datetime.now() - timedelta(days=7)
+        completed_tasks = await task_repository.list_completed_since(week_ago)
+        
+        updated_count = 0
+        
+        for task in completed_tasks:
+            try:
+                account = await account_repository.get(task.account_id)
+                if not account:
+                    continue
+                
+                # Получаем статистику из Instagram API
+                insights = await self.instagram_service.get_media_insights(
+                    task.media_id, account
+                )
+                
+                if insights:
+                    # Обновляем статистику в базе данных
+                    await task_repository.save_statistics(task.task_id, insights)
+                    await db.commit()
+                    updated_count += 1
+                
+                # Небольшая задержка между запросами
+                await asyncio.sleep(random.uniform(1, 3))
+                
+            except Exception as e:
+                logger.warning(f"⚠️ MediaFlux Hub: Ошибка обновления статистики для {task.task_id}: {e}")
+                await db.rollback()
+        
+        logger.info(f"✅ MediaFlux Hub: Обновлена статистика для {updated_count} постов")
     
     async def cleanup_old_data(self):
         """Очистка старых данных"""
         logger.info("🧹 MediaFlux Hub: Очистка старых данных...")
         
-        try:
-            db = SessionLocal()
-            
-            # Удаляем старые логи (старше 30 дней)
-            month_ago = datetime.now() - timedelta(days=30)
-            from app.database import SystemLog
-            
-            old_logs_count = db.query(SystemLog).filter(
-                SystemLog.created_at < month_ago
-            ).count()
-            
-            db.query(SystemLog).filter(
-                SystemLog.created_at < month_ago
-            ).delete()
-            
-            # Удаляем неудачные задачи старше 7 дней
-            week_ago = datetime.now() - timedelta(days=7)
-            old_failed_tasks = db.query(PostTask).filter(
-                PostTask.status == 'failed',
-                PostTask.updated_at < week_ago
-            ).count()
-            
-            db.query(PostTask).filter(
-                PostTask.status == 'failed',
-                PostTask.updated_at < week_ago
-            ).delete()
-            
-            db.commit()
-            
-            logger.info(f"✅ MediaFlux Hub: Удалено {old_logs_count} старых логов и {old_failed_tasks} неудачных задач")
-            
-        except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка очистки данных: {e}")
-            if 'db' in locals():
-                db.rollback()
-        finally:
-            if 'db' in locals():
-                db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                # Удаляем старые логи (старше 30 дней)
+                month_ago = datetime.now() - timedelta(days=30)
+                old_logs_count = await SystemLogRepository(db).delete_older_than(month_ago)
+                
+                # Удаляем неудачные задачи старше 7 дней
+                week_ago = datetime.now() - timedelta(days=7)
+                old_failed_tasks = await PostTaskRepository(db).delete_failed_older_than(week_ago)
+                
+                # Пересчет сводки контента с нуля: поправка накопленного расхождения счетчиков
+                await ContentStatsRepository(db).rebuild()
+                
+                await db.commit()
+                
+                # Брошенные загрузки видео
+                await video_ingest.cleanup_expired()
+                
+                logger.info(f"✅ MediaFlux Hub: Удалено {old_logs_count} старых логов и {old_failed_tasks} неудачных задач")
+                
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка очистки данных: {e}")
+                await db.rollback()
     
-    async def scan_content_folders(self):
-        """Сканирование папок с контентом"""
-        logger.info("📁 MediaFlux Hub: Сканирование папок с контентом...")
-        
+    async def reconcile_content_folders(self):
+        """Сверка каталога видео с папками контента"""
         try:
-            folders_scanned = await self.content_service.scan_content_folders()
-            logger.info(f"✅ MediaFlux Hub: Отсканировано {len(folders_scanned)} папок")
+            await self.content_watcher.reconcile()
         except Exception as e:
-            logger.error(f"💥 MediaFlux Hub: Ошибка сканирования контента: {e}")
+            logger.error(f"💥 MediaFlux Hub: Ошибка сверки папок контента: {e}")
     
     def get_scheduler_stats(self) -> Dict[str, Any]:
         """Получение статистики планировщика"""
         return {
             'is_running': self.is_running,
             'scheduled_jobs': len(self.scheduler.get_jobs()) if self.is_running else 0,
+            'worker_id': self.task_queue.worker_id,
+            'inflight_tasks': len(self.task_queue.inflight),
+            'timeline_tasks': len(self.task_timeline),
+            'next_dispatch': self.task_timeline.next_deadline(),
+            'pipeline': self.pipeline.get_pipeline_stats(),
+            'container_poller': container_poller.get_poller_stats(),
+            'video_catalog': video_catalog.get_catalog_stats(),
+            'video_rotation': video_rotation.get_rotation_stats(),
+            'folder_allocator': folder_allocator.get_allocator_stats(),
+            'fleet_planner': fleet_planner.get_planner_stats(),
+            'content_hasher': content_hasher.get_hasher_stats(),
+            'object_storage': object_storage.get_storage_stats(),
+            'prestage': self.prestager.get_prestage_stats(),
+            'content_watcher': self.content_watcher.get_watcher_stats(),
+            'ingest': video_ingest.get_ingest_stats(),
+            'captions': caption_index.get_caption_stats(),
+            'video_probe': video_prober.get_probe_stats(),
+            'video_fingerprint': video_fingerprinter.get_fingerprint_stats(),
+            'transcoder': transcoding_farm.get_transcoder_stats(),
             **self.stats
         } 
\ No newline at end of file
@@ -11,7 +11,14 @@ from typing import Dict, Any, List, Optional
 from pathlib import Path
 
 from app.config import settings
-from app.database import SessionLocal, Account, PostTask, SystemLog, SystemSettings
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal, SystemSettings
+from app.repositories.accounts import AccountRepository
+from app.repositories.post_tasks import PostTaskRepository
+from app.repositories.content_stats import ContentStatsRepository
+from app.repositories.system_logs import SystemLogRepository
+from app.services.http_sessions import http_sessions
 
 logger = logging.getLogger("mediaflux_hub.system")
 
@@ -125,11 +132,9 @@ class SystemService:
     async def _check_database_health(self) -> bool:
         """Проверка здоровья базы данных"""
         try:
-            db = SessionLocal()
-            
-            # Простой запрос для проверки соединения
-            result = db.execute("SELECT 1").scalar()
-            db.close()
+            async with AsyncSessionLocal() as db:
+                # Простой запрос для проверки соединения
+                result = (await db.execute(text("SELECT 1"))).scalar()
             
             return result == 1
             
@@ -152,13 +157,13 @@ class SystemService:
         """Проверка доступности Instagram API"""
         try:
             timeout = aiohttp.ClientTimeout(total=10)
+            session = http_sessions.get()
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                # Проверяем доступность Graph API
-                url = f"{settings.INSTAGRAM_BASE_URL}/{settings.INSTAGRAM_API_VERSION}/"
-                
-                async with session.get(url) as response:
-                    return response.status in [200, 400]  # 400 - это нормально без токена
+            # Проверяем доступность Graph API
+            url = f"{settings.INSTAGRAM_BASE_URL}/{settings.INSTAGRAM_API_VERSION}/"
+            
+            async with session.get(url, timeout=timeout) as response:
+                return response.status in [200, 400]  # 400 - это нормально без токена
                     
         except Exception as e:
             logger.warning(f"⚠️ MediaFlux Hub: Instagram API недоступен: {e}")
@@ -213,42 +218,40 @@ class SystemService:
             return self._stats_cache
         
         try:
-            db = SessionLocal()
-            
-            # Статистика аккаунтов
-            total_accounts = db.query(Account).count()
-            active_accounts = db.query(Account).filter(Account.status == 'active').count()
-            limited_accounts = db.query(Account).filter(Account.status == 'limited').count()
-            banned_accounts = db.query(Account).filter(Account.status == 'banned').count()
-            
-            # Статистика постов за разные периоды
-            now = datetime.now()
-            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            week_ago = now - timedelta(days=7)
-            month_ago = now - timedelta(days=30)
-            
-            posts_today = db.query(PostTask).filter(
-                PostTask.status == 'completed',
-                PostTask.completed_at >= today
-            ).count()
-            
-            posts_week = db.query(PostTask).filter(
-                PostTask.status == 'completed',
-                PostTask.completed_at >= week_ago
-            ).count()
-            
-            posts_month = db.query(PostTask).filter(
-                PostTask.status == 'completed',
-                PostTask.completed_at >= month_ago
-            ).count()
-            
-            # Статистика задач
-            pending_tasks = db.query(PostTask).filter(PostTask.status == 'pending').count()
-            processing_tasks = db.query(PostTask).filter(PostTask.status == 'processing').count()
-            failed_tasks_today = db.query(PostTask).filter(
-                PostTask.status == 'failed',
-                PostTask.updated_at >= today
-            ).count()
+            async with AsyncSessionLocal() as db:
+                account_repository = AccountRepository(db)
+                task_repository = PostTaskRepository(db)
+                
+                # Статистика аккаунтов
+                total_accounts = await account_repository.count()
+                active_accounts = await account_repository.count('active')
+                limited_accounts = await account_repository.count('limited')
+                banned_accounts = await account_repository.count('banned')
+                
+                # Статистика постов за разные периоды
+                now = datetime.now()
+                today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+                week_ago = now - timedelta(days=7)
+                month_ago = now - timedelta(days=30)
+                
+                posts_today = await task_repository.count('completed', completed_at=today)
+                posts_week = await task_repository.count('completed', completed_at=week_ago)
+                posts_month = await task_repository.count('completed', completed_at=month_ago)
+                
+                # Статистика задач
+                pending_tasks = await task_repository.count('pending')
+                processing_tasks = await task_repository.count('processing')
+                failed_tasks_today = await task_repository.count('failed', updated_at=today)
+                
+                # Сводка по категориям контента (строится при первом обращении)
+                stats_repository = ContentStatsRepository(db)
+                categories = await stats_repository.list_categories()
+                if not categories:
+                    categories = await stats_repository.rebuild(backfill=True)
+                    await db.commit()
+                
+                # Топ аккаунты по постам
+                top_accounts = await task_repository.top_accounts(week_ago, limit=10)
             
             # Системные метрики
             cpu_percent = psutil.cpu_percent(interval=1)
@@ -256,33 +259,14 @@ class SystemService:
             disk = psutil.disk_usage('/')
             
             # Статистика по категориям контента
-            from app.database import ContentFolder
-            content_stats = {}
-            folders = db.query(ContentFolder).all()
-            
-            for folder in folders:
-                category = folder.category
-                if category not in content_stats:
-                    content_stats[category] = {
-                        'folders': 0,
-                        'total_videos': 0,
-                        'used_videos': 0
-                    }
-                
-                content_stats[category]['folders'] += 1
-                content_stats[category]['total_videos'] += folder.total_videos
-                content_stats[category]['used_videos'] += folder.used_videos
-            
-            # Топ аккаунты по постам
-            top_accounts = db.execute("""
-                SELECT a.username, COUNT(pt.task_id) as posts_count
-                FROM accounts a
-                LEFT JOIN post_tasks pt ON a.id = pt.account_id 
-                WHERE pt.status = 'completed' AND pt.completed_at >= ?
-                GROUP BY a.id, a.username
-                ORDER BY posts_count DESC
-                LIMIT 10
-            """, (week_ago,)).fetchall()
+            content_stats = {
+                row.category: {
+                    'folders': row.folders,
+                    'total_videos': row.total_videos,
+                    'used_videos': row.used_videos
+                }
+                for row in categories
+            }
             
             stats = {
                 # Общая информация
@@ -344,7 +328,6 @@ class SystemService:
             self._stats_cache = stats
             self._last_cache_update = now
             
-            db.close()
             return stats
             
         except Exception as e:
@@ -362,20 +345,16 @@ class SystemService:
     ):
         """Запись события в системный лог"""
         try:
-            db = SessionLocal()
-            
-            log_entry = SystemLog(
-                level=level,
-                message=message,
-                account_id=account_id,
-                task_id=task_id,
-                component=component,
-                details=str(details) if details else None
-            )
-            
-            db.add(log_entry)
-            db.commit()
-            db.close()
+            async with AsyncSessionLocal() as db:
+                SystemLogRepository(db).add(
+                    level=level,
+                    message=message,
+                    details=str(details) if details else None,
+                    account_id=account_id,
+                    task_id=task_id,
+                    component=component
+                )
+                await db.commit()
             
         except Exception as e:
             logger.error(f"💥 MediaFlux Hub: Ошибка записи в системный лог: {e}")
@@ -389,24 +368,11 @@ class SystemService:
     ) -> List[Dict[str, Any]]:
         """Получение системных логов"""
         try:
-            db = SessionLocal()
-            
-            # Базовый запрос
-            query = db.query(SystemLog)
-            
             # Фильтр по времени
             since = datetime.now() - timedelta(hours=hours)
-            query = query.filter(SystemLog.created_at >= since)
-            
-            # Фильтры
-            if level:
-                query = query.filter(SystemLog.level == level)
-            
-            if component:
-                query = query.filter(SystemLog.component == component)
             
-            # Сортировка и лимит
-            logs = query.order_by(SystemLog.created_at.desc()).limit(limit).all()
+            async with AsyncSessionLocal() as db:
+                logs = await SystemLogRepository(db).list_recent(since, limit, level, component)
             
             result = []
             for log in logs:
@@ -421,7 +387,6 @@ class SystemService:
                     'created_at': log.created_at.isoformat()
                 })
             
-            db.close()
             return result
             
         except Exception as e:
@@ -431,15 +396,12 @@ class SystemService:
     async def get_system_setting(self, key: str, default: Any = None) -> Any:
         """Получение системной настройки"""
         try:
-            db = SessionLocal()
-            
-            setting = db.query(SystemSettings).filter(SystemSettings.key == key).first()
+            async with AsyncSessionLocal() as db:
+                setting = await db.get(SystemSettings, key)
             
             if setting:
-                db.close()
                 return setting.value
             
-            db.close()
             return default
             
         except Exception as e:
@@ -449,25 +411,23 @@ class SystemService:
     async def set_system_setting(self, key: str, value: str, description: str = None):
         """Установка системной настройки"""
         try:
-            db = SessionLocal()
-            
-            setting = db.query(SystemSettings).filter(SystemSettings.key == key).first()
-            
-            if setting:
-                setting.value = value
-                if description:
-                    setting.description = description
-                setting.updated_at = datetime.now()
-            else:
-                setting = SystemSettings(
-                    key=key,
-                    value=value,
-                    description=description
-                )
-                db.add(setting)
-            
-            db.commit()
-            db.close()
+            async with AsyncSessionLocal() as db:
+                setting = await db.get(SystemSettings, key)
+                
+                if setting:
+                    setting.value = value
+                    if description:
+                        setting.description = description
+                    setting.updated_at = datetime.now()
+                else:
+                    setting = SystemSettings(
+                        key=key,
+                        value=value,
+                        description=description
+                    )
+                    db.add(setting)
+                
+                await db.commit()
             
             logger.info(f"⚙️ MediaFlux Hub: Настройка обновлена: {key} = {value}")
             
@@ -477,20 +437,11 @@ class SystemService:
     async def cleanup_old_logs(self, days: int = 30):
         """Очистка старых логов"""
         try:
-            db = SessionLocal()
-            
             cutoff_date = datetime.now() - timedelta(days=days)
             
-            deleted_count = db.query(SystemLog).filter(
-                SystemLog.created_at < cutoff_date
-            ).count()
-            
-            db.query(SystemLog).filter(
-                SystemLog.created_at < cutoff_date
-            ).delete()
-            
-            db.commit()
-            db.close()
+            async with AsyncSessionLocal() as db:
+                deleted_count = await SystemLogRepository(db).delete_older_than(cutoff_date)
+                await db.commit()
             
             logger.info(f"🧹 MediaFlux Hub: Удалено {deleted_count} старых логов")
             
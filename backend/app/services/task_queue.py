@@ -0,0 +1,121 @@
+"""
+MediaFlux Hub - Task Queue
+Очередь задач публикации поверх post_tasks с арендой (lease)
+"""
+import os
+import uuid
+import socket
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Iterable, Set, Tuple
+
+from app.config import settings
+from app.database import AsyncSessionLocal, PostTask
+from app.repositories.post_tasks import PostTaskRepository
+
+logger = logging.getLogger("mediaflux_hub.queue")
+
+
+class PostTaskQueue:
+    """
+    MediaFlux Hub - Очередь задач публикации.
+
+    Задача захватывается одним UPDATE: pending -> processing с владельцем
+    аренды и временем ее окончания. Пока задача в работе, воркер продлевает
+    аренду (heartbeat). Если воркер упал, reaper возвращает задачу в pending
+    после истечения аренды. Это позволяет запускать несколько диспетчеров
+    на одной базе без двойных публикаций.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, lease_seconds: Optional[int] = None):
+        self.worker_id = (
+            worker_id
+            or settings.WORKER_ID
+            or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        )
+        self.lease_seconds = lease_seconds or settings.QUEUE_LEASE_SECONDS
+
+        # Задачи, которые этот воркер сейчас обрабатывает
+        self.inflight: Set[str] = set()
+
+    async def claim_batch(self, limit: Optional[int] = None) -> List[PostTask]:
+        """Атомарный захват пачки готовых к выполнению задач"""
+        limit = limit or settings.QUEUE_BATCH_SIZE
+        now = datetime.now()
+        lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+
+        async with AsyncSessionLocal() as db:
+            try:
+                claimed = await PostTaskRepository(db).claim_due(
+                    self.worker_id, now, lease_expires_at, limit
+                )
+                await db.commit()
+
+                self.inflight.update(task.task_id for task in claimed)
+
+                if claimed:
+                    logger.debug(f"📥 MediaFlux Hub: Воркер {self.worker_id} захватил {len(claimed)} задач")
+                return claimed
+
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка захвата задач из очереди: {e}")
+                await db.rollback()
+                return []
+
+    async def heartbeat(self, task_ids: Optional[Iterable[str]] = None) -> int:
+        """Продление аренды задач, которые еще в работе"""
+        task_ids = list(task_ids if task_ids is not None else self.inflight)
+        if not task_ids:
+            return 0
+
+        lease_expires_at = datetime.now() + timedelta(seconds=self.lease_seconds)
+        async with AsyncSessionLocal() as db:
+            try:
+                renewed = await PostTaskRepository(db).renew_leases(
+                    task_ids, self.worker_id, lease_expires_at
+                )
+                await db.commit()
+
+                if renewed < len(task_ids):
+                    logger.warning(f"⚠️ MediaFlux Hub: Потеряна аренда {len(task_ids) - renewed} задач воркера {self.worker_id}")
+
+                return renewed
+
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка продления аренды задач: {e}")
+                await db.rollback()
+                return 0
+
+    async def begin_attempt(self, task_id: str) -> bool:
+        """Учет попытки публикации; False - аренда задачи уже потеряна"""
+        async with AsyncSessionLocal() as db:
+            try:
+                started = await PostTaskRepository(db).begin_attempt(task_id, self.worker_id)
+                await db.commit()
+                return started
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка учета попытки задачи {task_id}: {e}")
+                await db.rollback()
+                return False
+
+    def release(self, task_id: str):
+        """Задача больше не обрабатывается этим воркером"""
+        self.inflight.discard(task_id)
+
+    async def reap_expired(self) -> Tuple[int, int]:
+        """Возврат в очередь задач с истекшей арендой"""
+        async with AsyncSessionLocal() as db:
+            try:
+                # Исчерпавшие попытки задачи не возвращаем в очередь
+                requeued, failed = await PostTaskRepository(db).reap_expired_leases(datetime.now())
+                await db.commit()
+
+                if requeued or failed:
+                    logger.warning(f"♻️ MediaFlux Hub: Возвращено в очередь {requeued} задач, провалено {failed} (истекла аренда)")
+
+                return requeued, failed
+
+            except Exception as e:
+                logger.error(f"💥 MediaFlux Hub: Ошибка возврата задач с истекшей арендой: {e}")
+                await db.rollback()
+                return 0, 0
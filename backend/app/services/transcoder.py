@@ -0,0 +1,345 @@
+"""
+MediaFlux Hub - Transcoding Farm
+Фоновое перекодирование видео под требования Reels с кэшем результатов по хешу исходника
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import psutil
+
+from app.config import settings
+from app.services.content_hasher import content_hasher
+from app.services.video_probe import ProbeResult, check_reels_spec, is_transcodable, video_prober
+
+logger = logging.getLogger("mediaflux_hub.transcoder")
+
+# Версия параметров ffmpeg: входит в имя результата, смена параметров = новый кэш
+PROFILE = "reels-h264-v1"
+
+
+@dataclass
+class TranscodeJob:
+    """Задание на перекодирование исходника"""
+    source_hash: str
+    source_path: str
+    output_path: str
+    duration: Optional[float]
+    frame_rate: Optional[float]
+    priority: datetime  # Ближайшее время публикации
+    state: str = 'queued'  # queued, running, done, failed
+    attempts: int = 0  # Проваленных запусков ffmpeg
+    retry_at: Optional[float] = None  # Когда проваленное задание можно повторить; None - ошибка окончательная
+    progress: float = 0.0
+    cpu_seconds: float = 0.0
+    error: Optional[str] = None
+    queued_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'source': os.path.basename(self.source_path),
+            'state': self.state,
+            'priority': self.priority.isoformat(),
+            'progress': round(self.progress, 3),
+            'attempts': self.attempts,
+            'cpu_seconds': round(self.cpu_seconds, 2),
+            'wall_seconds': round((self.finished_at or time.time()) - self.started_at, 2) if self.started_at else None,
+            'error': self.error
+        }
+
+    @property
+    def terminal(self) -> bool:
+        """Задание провалено окончательно и повторяться не будет"""
+        return self.state == 'failed' and self.retry_at is None
+
+
+class FfmpegUnavailable(RuntimeError):
+    """ffmpeg не найден - ошибка окружения, а не исходника; попыткой не считается"""
+
+
+def build_ffmpeg_args(ffmpeg: str, source: str, output: str, frame_rate: Optional[float] = None) -> List[str]:
+    """Параметры ffmpeg: H.264/AAC, вписывание в REELS_MAX_DIMENSION, ограничение fps, битрейта и длины"""
+    side = settings.REELS_MAX_DIMENSION
+    args = [
+        ffmpeg, '-y', '-v', 'error', '-nostdin', '-progress', 'pipe:1',
+        '-i', source,
+        '-t', str(settings.REELS_MAX_DURATION_SECONDS),
+        '-vf', f"scale='min({side},iw)':'min({side},ih)':force_original_aspect_ratio=decrease:force_divisible_by=2",
+    ]
+    if frame_rate and not settings.REELS_MIN_FRAME_RATE <= frame_rate <= settings.REELS_MAX_FRAME_RATE:
+        args += ['-r', str(settings.TRANSCODE_FRAME_RATE)]
+
+    return args + [
+        '-c:v', 'libx264', '-preset', settings.TRANSCODE_PRESET, '-crf', str(settings.TRANSCODE_CRF),
+        '-maxrate', f'{settings.TRANSCODE_MAX_BITRATE_KBPS}k', '-bufsize', f'{settings.TRANSCODE_MAX_BITRATE_KBPS * 2}k',
+        '-pix_fmt', 'yuv420p', '-profile:v', 'high',
+        '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
+        '-movflags', '+faststart',
+        '-threads', str(settings.TRANSCODE_THREADS_PER_JOB),
+        '-f', 'mp4', output
+    ]
+
+
+class TranscodingFarm:
+    """
+    MediaFlux Hub - Ферма перекодирования.
+
+    Видео, не подходящие под требования Reels, но исправимые
+    перекодированием, ставятся в очередь с приоритетом по ближайшему
+    scheduled_time задач, которые их публикуют. Одновременно работает не
+    больше TRANSCODE_WORKERS процессов ffmpeg. Результат лежит в
+    TRANSCODE_OUTPUT_DIR под именем из sha256 исходника и версии профиля,
+    поэтому исходник перекодируется один раз, сколько бы аккаунтов его
+    ни публиковали, и результат переживает перезапуск.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._counter = itertools.count()
+        self._jobs: Dict[str, TranscodeJob] = {}
+        self._finished: Deque[TranscodeJob] = deque(maxlen=50)
+        self._available = asyncio.Semaphore(0)
+        self._workers: List[asyncio.Task] = []
+
+        self.stats = {'completed': 0, 'failed': 0, 'cache_hits': 0, 'cpu_seconds': 0.0}
+
+    @property
+    def output_dir(self) -> Path:
+        return Path(settings.TRANSCODE_OUTPUT_DIR)
+
+    def output_path(self, source_hash: str) -> Path:
+        """Путь результата перекодирования исходника"""
+        return self.output_dir / f"{source_hash}-{PROFILE}.mp4"
+
+    def ready_output(self, source_hash: str) -> Optional[str]:
+        """Готовый результат перекодирования или None"""
+        path = self.output_path(source_hash)
+        return str(path) if path.exists() else None
+
+    def start(self):
+        """Запуск воркеров (при первой постановке задания)"""
+        if self._workers:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(settings.TRANSCODE_WORKERS):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"transcoder-{i}"))
+        logger.info(f"🎬 MediaFlux Hub: Ферма перекодирования запущена ({settings.TRANSCODE_WORKERS} воркеров)")
+
+    async def stop(self):
+        """Остановка воркеров; запущенные ffmpeg завершаются"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def submit(self, source_path: str, scheduled_time: datetime, source_hash: Optional[str] = None) -> Optional[TranscodeJob]:
+        """
+        Постановка исходника в очередь (или повышение приоритета уже стоящего).
+        None - результат уже готов.
+        """
+        source_hash = source_hash or await content_hasher.hash(source_path)
+        if self.ready_output(source_hash):
+            self.stats['cache_hits'] += 1
+            return None
+
+        job = self._jobs.get(source_hash)
+        if job and job.state == 'failed':
+            if job.terminal or time.time() < job.retry_at:
+                return job
+            # Пауза после временной ошибки прошла - задание снова в очереди
+            job.state, job.error, job.priority = 'queued', None, scheduled_time
+            job.queued_at, job.started_at, job.finished_at = time.time(), None, None
+            heapq.heappush(self._heap, (job.priority, next(self._counter), source_hash))
+            self._available.release()
+            self.start()
+            return job
+        if job and job.state == 'running':
+            return job
+
+        if job is None:
+            probe = video_prober.result_for(source_hash)
+            job = TranscodeJob(
+                source_hash=source_hash,
+                source_path=source_path,
+                output_path=str(self.output_path(source_hash)),
+                duration=probe.duration if probe else None,
+                frame_rate=probe.frame_rate if probe else None,
+                priority=scheduled_time,
+                queued_at=time.time()
+            )
+            self._jobs[source_hash] = job
+        elif scheduled_time >= job.priority:
+            return job
+        else:
+            # Старая запись в куче станет устаревшей и будет пропущена
+            job.priority = scheduled_time
+
+        heapq.heappush(self._heap, (job.priority, next(self._counter), source_hash))
+        self._available.release()
+        self.start()
+        return job
+
+    def _next_job(self) -> Optional[TranscodeJob]:
+        """Задание с самым ранним временем публикации; устаревшие записи пропускаются"""
+        while self._heap:
+            priority, _, source_hash = heapq.heappop(self._heap)
+            job = self._jobs.get(source_hash)
+            if job and job.state == 'queued' and job.priority == priority:
+                return job
+        return None
+
+    async def _worker(self):
+        """Воркер: один процесс ffmpeg за раз"""
+        while True:
+            await self._available.acquire()
+            job = self._next_job()
+            if job is None:
+                continue
+            try:
+                await self._transcode(job)
+            except asyncio.CancelledError:
+                # Остановка - не ошибка исходника: задание возвращается в очередь
+                job.state, job.progress, job.started_at = 'queued', 0.0, None
+                heapq.heappush(self._heap, (job.priority, next(self._counter), job.source_hash))
+                self._available.release()
+                raise
+            except Exception as e:
+                self._fail(job, e)
+            else:
+                self.stats['completed'] += 1
+                self._jobs.pop(job.source_hash, None)
+            finally:
+                self.stats['cpu_seconds'] += job.cpu_seconds
+                if job.state != 'queued':
+                    job.finished_at = time.time()
+                    self._finished.append(job)
+
+    def _fail(self, job: TranscodeJob, error: Exception):
+        """
+        Проваленное задание остается в _jobs, чтобы не перекодировать исходник
+        по кругу, но повторяется после паузы, пока не исчерпаны попытки
+        """
+        self.stats['failed'] += 1
+        if not isinstance(error, FfmpegUnavailable):
+            job.attempts += 1
+        job.state, job.error = 'failed', str(error)
+
+        if job.attempts >= settings.TRANSCODE_MAX_ATTEMPTS:
+            job.retry_at = None
+            logger.error(f"💥 MediaFlux Hub: Ошибка перекодирования {job.source_path}, попытки исчерпаны: {error}")
+            return
+
+        backoff = settings.TRANSCODE_FAILURE_BACKOFF_MINUTES * 60 * 2 ** max(job.attempts - 1, 0)
+        job.retry_at = time.time() + backoff
+        attempt = f"попытка {job.attempts} из {settings.TRANSCODE_MAX_ATTEMPTS}, " if job.attempts else ""
+        logger.error(
+            f"💥 MediaFlux Hub: Ошибка перекодирования {job.source_path} "
+            f"({attempt}повтор через {backoff // 60} мин): {error}"
+        )
+
+    async def _transcode(self, job: TranscodeJob):
+        """Запуск ffmpeg с разбором прогресса и учетом процессорного времени"""
+        ffmpeg = shutil.which(settings.FFMPEG_BINARY)
+        if not ffmpeg:
+            raise FfmpegUnavailable("ffmpeg не найден")
+
+        job.state, job.started_at = 'running', time.time()
+        temp_path = f"{job.output_path}.{os.getpid()}.tmp"
+        logger.info(f"🎬 MediaFlux Hub: Перекодирование {os.path.basename(job.source_path)} (публикация {job.priority:%d.%m %H:%M})")
+
+        process = await asyncio.create_subprocess_exec(
+            *build_ffmpeg_args(ffmpeg, job.source_path, temp_path, job.frame_rate),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            ps_process = psutil.Process(process.pid)
+        except psutil.Error:
+            ps_process = None
+
+        stderr_tail: Deque[bytes] = deque(maxlen=20)
+
+        async def drain_stderr():
+            async for line in process.stderr:
+                stderr_tail.append(line)
+
+        stderr_task = asyncio.create_task(drain_stderr())
+        try:
+            async for line in process.stdout:
+                key, _, value = line.decode(errors='replace').strip().partition('=')
+                if key == 'out_time_us' and value.isdigit() and job.duration:
+                    job.progress = min(int(value) / 1_000_000 / job.duration, 1.0)
+                    if ps_process:
+                        try:
+                            cpu = ps_process.cpu_times()
+                            job.cpu_seconds = cpu.user + cpu.system
+                        except psutil.Error:
+                            pass
+            returncode = await process.wait()
+            await stderr_task
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            stderr_task.cancel()
+            _remove(temp_path)
+            raise
+
+        if returncode != 0:
+            _remove(temp_path)
+            raise RuntimeError(b''.join(stderr_tail).decode(errors='replace').strip()[-500:] or f"ffmpeg: код {returncode}")
+
+        result = await video_prober.probe(temp_path)
+        conforms, reason = check_reels_spec(result)
+        if not conforms:
+            _remove(temp_path)
+            raise RuntimeError(f"Результат не подходит для Reels: {reason}")
+
+        os.replace(temp_path, job.output_path)
+        job.state, job.progress = 'done', 1.0
+        logger.info(
+            f"✅ MediaFlux Hub: Перекодировано {os.path.basename(job.source_path)} "
+            f"за {time.time() - job.started_at:.1f} c (CPU {job.cpu_seconds:.1f} c)"
+        )
+
+    def get_transcoder_stats(self) -> Dict[str, Any]:
+        """Очередь, прогресс заданий и процессорное время"""
+        jobs = list(self._jobs.values())
+        return {
+            'workers': len(self._workers),
+            'queued': sum(1 for job in jobs if job.state == 'queued'),
+            'running': [job.as_dict() for job in jobs if job.state == 'running'],
+            'recent': [job.as_dict() for job in list(self._finished)[-10:]],
+            **{key: round(value, 2) if isinstance(value, float) else value for key, value in self.stats.items()}
+        }
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def needs_transcoding(result: Optional[ProbeResult]) -> bool:
+    """Видео не подходит под требования, но исправимо перекодированием"""
+    return (
+        settings.TRANSCODE_ENABLED
+        and result is not None
+        and not check_reels_spec(result)[0]
+        and is_transcodable(result)
+    )
+
+
+# Общая ферма перекодирования процесса
+transcoding_farm = TranscodingFarm()
@@ -0,0 +1,282 @@
+"""
+MediaFlux Hub - Video Catalog
+Каталог видео в папках контента: таблица videos и индекс в памяти
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import ContentFolder, Video
+from app.repositories.videos import VideoRepository
+
+logger = logging.getLogger("mediaflux_hub.catalog")
+
+# путь -> (size, mtime_ns, inode)
+FileStats = Dict[str, Tuple[int, int, int]]
+
+
+@dataclass
+class VideoEntry:
+    """Видео в индексе каталога"""
+    video_id: int
+    folder_id: str
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    content_hash: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, video: Video) -> "VideoEntry":
+        return cls(
+            video_id=video.id,
+            folder_id=video.folder_id,
+            path=video.path,
+            size=video.size,
+            mtime_ns=video.mtime_ns,
+            inode=video.inode,
+            content_hash=video.content_hash
+        )
+
+
+def _stats(entry: Optional[VideoEntry]) -> Optional[Tuple[int, int, int]]:
+    return (entry.size, entry.mtime_ns, entry.inode) if entry else None
+
+
+def scan_video_dir(path: str) -> Tuple[int, FileStats]:
+    """Один проход os.scandir по папке: mtime папки и статы видео файлов"""
+    extensions = {ext.lower() for ext in settings.ALLOWED_VIDEO_EXTENSIONS}
+
+    # mtime читаем до листинга: изменения во время прохода увидит следующий refresh
+    dir_mtime_ns = os.stat(path).st_mtime_ns
+    files: FileStats = {}
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            files[entry.path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    return dir_mtime_ns, files
+
+
+class VideoCatalog:
+    """
+    MediaFlux Hub - Каталог видео.
+
+    Индекс (folder_id, path) -> VideoEntry хранится в памяти и зеркалируется
+    в таблицу videos. Обновление инкрементальное: папка пересканируется
+    только если изменился ее mtime (файл добавлен, удален или переименован).
+    Выбор видео для публикаций читает только индекс, не файловую систему.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, VideoEntry]] = {}
+        self._by_id: Dict[int, VideoEntry] = {}
+        self._by_hash: Dict[str, VideoEntry] = {}
+        self._by_path: Dict[str, VideoEntry] = {}
+        self._dir_mtimes: Dict[str, int] = {}
+        # Версия состава папки: растет при каждом изменении списка ее видео
+        self._versions: Dict[str, int] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+        self.stats = {'refreshes': 0, 'dirs_scanned': 0, 'dirs_skipped': 0}
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Загрузка индекса из таблицы videos (один раз за процесс)"""
+        if self._loaded:
+            return
+
+        async with self._lock:
+            if self._loaded:
+                return
+
+            for video in await VideoRepository(db).list_all():
+                self._index(VideoEntry.from_model(video))
+
+            self._loaded = True
+            logger.info(f"🗂️ MediaFlux Hub: Каталог загружен: {self.total_videos()} видео")
+
+    async def refresh(self, db: AsyncSession, folders: Iterable[ContentFolder], force: bool = False) -> int:
+        """Пересканирование измененных папок; возвращает число изменений в каталоге"""
+        await self.ensure_loaded(db)
+
+        changes = 0
+        async with self._lock:
+            try:
+                for folder in folders:
+                    try:
+                        dir_mtime_ns = (await asyncio.to_thread(os.stat, folder.path)).st_mtime_ns
+                    except FileNotFoundError:
+                        logger.warning(f"📁 MediaFlux Hub: Папка не существует: {folder.path}")
+                        changes += await self._apply(db, folder.folder_id, None, {})
+                        continue
+
+                    if not force and self._dir_mtimes.get(folder.folder_id) == dir_mtime_ns:
+                        self.stats['dirs_skipped'] += 1
+                        continue
+
+                    dir_mtime_ns, files = await asyncio.to_thread(scan_video_dir, folder.path)
+                    changes += await self._apply(db, folder.folder_id, dir_mtime_ns, files)
+
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                self.invalidate()
+                raise
+
+        self.stats['refreshes'] += 1
+        if changes:
+            logger.info(f"🗂️ MediaFlux Hub: Каталог обновлен, изменений: {changes}")
+        return changes
+
+    async def apply_scan(self, db: AsyncSession, folder_id: str, dir_mtime_ns: int, files: FileStats) -> int:
+        """Применение готового результата scan_video_dir (commit - за вызывающим)"""
+        await self.ensure_loaded(db)
+        async with self._lock:
+            return await self._apply(db, folder_id, dir_mtime_ns, files)
+
+    async def apply_changes(self, db: AsyncSession, folder_id: str, files: FileStats, removed: Iterable[str]) -> int:
+        """
+        Точечное применение изменений отдельных файлов папки (commit - за вызывающим).
+        files - текущие статы появившихся и измененных файлов, removed - исчезнувшие пути.
+        mtime папки не запоминается: следующий refresh перепроверит ее листинг.
+        """
+        await self.ensure_loaded(db)
+        async with self._lock:
+            known = self._entries.setdefault(folder_id, {})
+            changed = {path: stats for path, stats in files.items() if _stats(known.get(path)) != stats}
+            return await self._write(db, folder_id, changed, [path for path in removed if path in known])
+
+    async def _apply(self, db: AsyncSession, folder_id: str, dir_mtime_ns: Optional[int], files: FileStats) -> int:
+        """Сравнение листинга папки с индексом и запись разницы в БД"""
+        self.stats['dirs_scanned'] += 1
+        known = self._entries.setdefault(folder_id, {})
+
+        changed = {path: stats for path, stats in files.items() if _stats(known.get(path)) != stats}
+        removed = [path for path in known if path not in files]
+        changes = await self._write(db, folder_id, changed, removed)
+
+        if dir_mtime_ns is None:
+            self._dir_mtimes.pop(folder_id, None)
+        else:
+            self._dir_mtimes[folder_id] = dir_mtime_ns
+
+        return changes
+
+    async def _write(self, db: AsyncSession, folder_id: str, changed: FileStats, removed: List[str]) -> int:
+        """Запись разницы в БД и индекс"""
+        known = self._entries.setdefault(folder_id, {})
+        repository = VideoRepository(db)
+        if changed:
+            for video in await repository.upsert(folder_id, changed):
+                self._index(VideoEntry.from_model(video))
+        if removed:
+            await repository.delete_paths(folder_id, removed)
+            for path in removed:
+                self._unindex(known.pop(path))
+        if changed or removed:
+            self._versions[folder_id] = self._versions.get(folder_id, 0) + 1
+
+        return len(changed) + len(removed)
+
+    def _index(self, entry: VideoEntry):
+        """Добавление (замена) записи в индексах по папке, пути, ID и хешу"""
+        previous = self._entries.get(entry.folder_id, {}).get(entry.path)
+        if previous:
+            self._unindex(previous)
+
+        self._entries.setdefault(entry.folder_id, {})[entry.path] = entry
+        self._by_id[entry.video_id] = entry
+        self._by_path[entry.path] = entry
+        if entry.content_hash:
+            self._by_hash[entry.content_hash] = entry
+
+    def _unindex(self, entry: VideoEntry):
+        """Удаление записи из индексов по ID, пути и хешу"""
+        self._by_id.pop(entry.video_id, None)
+        if self._by_path.get(entry.path) is entry:
+            del self._by_path[entry.path]
+        if entry.content_hash and self._by_hash.get(entry.content_hash) is entry:
+            del self._by_hash[entry.content_hash]
+
+    def set_content_hash(self, entry: VideoEntry, content_hash: str):
+        """Запись посчитанного хеша в индекс"""
+        if entry.content_hash and self._by_hash.get(entry.content_hash) is entry:
+            del self._by_hash[entry.content_hash]
+        entry.content_hash = content_hash
+        self._by_hash[content_hash] = entry
+
+    def invalidate(self):
+        """Сброс индекса: следующий доступ перечитает таблицу videos и папки"""
+        self._entries.clear()
+        self._by_id.clear()
+        self._by_hash.clear()
+        self._by_path.clear()
+        self._dir_mtimes.clear()
+        self._versions = {folder_id: version + 1 for folder_id, version in self._versions.items()}
+        self._loaded = False
+
+    def entries(self) -> List[VideoEntry]:
+        """Все видео индекса"""
+        return list(self._by_id.values())
+
+    def load_snapshot(self, entries: Iterable[VideoEntry], versions: Dict[str, int]):
+        """Индекс из снимка другого процесса (воркеры планирования; без БД)"""
+        for entry in entries:
+            self._index(entry)
+        self._versions.update(versions)
+        self._loaded = True
+
+    def version(self, folder_id: str) -> int:
+        """Версия состава видео папки"""
+        return self._versions.get(folder_id, 0)
+
+    def folder_ids(self) -> List[str]:
+        """Папки, видео которых есть в индексе"""
+        return list(self._entries)
+
+    def by_id(self, video_id: int) -> Optional[VideoEntry]:
+        """Видео по ID каталога"""
+        return self._by_id.get(video_id)
+
+    def videos(self, folder_id: str) -> List[VideoEntry]:
+        """Видео папки из индекса"""
+        return list(self._entries.get(folder_id, {}).values())
+
+    def get(self, folder_id: str, path: str) -> Optional[VideoEntry]:
+        """Видео по папке и пути"""
+        return self._entries.get(folder_id, {}).get(path)
+
+    def by_hash(self, content_hash: str) -> Optional[VideoEntry]:
+        """Видео по sha256 содержимого"""
+        return self._by_hash.get(content_hash)
+
+    def find(self, path: str) -> Optional[VideoEntry]:
+        """Видео по пути в любой папке"""
+        return self._by_path.get(path)
+
+    def total_videos(self) -> int:
+        """Всего видео в индексе"""
+        return sum(len(entries) for entries in self._entries.values())
+
+    def get_catalog_stats(self) -> Dict[str, int]:
+        """Статистика каталога"""
+        return {
+            'folders': len(self._entries),
+            'videos': self.total_videos(),
+            **self.stats
+        }
+
+
+# Общий каталог для сервисов процесса
+video_catalog = VideoCatalog()
@@ -0,0 +1,317 @@
+"""
+MediaFlux Hub - Video Fingerprint
+Перцептивные хеши видео и поиск почти-дубликатов по расстоянию Хэмминга
+"""
+import asyncio
+import itertools
+import logging
+import shutil
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.repositories.video_metadata import VideoMetadataRepository
+from app.services.content_hasher import content_hasher
+from app.services.process_pools import new_process_pool
+from app.services.video_catalog import VideoEntry, video_catalog
+from app.services.video_probe import video_prober
+
+logger = logging.getLogger("mediaflux_hub.fingerprint")
+
+# Кадр для dHash: 9x8 в оттенках серого -> 64 бита
+FRAME_WIDTH, FRAME_HEIGHT = 9, 8
+
+
+def _read_frame(ffmpeg: str, path: str, position: float) -> Optional[bytes]:
+    """Кадр видео в позиции position, уменьшенный до 9x8 в оттенках серого"""
+    result = subprocess.run(
+        [
+            ffmpeg, '-v', 'error', '-ss', f'{position:.3f}', '-i', path,
+            '-frames:v', '1', '-vf', f'scale={FRAME_WIDTH}:{FRAME_HEIGHT}:flags=area,format=gray',
+            '-f', 'rawvideo', 'pipe:1'
+        ],
+        capture_output=True,
+        timeout=60
+    )
+    frame = result.stdout
+    return frame if result.returncode == 0 and len(frame) == FRAME_WIDTH * FRAME_HEIGHT else None
+
+
+def dhash(pixels: List[float]) -> int:
+    """dHash: бит на каждую пару соседних пикселей строки (левый ярче правого)"""
+    value = 0
+    for row in range(FRAME_HEIGHT):
+        offset = row * FRAME_WIDTH
+        for column in range(FRAME_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def fingerprint_file(ffmpeg: str, path: str, duration: float, frames: int) -> Optional[int]:
+    """
+    Перцептивный хеш видео: dHash среднего из frames кадров, взятых
+    равномерно по длительности. Перекодирование, смена битрейта и
+    контейнера меняют его на единицы бит. Выполняется в отдельном процессе.
+    """
+    totals = [0.0] * (FRAME_WIDTH * FRAME_HEIGHT)
+    sampled = 0
+    for i in range(frames):
+        frame = _read_frame(ffmpeg, path, duration * (i + 0.5) / frames)
+        if frame is None:
+            continue
+        for j, pixel in enumerate(frame):
+            totals[j] += pixel
+        sampled += 1
+
+    return dhash(totals) if sampled else None
+
+
+class HammingIndex:
+    """
+    MediaFlux Hub - Индекс 64-битных хешей для поиска по расстоянию Хэмминга.
+
+    Multi-index hashing: хеш делится на 4 части по 16 бит, по каждой части
+    своя таблица. Если расстояние между хешами не больше r, то хотя бы одна
+    часть отличается не больше чем на r // 4 бит, поэтому кандидаты - это
+    корзины всех вариантов частей запроса с таким числом перевернутых бит.
+    При 100k+ хешей корзина 16-битной части содержит единицы записей, и
+    поиск укладывается в доли миллисекунды.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = 16
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        chunk_radius = max_distance // self.CHUNKS
+        self._masks = [
+            sum(1 << bit for bit in bits)
+            for radius in range(chunk_radius + 1)
+            for bits in itertools.combinations(range(self.CHUNK_BITS), radius)
+        ]
+        self._tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in range(self.CHUNKS)]
+        self._values: Dict[int, int] = {}
+
+    def _chunks(self, value: int) -> Iterable[Tuple[int, int]]:
+        mask = (1 << self.CHUNK_BITS) - 1
+        for i in range(self.CHUNKS):
+            yield i, (value >> (i * self.CHUNK_BITS)) & mask
+
+    def add(self, key: int, value: int):
+        if key in self._values:
+            self.remove(key)
+        self._values[key] = value
+        for i, chunk in self._chunks(value):
+            self._tables[i][chunk].add(key)
+
+    def remove(self, key: int):
+        value = self._values.pop(key, None)
+        if value is None:
+            return
+        for i, chunk in self._chunks(value):
+            bucket = self._tables[i].get(chunk)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._tables[i][chunk]
+
+    def query(self, value: int) -> List[int]:
+        """Ключи хешей на расстоянии не больше max_distance"""
+        candidates: Set[int] = set()
+        for i, chunk in self._chunks(value):
+            table = self._tables[i]
+            for mask in self._masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+
+        return [
+            key for key in candidates
+            if bin(self._values[key] ^ value).count('1') <= self.max_distance
+        ]
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class VideoFingerprinter:
+    """
+    MediaFlux Hub - Поиск почти-дубликатов видео.
+
+    Перцептивный хеш считается в пуле процессов (кадры достает ffmpeg),
+    хранится в video_metadata по sha256 содержимого и индексируется по ID
+    видео каталога. Индекс дочитывает изменения каталога по версиям папок.
+    Точные копии (одинаковый sha256) находятся и без ffmpeg.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._fingerprints: Dict[str, int] = {}
+        self._failed: Set[str] = set()
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+        self._index = HammingIndex(settings.FINGERPRINT_MAX_DISTANCE)
+        self._indexed: Dict[int, Tuple[str, Optional[str]]] = {}  # video_id -> (folder_id, content_hash)
+        self._by_hash: Dict[str, Set[int]] = defaultdict(set)
+        self._folder_versions: Dict[str, int] = {}
+
+        self.stats = {'fingerprinted': 0, 'failed': 0, 'lookups': 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = new_process_pool(settings.FINGERPRINT_WORKERS)
+        return self._executor
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Загрузка сохраненных хешей в память (один раз на процесс)"""
+        if self._loaded:
+            return
+        async with self._lock:
+            if not self._loaded:
+                for metadata in await VideoMetadataRepository(db).list_all():
+                    if metadata.fingerprint:
+                        self._fingerprints[metadata.content_hash] = int(metadata.fingerprint, 16)
+                self._loaded = True
+
+    async def fingerprint_entries(self, entries: Iterable[VideoEntry]) -> int:
+        """Подсчет хешей видео, для которых их еще нет; возвращает число посчитанных"""
+        ffmpeg = shutil.which(settings.FFMPEG_BINARY)
+        if not ffmpeg:
+            logger.warning("⚠️ MediaFlux Hub: ffmpeg не найден, ищутся только точные копии видео")
+            return 0
+
+        pending = [
+            entry for entry in entries
+            if not entry.content_hash or (
+                entry.content_hash not in self._fingerprints and entry.content_hash not in self._failed
+            )
+        ]
+        if not pending:
+            return 0
+
+        semaphore = asyncio.Semaphore(settings.FINGERPRINT_WORKERS * 2)
+        loop = asyncio.get_running_loop()
+
+        async def fingerprint_one(entry: VideoEntry) -> bool:
+            async with semaphore:
+                try:
+                    content_hash = entry.content_hash or await content_hasher.hash(entry.path)
+                    if content_hash in self._fingerprints or content_hash in self._failed:
+                        return False
+
+                    probe = await video_prober.probe(entry.path, content_hash)
+                    fingerprint = None
+                    if probe.duration:
+                        fingerprint = await loop.run_in_executor(
+                            self._pool(), fingerprint_file, ffmpeg, entry.path, probe.duration, settings.FINGERPRINT_FRAMES
+                        )
+                    if fingerprint is None:
+                        self._failed.add(content_hash)
+                        self.stats['failed'] += 1
+                        return False
+
+                    async with AsyncSessionLocal() as db:
+                        await VideoMetadataRepository(db).save(content_hash, {'fingerprint': f'{fingerprint:016x}'})
+                        await db.commit()
+
+                    self._fingerprints[content_hash] = fingerprint
+                    self.stats['fingerprinted'] += 1
+                    return True
+                except Exception as e:
+                    logger.error(f"💥 MediaFlux Hub: Ошибка перцептивного хеша {entry.path}: {e}")
+                    return False
+
+        results = await asyncio.gather(*(fingerprint_one(entry) for entry in pending))
+        computed = sum(results)
+        logger.info(f"🧬 MediaFlux Hub: Перцептивных хешей посчитано: {computed} из {len(pending)}")
+
+        # Хеши появились у видео, уже попавших в индекс без них
+        self._folder_versions.clear()
+        return computed
+
+    async def fingerprint_catalog(self, db: AsyncSession, folder_ids: Iterable[str]) -> int:
+        """Подсчет хешей новых видео папок каталога перед планированием"""
+        await self.ensure_loaded(db)
+        entries = [entry for folder_id in folder_ids for entry in video_catalog.videos(folder_id)]
+        return await self.fingerprint_entries(entries)
+
+    def _sync(self):
+        """Дочитывание изменений каталога в индекс по версиям папок"""
+        folder_ids = set(video_catalog.folder_ids()) | set(self._folder_versions)
+        for folder_id in folder_ids:
+            version = video_catalog.version(folder_id)
+            if self._folder_versions.get(folder_id) == version:
+                continue
+
+            current = {entry.video_id: entry for entry in video_catalog.videos(folder_id)}
+            stale = [
+                video_id for video_id, (indexed_folder, _) in self._indexed.items()
+                if indexed_folder == folder_id and video_id not in current
+            ]
+            for video_id in stale:
+                self._unindex(video_id)
+            for entry in current.values():
+                if self._indexed.get(entry.video_id) != (folder_id, entry.content_hash) or (
+                    entry.content_hash in self._fingerprints and entry.video_id not in self._index
+                ):
+                    self._unindex(entry.video_id)
+                    self._index_entry(entry)
+
+            self._folder_versions[folder_id] = version
+
+    def _index_entry(self, entry: VideoEntry):
+        self._indexed[entry.video_id] = (entry.folder_id, entry.content_hash)
+        if entry.content_hash:
+            self._by_hash[entry.content_hash].add(entry.video_id)
+            fingerprint = self._fingerprints.get(entry.content_hash)
+            if fingerprint is not None:
+                self._index.add(entry.video_id, fingerprint)
+
+    def _unindex(self, video_id: int):
+        indexed = self._indexed.pop(video_id, None)
+        if indexed is None:
+            return
+        _, content_hash = indexed
+        if content_hash:
+            same = self._by_hash.get(content_hash)
+            if same:
+                same.discard(video_id)
+                if not same:
+                    del self._by_hash[content_hash]
+        self._index.remove(video_id)
+
+    def duplicates_of(self, entry: VideoEntry) -> Set[int]:
+        """ID видео каталога - точных копий и почти-дубликатов entry (без него самого)"""
+        self._sync()
+        self.stats['lookups'] += 1
+        if not entry.content_hash:
+            return set()
+
+        duplicates = set(self._by_hash.get(entry.content_hash, ()))
+        fingerprint = self._fingerprints.get(entry.content_hash)
+        if fingerprint is not None:
+            duplicates.update(self._index.query(fingerprint))
+
+        duplicates.discard(entry.video_id)
+        return duplicates
+
+    def get_fingerprint_stats(self) -> Dict[str, int]:
+        """Статистика поиска дубликатов"""
+        return {'known': len(self._fingerprints), 'indexed': len(self._index), **self.stats}
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+# Общий поиск дубликатов процесса
+video_fingerprinter = VideoFingerprinter()
@@ -0,0 +1,349 @@
+"""
+MediaFlux Hub - Video Probe
+Разбор MP4/MOV контейнеров в пуле процессов и проверка видео на требования Reels
+"""
+import asyncio
+import logging
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal, VideoMetadata
+from app.repositories.video_metadata import VideoMetadataRepository
+from app.services.content_hasher import content_hasher
+from app.services.process_pools import new_process_pool
+from app.services.video_catalog import VideoEntry, video_catalog
+
+logger = logging.getLogger("mediaflux_hub.probe")
+
+# Атомы, внутри которых лежат нужные нам атомы
+CONTAINER_ATOMS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# moov с индексами сэмплов обычно занимает единицы мегабайт
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+
+
+class ProbeError(Exception):
+    """Файл не является разбираемым MP4/MOV"""
+
+
+def _iter_atoms(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """Атомы буфера: (тип, начало содержимого, конец атома)"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size, = struct.unpack_from('>Q', data, offset + 8)
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ProbeError(f"Поврежденный атом {kind!r}")
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _read_moov(path: str) -> bytes:
+    """Поиск и чтение атома moov; mdat пропускается без чтения"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(16)
+            size, kind = struct.unpack_from('>I4s', header)
+            header_size = 8
+            if size == 1:
+                size, = struct.unpack_from('>Q', header, 8)
+                header_size = 16
+            elif size == 0:
+                size = file_size - offset
+            if size < header_size:
+                raise ProbeError(f"Поврежденный атом {kind!r}")
+
+            if kind == b'moov':
+                if size > MAX_MOOV_SIZE:
+                    raise ProbeError("Слишком большой атом moov")
+                f.seek(offset + header_size)
+                return f.read(size - header_size)
+
+            offset += size
+
+    raise ProbeError("Атом moov не найден")
+
+
+def _parse_track(data: bytes, start: int, end: int) -> Dict[str, Any]:
+    """Тип, кодек и параметры одного трека (trak)"""
+    track: Dict[str, Any] = {}
+
+    def walk(begin: int, finish: int):
+        for kind, body, atom_end in _iter_atoms(data, begin, finish):
+            version = data[body] if body < atom_end else 0
+            if kind in CONTAINER_ATOMS:
+                walk(body, atom_end)
+            elif kind == b'tkhd':
+                # Матрица и размеры идут после полей, длина которых зависит от версии
+                matrix_at = body + (4 + 8 + 8 + 4 + 4 + 8 if version == 1 else 4 + 4 + 4 + 4 + 4 + 4) + 8 + 8
+                a, b = struct.unpack_from('>ii', data, matrix_at)
+                width, height = struct.unpack_from('>II', data, matrix_at + 36)
+                track['width'], track['height'] = width >> 16, height >> 16
+                track['rotated'] = a == 0 and abs(b) == 0x10000
+            elif kind == b'mdhd':
+                if version == 1:
+                    timescale, duration = struct.unpack_from('>IQ', data, body + 4 + 16)
+                else:
+                    timescale, duration = struct.unpack_from('>II', data, body + 4 + 8)
+                track['timescale'], track['duration'] = timescale, duration
+            elif kind == b'hdlr':
+                track['handler'] = data[body + 8:body + 12]
+            elif kind == b'stsd':
+                entries, = struct.unpack_from('>I', data, body + 4)
+                if entries:
+                    track['codec'] = data[body + 12:body + 16].decode('latin-1')
+            elif kind == b'stts':
+                entries, = struct.unpack_from('>I', data, body + 4)
+                track['samples'] = sum(
+                    struct.unpack_from('>I', data, body + 8 + i * 8)[0] for i in range(entries)
+                )
+
+    walk(start, end)
+    return track
+
+
+def probe_file(path: str) -> Dict[str, Any]:
+    """
+    Метаданные MP4/MOV файла по атомам контейнера (без декодирования).
+    Выполняется в отдельном процессе: читается только moov, не mdat.
+    """
+    try:
+        moov = _read_moov(path)
+        duration = None
+        tracks = []
+        for kind, body, atom_end in _iter_atoms(moov):
+            if kind == b'mvhd':
+                version = moov[body]
+                if version == 1:
+                    timescale, length = struct.unpack_from('>IQ', moov, body + 4 + 16)
+                else:
+                    timescale, length = struct.unpack_from('>II', moov, body + 4 + 8)
+                if timescale:
+                    duration = length / timescale
+            elif kind == b'trak':
+                tracks.append(_parse_track(moov, body, atom_end))
+    except (ProbeError, struct.error, IndexError, OSError) as e:
+        return {'probe_error': str(e) or type(e).__name__}
+
+    metadata: Dict[str, Any] = {'duration': duration, 'probe_error': None}
+    video = next((t for t in tracks if t.get('handler') == b'vide'), None)
+    audio = next((t for t in tracks if t.get('handler') == b'soun'), None)
+
+    if video:
+        width, height = video.get('width'), video.get('height')
+        if video.get('rotated'):
+            width, height = height, width
+        metadata.update(width=width, height=height, video_codec=video.get('codec'))
+
+        if video.get('timescale') and video.get('duration') and video.get('samples'):
+            metadata['frame_rate'] = round(video['samples'] * video['timescale'] / video['duration'], 3)
+
+    if audio:
+        metadata['audio_codec'] = audio.get('codec')
+
+    if duration:
+        metadata['bitrate'] = int(os.path.getsize(path) * 8 / duration)
+
+    return metadata
+
+
+@dataclass
+class ProbeResult:
+    """Метаданные видео для проверки требований"""
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    frame_rate: Optional[float] = None
+    bitrate: Optional[int] = None
+    probe_error: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, metadata: VideoMetadata) -> "ProbeResult":
+        return cls(
+            duration=metadata.duration,
+            width=metadata.width,
+            height=metadata.height,
+            video_codec=metadata.video_codec,
+            audio_codec=metadata.audio_codec,
+            frame_rate=metadata.frame_rate,
+            bitrate=metadata.bitrate,
+            probe_error=metadata.probe_error
+        )
+
+
+def check_reels_spec(result: ProbeResult) -> Tuple[bool, str]:
+    """Проверка метаданных на требования Instagram Reels"""
+    if result.probe_error:
+        return False, f"Не удалось разобрать видео: {result.probe_error}"
+    if not result.video_codec:
+        return False, "Нет видеодорожки"
+    if result.video_codec not in settings.REELS_VIDEO_CODECS:
+        return False, f"Неподдерживаемый видеокодек: {result.video_codec}"
+    if result.audio_codec and result.audio_codec not in settings.REELS_AUDIO_CODECS:
+        return False, f"Неподдерживаемый аудиокодек: {result.audio_codec}"
+    if result.duration is None or not (
+        settings.REELS_MIN_DURATION_SECONDS <= result.duration <= settings.REELS_MAX_DURATION_SECONDS
+    ):
+        return False, f"Недопустимая длительность: {result.duration}"
+    if not result.width or not result.height:
+        return False, "Неизвестное разрешение"
+    if max(result.width, result.height) > settings.REELS_MAX_DIMENSION:
+        return False, f"Слишком большое разрешение: {result.width}x{result.height}"
+
+    aspect = result.width / result.height
+    if not settings.REELS_MIN_ASPECT_RATIO <= aspect <= settings.REELS_MAX_ASPECT_RATIO:
+        return False, f"Недопустимое соотношение сторон: {result.width}x{result.height}"
+    if result.frame_rate and not settings.REELS_MIN_FRAME_RATE <= result.frame_rate <= settings.REELS_MAX_FRAME_RATE:
+        return False, f"Недопустимая частота кадров: {result.frame_rate}"
+    if result.bitrate and result.bitrate > settings.REELS_MAX_BITRATE_KBPS * 1000:
+        return False, f"Слишком высокий битрейт: {result.bitrate // 1000} кбит/с"
+
+    return True, "OK"
+
+
+def is_transcodable(result: ProbeResult) -> bool:
+    """Несоответствие требованиям исправимо перекодированием (кодек, размер, fps, битрейт, длина)"""
+    return (
+        not result.probe_error
+        and bool(result.video_codec)
+        and bool(result.width and result.height)
+        and result.duration is not None
+        and result.duration >= settings.REELS_MIN_DURATION_SECONDS
+        and settings.REELS_MIN_ASPECT_RATIO <= result.width / result.height <= settings.REELS_MAX_ASPECT_RATIO
+    )
+
+
+class VideoProber:
+    """
+    MediaFlux Hub - Проба видео.
+
+    Контейнер разбирается в пуле процессов (PROBE_WORKERS), результат
+    сохраняется в video_metadata по sha256 содержимого и держится в
+    памяти, так что каждое видео разбирается один раз, сколько бы
+    аккаунтов его ни публиковали. Планировщик пробует новые видео
+    каталога до планирования и не выдает задачам видео, не
+    подходящие под требования Reels.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._results: Dict[str, ProbeResult] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+        self.stats = {'probed': 0, 'rejected': 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = new_process_pool(settings.PROBE_WORKERS)
+        return self._executor
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Загрузка сохраненных метаданных в память (один раз на процесс)"""
+        if self._loaded:
+            return
+        async with self._lock:
+            if not self._loaded:
+                for metadata in await VideoMetadataRepository(db).list_all():
+                    self._results[metadata.content_hash] = ProbeResult.from_model(metadata)
+                self._loaded = True
+
+    async def probe(self, path: str, content_hash: Optional[str] = None) -> ProbeResult:
+        """Метаданные видео: из кэша по хешу или разбором в пуле процессов"""
+        content_hash = content_hash or await content_hasher.hash(path)
+        result = self._results.get(content_hash)
+        if result is not None:
+            return result
+
+        loop = asyncio.get_running_loop()
+        values = await loop.run_in_executor(self._pool(), probe_file, path)
+        result = ProbeResult(**values)
+
+        async with AsyncSessionLocal() as db:
+            await VideoMetadataRepository(db).save(content_hash, values)
+            await db.commit()
+
+        self._results[content_hash] = result
+        self.stats['probed'] += 1
+
+        conforms, reason = check_reels_spec(result)
+        if not conforms:
+            self.stats['rejected'] += 1
+            logger.warning(f"🎞️ MediaFlux Hub: {os.path.basename(path)} не подходит для Reels: {reason}")
+        return result
+
+    async def check(self, path: str) -> Tuple[bool, str]:
+        """Проверка файла на требования Reels"""
+        return check_reels_spec(await self.probe(path))
+
+    async def probe_entries(self, entries: Iterable[VideoEntry]) -> int:
+        """Проба видео каталога без метаданных; возвращает число разобранных"""
+        pending = [
+            entry for entry in entries
+            if not entry.content_hash or entry.content_hash not in self._results
+        ]
+        if not pending:
+            return 0
+
+        semaphore = asyncio.Semaphore(settings.PROBE_WORKERS * 2)
+
+        async def probe_one(entry: VideoEntry):
+            async with semaphore:
+                try:
+                    await self.probe(entry.path, entry.content_hash)
+                except Exception as e:
+                    logger.error(f"💥 MediaFlux Hub: Ошибка пробы {entry.path}: {e}")
+
+        await asyncio.gather(*(probe_one(entry) for entry in pending))
+        logger.info(f"🎞️ MediaFlux Hub: Проверено видео: {len(pending)}")
+        return len(pending)
+
+    async def probe_catalog(self, db: AsyncSession, folder_ids: Iterable[str]) -> int:
+        """Проба новых видео папок каталога перед планированием"""
+        await self.ensure_loaded(db)
+        entries = [entry for folder_id in folder_ids for entry in video_catalog.videos(folder_id)]
+        return await self.probe_entries(entries)
+
+    def result_for(self, content_hash: Optional[str]) -> Optional[ProbeResult]:
+        """Сохраненные метаданные видео по хешу"""
+        return self._results.get(content_hash) if content_hash else None
+
+    def accepts(self, entry: VideoEntry) -> bool:
+        """
+        Видео можно выдавать задачам: подходит под требования или будет
+        перекодировано (при TRANSCODE_ENABLED); непроверенные видео допускаются
+        """
+        result = self.result_for(entry.content_hash)
+        if result is None or check_reels_spec(result)[0]:
+            return True
+        return settings.TRANSCODE_ENABLED and is_transcodable(result)
+
+    def get_probe_stats(self) -> Dict[str, int]:
+        """Статистика пробы видео"""
+        rejected = sum(1 for result in self._results.values() if not check_reels_spec(result)[0])
+        return {'known': len(self._results), 'non_conforming': rejected, **self.stats}
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+# Общая проба видео процесса
+video_prober = VideoProber()
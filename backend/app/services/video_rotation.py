@@ -0,0 +1,399 @@
+"""
+MediaFlux Hub - Video Rotation
+Колоды ротации видео: выбор неиспользованного видео аккаунта за O(1)
+"""
+import json
+import logging
+import random
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories.rotation_decks import RotationDeckRepository
+from app.services.video_catalog import VideoCatalog, VideoEntry, video_catalog
+
+logger = logging.getLogger("mediaflux_hub.rotation")
+
+# Попыток условной записи строки колоды, которую одновременно меняет другая сессия
+WRITE_ATTEMPTS = 5
+
+
+@dataclass
+class Deck:
+    """Колода видео аккаунта по папке"""
+    cards: List[int] = field(default_factory=list)
+    cursor: int = 0
+    posted: Set[int] = field(default_factory=set)
+    cycle: int = 0
+    catalog_version: Optional[int] = None
+    revision: int = 0  # Номер последнего изменения колоды в памяти
+    saved_revision: int = 0  # Последнее изменение, зафиксированное в БД
+    _positions: Optional[Dict[int, int]] = field(default=None, repr=False)
+
+    @property
+    def dirty(self) -> bool:
+        """Есть изменения, еще не зафиксированные в БД"""
+        return self.revision != self.saved_revision
+
+    @dirty.setter
+    def dirty(self, value: bool):
+        if value:
+            self.revision += 1
+        else:
+            self.saved_revision = self.revision
+
+    def set_cards(self, cards: List[int], cursor: int):
+        """Замена порядка карт колоды"""
+        self.cards = cards
+        self.cursor = cursor
+        self._positions = None
+        self.dirty = True
+
+    def is_dealt(self, card: int) -> bool:
+        """Карта выдана в текущем цикле (до курсора)"""
+        if self._positions is None:
+            self._positions = {video_id: position for position, video_id in enumerate(self.cards)}
+        position = self._positions.get(card)
+        return position is not None and position < self.cursor
+
+
+# Записанные в сессию колоды: ключ, колода и номер ее изменения на момент записи
+SavedDecks = List[Tuple[Tuple[str, str], Deck, int]]
+
+
+class VideoRotation:
+    """
+    MediaFlux Hub - Ротация видео по колодам.
+
+    Для каждой пары (аккаунт, папка) хранится перемешанная колода ID видео
+    каталога и курсор. Выбор видео - взять следующую карту; когда колода
+    выдана до конца, она перемешивается заново (новый цикл). Карты до курсора
+    выданы задачам; опубликованные отмечаются при завершении задачи, а
+    невыполненные (удаленные pending, проваленные) возвращаются в колоду.
+
+    Колоды целиком пишет только планирование; публикация и провал задачи
+    меняют в строке колоды лишь свои поля, поэтому незафиксированные
+    выдачи планирования не попадают в БД через чужую транзакцию.
+    """
+
+    def __init__(self, catalog: VideoCatalog = video_catalog):
+        self.catalog = catalog
+        self._decks: Dict[Tuple[str, str], Deck] = {}
+        # Аккаунты, все сохраненные колоды которых уже в памяти
+        self._preloaded: Set[str] = set()
+
+        self.stats = {'draws': 0, 'reshuffles': 0, 'returned': 0, 'duplicates_skipped': 0, 'evicted': 0}
+
+    async def _deck(self, db: AsyncSession, account_id: str, folder_id: str) -> Deck:
+        """Колода из памяти или из БД"""
+        key = (account_id, folder_id)
+        deck = self._decks.get(key)
+        if deck is None:
+            stored = None
+            if account_id not in self._preloaded:
+                stored = await RotationDeckRepository(db).get(account_id, folder_id)
+            deck = Deck() if stored is None else self._from_stored(stored)
+            self._decks[key] = deck
+        return deck
+
+    @staticmethod
+    def _from_stored(stored) -> Deck:
+        return Deck(
+            cards=json.loads(stored.cards),
+            cursor=stored.cursor or 0,
+            posted=set(json.loads(stored.posted)),
+            cycle=stored.cycle or 0
+        )
+
+    def _sync_with_catalog(self, deck: Deck, folder_id: str):
+        """Добавление в невыданную часть колоды видео, появившихся в каталоге"""
+        version = self.catalog.version(folder_id)
+        if deck.catalog_version == version:
+            return
+
+        known = set(deck.cards)
+        new_cards = [entry.video_id for entry in self.catalog.videos(folder_id) if entry.video_id not in known]
+        if new_cards:
+            remaining = deck.cards[deck.cursor:] + new_cards
+            random.shuffle(remaining)
+            deck.set_cards(deck.cards[:deck.cursor] + remaining, deck.cursor)
+
+        deck.catalog_version = version
+
+    def _reshuffle(self, deck: Deck, folder_id: str):
+        """Новый цикл: все видео папки в случайном порядке"""
+        cards = [entry.video_id for entry in self.catalog.videos(folder_id)]
+        random.shuffle(cards)
+        deck.set_cards(cards, 0)
+        deck.posted.clear()
+        deck.cycle += 1
+        deck.catalog_version = self.catalog.version(folder_id)
+        self.stats['reshuffles'] += 1
+
+    async def remaining(self, db: AsyncSession, account_id: str, folder_id: str) -> int:
+        """Видео папки, еще не выданные аккаунту в текущем цикле колоды"""
+        deck = await self._deck(db, account_id, folder_id)
+        if not deck.cards:
+            return len(self.catalog.videos(folder_id))
+        self._sync_with_catalog(deck, folder_id)
+        return len(deck.cards) - deck.cursor
+
+    async def draw(
+        self,
+        db: AsyncSession,
+        account_id: str,
+        folder_id: str,
+        accept: Optional[Callable[[VideoEntry], bool]] = None,
+        duplicates: Optional[Callable[[VideoEntry], Iterable[int]]] = None
+    ) -> Optional[VideoEntry]:
+        """
+        Следующее видео колоды; колода, выданная до конца, перемешивается.
+        accept - фильтр видео; duplicates - ID дубликатов видео: видео
+        пропускается, если аккаунту уже выдан любой из его дубликатов.
+        Если все оставшиеся карты отклонены, возвращается None без нового
+        цикла: перемешивание очистило бы posted, и защита от дубликатов
+        сбросилась бы как раз тогда, когда она отсеивает видео.
+        """
+        deck = await self._deck(db, account_id, folder_id)
+        self._sync_with_catalog(deck, folder_id)
+
+        if deck.cursor < len(deck.cards):
+            return await self._deal(db, deck, account_id, folder_id, accept, duplicates)
+
+        if not self.catalog.videos(folder_id):
+            return None
+
+        if deck.cards:
+            logger.info(f"🔄 MediaFlux Hub: Колода видео папки {folder_id} для {account_id} закончилась, новый цикл")
+        self._reshuffle(deck, folder_id)
+        return await self._deal(db, deck, account_id, folder_id, accept, duplicates)
+
+    async def _deal(
+        self,
+        db: AsyncSession,
+        deck: Deck,
+        account_id: str,
+        folder_id: str,
+        accept: Optional[Callable[[VideoEntry], bool]],
+        duplicates: Optional[Callable[[VideoEntry], Iterable[int]]]
+    ) -> Optional[VideoEntry]:
+        """Один проход по невыданной части колоды до первой подходящей карты"""
+        while deck.cursor < len(deck.cards):
+            video_id = deck.cards[deck.cursor]
+            deck.cursor += 1
+            deck.dirty = True
+
+            # Удаленные из каталога и отклоненные фильтром видео пропускаем
+            entry = self.catalog.by_id(video_id)
+            if entry and entry.folder_id == folder_id and (accept is None or accept(entry)):
+                if duplicates and await self._any_dealt(db, account_id, duplicates(entry)):
+                    self.stats['duplicates_skipped'] += 1
+                    continue
+                self.stats['draws'] += 1
+                return entry
+        return None
+
+    async def _any_dealt(self, db: AsyncSession, account_id: str, video_ids: Iterable[int]) -> bool:
+        """Выдано или опубликовано ли аккаунту одно из видео (в любой папке)"""
+        for video_id in video_ids:
+            entry = self.catalog.by_id(video_id)
+            if not entry:
+                continue
+            deck = await self._deck(db, account_id, entry.folder_id)
+            if video_id in deck.posted or deck.is_dealt(video_id):
+                return True
+        return False
+
+    async def mark_posted(self, db: AsyncSession, account_id: str, folder_id: str, video_path: str):
+        """
+        Отметка опубликованного видео (после завершения задачи). В БД
+        меняется только posted строки колоды: курсор и порядок карт в
+        памяти могут содержать выдачи незафиксированного планирования.
+        """
+        await self.catalog.ensure_loaded(db)
+        entry = self.catalog.get(folder_id, video_path)
+        if not entry:
+            return
+
+        deck = self._decks.get((account_id, folder_id))
+        if deck is not None:
+            deck.posted.add(entry.video_id)
+
+        repository = RotationDeckRepository(db)
+        for _ in range(WRITE_ATTEMPTS):
+            stored = await repository.get_fields(account_id, folder_id, 'posted')
+            if stored is None:
+                # Колода еще не сохранялась: отметку запишет планирование вместе с колодой
+                if deck is not None:
+                    deck.dirty = True
+                return
+            posted = set(json.loads(stored.posted))
+            if entry.video_id in posted:
+                return
+            posted.add(entry.video_id)
+            if await repository.compare_and_set(
+                account_id, folder_id, {'posted': stored.posted}, {'posted': json.dumps(sorted(posted))}
+            ):
+                return
+        logger.warning(f"⚠️ MediaFlux Hub: Не удалось отметить публикацию {video_path} в колоде {account_id}")
+
+    async def return_cards(self, db: AsyncSession, account_id: str, folder_id: str, video_paths: Iterable[str]):
+        """Возврат выданных, но не опубликованных видео в невыданную часть колоды (при планировании)"""
+        video_ids = await self._video_ids(db, folder_id, video_paths)
+        if video_ids:
+            self._return(await self._deck(db, account_id, folder_id), video_ids)
+
+    async def release_cards(self, db: AsyncSession, account_id: str, folder_id: str, video_paths: Iterable[str]):
+        """
+        Возврат видео невыполненной задачи вне планирования. В БД меняется
+        сохраненный порядок карт, без выдач незафиксированного планирования;
+        колода в памяти получает тот же возврат или перечитывается из БД.
+        """
+        video_ids = await self._video_ids(db, folder_id, video_paths)
+        if not video_ids:
+            return
+
+        repository = RotationDeckRepository(db)
+        for _ in range(WRITE_ATTEMPTS):
+            stored = await repository.get_fields(account_id, folder_id, 'cards', 'cursor', 'posted')
+            if stored is None:
+                break
+            deck = Deck(cards=json.loads(stored.cards), cursor=stored.cursor or 0, posted=set(json.loads(stored.posted)))
+            if not self._return(deck, video_ids):
+                break
+            if await repository.compare_and_set(
+                account_id, folder_id,
+                {'cards': stored.cards, 'cursor': stored.cursor},
+                {'cards': json.dumps(deck.cards), 'cursor': deck.cursor}
+            ):
+                break
+
+        key = (account_id, folder_id)
+        current = self._decks.get(key)
+        if current is None:
+            return
+        if current.dirty:
+            self._return(current, video_ids)
+        else:
+            del self._decks[key]
+            self._preloaded.discard(account_id)
+
+    async def _video_ids(self, db: AsyncSession, folder_id: str, video_paths: Iterable[str]) -> Set[int]:
+        await self.catalog.ensure_loaded(db)
+        return {
+            entry.video_id
+            for entry in (self.catalog.get(folder_id, path) for path in video_paths)
+            if entry
+        }
+
+    def _return(self, deck: Deck, video_ids: Set[int]) -> int:
+        """Перенос выданных карт в невыданную часть колоды (кроме опубликованных)"""
+        video_ids = video_ids - deck.posted
+        dealt = deck.cards[:deck.cursor]
+        kept = [card for card in dealt if card not in video_ids]
+        returned = [card for card in dealt if card in video_ids]
+        if not returned:
+            return 0
+
+        remaining = returned + deck.cards[deck.cursor:]
+        random.shuffle(remaining)
+        deck.set_cards(kept + remaining, len(kept))
+        self.stats['returned'] += len(returned)
+        return len(returned)
+
+    async def preload(self, db: AsyncSession, account_ids: Iterable[str]):
+        """Загрузка колод набора аккаунтов пачкой запросов вместо запроса на каждую пару"""
+        missing = set(account_ids) - self._preloaded
+        if not missing:
+            return
+
+        for stored in await RotationDeckRepository(db).list_for_accounts(missing):
+            # Колоды, уже загруженные по одной, в памяти новее
+            self._decks.setdefault((stored.account_id, stored.folder_id), self._from_stored(stored))
+        self._preloaded.update(missing)
+
+    def export(self, account_ids: Optional[Iterable[str]] = None, dirty_only: bool = False) -> Dict[Tuple[str, str], Deck]:
+        """Копии колод (всех или набора аккаунтов) для передачи в другой процесс"""
+        accounts = set(account_ids) if account_ids is not None else None
+        return {
+            key: replace(deck, _positions=None)
+            for key, deck in self._decks.items()
+            if (accounts is None or key[0] in accounts) and (deck.dirty or not dirty_only)
+        }
+
+    def adopt(self, decks: Dict[Tuple[str, str], Deck], account_ids: Iterable[str], dirty: bool = True):
+        """
+        Принятие колод, посчитанных в другом процессе; account_ids - аккаунты,
+        все колоды которых теперь в памяти. dirty - колоды нужно сохранить.
+        """
+        for key, deck in decks.items():
+            current = self._decks.get(key)
+            if current is not None and current is not deck and current.cycle == deck.cycle:
+                # Публикации, отмеченные, пока колода считалась в другом процессе
+                deck.posted |= current.posted
+            deck.dirty = dirty
+            self._decks[key] = deck
+        self._preloaded.update(account_ids)
+
+    async def save(self, db: AsyncSession, keys: Optional[Iterable[Tuple[str, str]]] = None) -> SavedDecks:
+        """
+        Запись измененных колод в сессию одной пачкой (commit - за вызывающим).
+        Колоды остаются измененными, пока после commit не вызван saved().
+        """
+        rows = []
+        pending: SavedDecks = []
+        for key in list(keys if keys is not None else self._decks):
+            deck = self._decks.get(key)
+            if not deck or not deck.dirty:
+                continue
+
+            account_id, folder_id = key
+            rows.append({
+                'account_id': account_id,
+                'folder_id': folder_id,
+                'cards': json.dumps(deck.cards),
+                'cursor': deck.cursor,
+                'posted': json.dumps(sorted(deck.posted)),
+                'cycle': deck.cycle
+            })
+            pending.append((key, deck, deck.revision))
+
+        if rows:
+            await RotationDeckRepository(db).save_many(rows)
+        return pending
+
+    def saved(self, pending: SavedDecks):
+        """Отметка записанных колод сохраненными (после успешного commit)"""
+        for key, deck, revision in pending:
+            if self._decks.get(key) is deck:
+                deck.saved_revision = max(deck.saved_revision, revision)
+
+    def evict(self, account_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Выгрузка сохраненных колод (всех или набора аккаунтов) из памяти после
+        планирования; следующие обращения читают их из БД. Несохраненные остаются.
+        """
+        accounts = set(account_ids) if account_ids is not None else None
+        evicted = [
+            key for key, deck in self._decks.items()
+            if not deck.dirty and (accounts is None or key[0] in accounts)
+        ]
+        for key in evicted:
+            del self._decks[key]
+            self._preloaded.discard(key[0])
+        self.stats['evicted'] += len(evicted)
+        return len(evicted)
+
+    def invalidate(self):
+        """Сброс колод в памяти (после отката транзакции)"""
+        self._decks.clear()
+        self._preloaded.clear()
+
+    def get_rotation_stats(self) -> Dict[str, int]:
+        """Статистика ротации"""
+        return {'decks': len(self._decks), **self.stats}
+
+
+# Общие колоды ротации для сервисов процесса
+video_rotation = VideoRotation()
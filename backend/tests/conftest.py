@@ -0,0 +1,30 @@
+"""
+MediaFlux Hub - Общие фикстуры тестов
+Приложение импортируется с временной SQLite базой и каталогами
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Настройки читаются при импорте app.config - окружение задается до него
+TEST_ROOT = Path(tempfile.mkdtemp(prefix="mediaflux_hub_tests_"))
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_ROOT / 'test.db'}"
+for name in ("CONTENT_DIR", "LOGS_DIR", "PROXIES_DIR"):
+    os.environ[name] = str(TEST_ROOT / name.lower())
+os.environ["CONTENT_WATCH_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest  # noqa: E402
+
+from app.database import Base, async_engine, create_tables, engine  # noqa: E402
+
+
+@pytest.fixture
+async def database():
+    """Пустая база со всеми таблицами; соединения закрываются после теста"""
+    Base.metadata.drop_all(bind=engine)
+    create_tables()
+    yield
+    await async_engine.dispose()
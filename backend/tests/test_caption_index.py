@@ -0,0 +1,129 @@
+"""
+MediaFlux Hub - Тесты фильтров Блума описаний
+"""
+from datetime import datetime
+
+from app.config import settings
+from app.database import AsyncSessionLocal, CaptionFilter, PostTask
+from app.repositories.post_tasks import PostTaskRepository
+from app.services.caption_index import BloomFilter, CaptionHistory, CaptionIndex, caption_index, normalize_caption
+from app.services.content_service import MediaFluxContentService
+
+
+def test_normalize_caption_ignores_emoji_punctuation_and_hashtag_order():
+    assert normalize_caption("Новый день! 🔥 #motivation #success") == normalize_caption(
+        "новый   день 💪 #success, #Motivation"
+    )
+    assert normalize_caption("Новый день #motivation") != normalize_caption("Новый день #success")
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(5000, 0.01)
+    added = [f"caption {i}" for i in range(5000)]
+    for item in added:
+        bloom.add(item)
+
+    assert all(item in bloom for item in added)
+    assert bloom.full
+    false_positives = sum(f"other {i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_bloom_filter_restores_bits_of_same_size_only():
+    bloom = BloomFilter(100, 0.01)
+    bloom.add("caption")
+
+    restored = BloomFilter(100, 0.01, bytes(bloom.bits), bloom.count)
+    assert "caption" in restored and restored.count == 1
+
+    resized = BloomFilter(1000, 0.01, bytes(bloom.bits), bloom.count)
+    assert "caption" not in resized and resized.count == 0
+
+
+def test_caption_history_forgets_only_after_two_generations(monkeypatch):
+    monkeypatch.setattr(settings, "CAPTION_BLOOM_CAPACITY", 10)
+    history = CaptionHistory(BloomFilter(10, 0.01))
+
+    assert history.add("first caption #a #b")
+    assert not history.add("First caption! #b #a")
+
+    # Первое поколение заполнено - описание помнится в предыдущем
+    for i in range(9):
+        assert history.add(f"filler {i}")
+    assert history.add("filler 9")
+    assert not history.add("first caption #a #b")
+
+    # Второе поколение заполнено - первое забыто
+    for i in range(10, 19):
+        assert history.add(f"filler {i}")
+    assert history.add("filler 19")
+    assert history.add("first caption #a #b")
+
+
+async def test_caption_index_persists_filters(database):
+    index = CaptionIndex()
+    async with AsyncSessionLocal() as db:
+        assert await index.add(db, "acc_1", "Первое описание #motivation")
+        assert await index.add(db, "acc_1", "Второе описание #motivation")
+        assert not await index.add(db, "acc_1", "первое описание 🔥 #motivation")
+        await db.commit()
+
+    # Новый процесс читает фильтр из caption_filters
+    restored = CaptionIndex()
+    async with AsyncSessionLocal() as db:
+        assert not await restored.add(db, "acc_1", "Второе описание #motivation")
+        assert await restored.add(db, "acc_2", "Второе описание #motivation")
+        assert restored.get_caption_stats()['loaded'] == 1
+
+
+async def _add_task(task_id: str) -> PostTask:
+    async with AsyncSessionLocal() as db:
+        task = PostTask(
+            task_id=task_id,
+            account_id="acc_race",
+            folder_id="folder_motivation",
+            video_path=f"/content/motivation/{task_id}.mp4",
+            scheduled_time=datetime(2026, 1, 10, 12, 0),
+            status="pending"
+        )
+        db.add(task)
+        await db.commit()
+        return task
+
+
+async def test_losing_caption_candidate_is_not_recorded(database):
+    """Если описание задачи уже записала параллельная предзагрузка, кандидат не попадает в фильтр"""
+    caption_index.discard("acc_race")
+    service = MediaFluxContentService()
+    service.generate_unique_caption = lambda *args: _caption("Кандидат проигравшей стороны #race")
+    task = await _add_task("task_race")
+
+    async with AsyncSessionLocal() as db:
+        await PostTaskRepository(db).set_caption("task_race", "Описание победителя #race")
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        assert await service.ensure_task_caption(db, task) == "Описание победителя #race"
+        await db.commit()
+        assert not await caption_index.seen(db, "acc_race", "Кандидат проигравшей стороны #race")
+        assert await db.get(CaptionFilter, "acc_race") is None
+
+
+async def test_rolled_back_caption_is_forgotten(database):
+    caption_index.discard("acc_race")
+    service = MediaFluxContentService()
+    service.generate_unique_caption = lambda *args: _caption("Откаченное описание #race")
+    task = await _add_task("task_rollback")
+
+    async with AsyncSessionLocal() as db:
+        assert await service.ensure_task_caption(db, task) == "Откаченное описание #race"
+        assert await caption_index.seen(db, "acc_race", "Откаченное описание #race")
+        await db.rollback()
+    caption_index.discard("acc_race")
+
+    async with AsyncSessionLocal() as db:
+        assert not await caption_index.seen(db, "acc_race", "Откаченное описание #race")
+
+
+async def _caption(text: str) -> str:
+    return text
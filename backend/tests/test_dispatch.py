@@ -0,0 +1,49 @@
+"""
+MediaFlux Hub - Тесты шкалы задач диспетчера
+"""
+from datetime import datetime, timedelta
+
+from app.services.dispatch_service import TaskTimeline
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def test_pop_due_returns_tasks_in_deadline_order():
+    timeline = TaskTimeline()
+    timeline.schedule("late", NOW - timedelta(minutes=1))
+    timeline.schedule("early", NOW - timedelta(minutes=5))
+    timeline.schedule("future", NOW + timedelta(minutes=5))
+
+    assert timeline.next_deadline() == NOW - timedelta(minutes=5)
+    assert timeline.pop_due(NOW) == ["early", "late"]
+    assert len(timeline) == 1
+    assert timeline.next_deadline() == NOW + timedelta(minutes=5)
+
+
+def test_rescheduled_task_is_due_only_at_new_time():
+    timeline = TaskTimeline()
+    timeline.schedule("task", NOW - timedelta(minutes=1))
+    timeline.schedule("task", NOW + timedelta(minutes=10))
+
+    assert timeline.pop_due(NOW) == []
+    assert timeline.pop_due(NOW + timedelta(minutes=10)) == ["task"]
+    assert timeline.pop_due(NOW + timedelta(hours=1)) == []
+
+
+def test_discarded_task_is_not_due():
+    timeline = TaskTimeline()
+    timeline.schedule("kept", NOW - timedelta(minutes=2))
+    timeline.schedule("dropped", NOW - timedelta(minutes=1))
+    timeline.discard("dropped")
+
+    assert timeline.pop_due(NOW) == ["kept"]
+
+
+def test_resync_with_same_deadline_does_not_grow_heap():
+    timeline = TaskTimeline()
+    for _ in range(100):
+        for index in range(10):
+            timeline.schedule(f"task_{index}", NOW + timedelta(minutes=index))
+
+    assert len(timeline._heap) == 10
+    assert len(timeline) == 10
@@ -0,0 +1,65 @@
+"""
+MediaFlux Hub - Тесты генерации времен публикации
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.config import settings
+from app.services.fleet_planner import OPTIMAL_HOURS, generate_posting_times
+
+DELAY = timedelta(seconds=settings.MIN_DELAY_BETWEEN_POSTS)
+
+
+def _future_day(offset: int = 2) -> datetime:
+    return (datetime.now() + timedelta(days=offset)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def test_posts_keep_count_order_and_minimum_spacing():
+    rng = np.random.default_rng(1)
+    days = [_future_day(2 + index % 3) for index in range(500)]
+    counts = [1 + index % settings.MAX_DAILY_POSTS_PER_ACCOUNT for index in range(500)]
+
+    for day, count, times in zip(days, counts, generate_posting_times(days, counts, rng=rng)):
+        assert len(times) == count
+        assert times == sorted(times)
+        assert all(day <= time < day + timedelta(days=1) for time in times)
+        assert all(later - earlier >= DELAY for earlier, later in zip(times, times[1:]))
+
+
+def test_posts_keep_spacing_from_tasks_already_on_the_day():
+    rng = np.random.default_rng(2)
+    day = _future_day()
+    existing = [day.replace(hour=hour, minute=30) for hour in (9, 13, 17, 20)]
+
+    for times in generate_posting_times([day] * 200, [6] * 200, [existing] * 200, rng):
+        assert len(times) == 6
+        assert all(abs(time - task) >= DELAY for time in times for task in existing)
+        assert all(later - earlier >= DELAY for earlier, later in zip(times, times[1:]))
+
+
+def test_crowded_day_is_pulled_back_instead_of_dropping_posts():
+    rng = np.random.default_rng(3)
+    day = _future_day()
+    # Задачи в трех окнах из четырех вытесняют новые посты к концу дня
+    existing = [day.replace(hour=hour) for hour in (9, 10, 13, 14, 17, 18)]
+
+    for times in generate_posting_times([day] * 100, [16] * 100, [existing] * 100, rng):
+        assert len(times) == 16
+        assert times[-1] < day + timedelta(days=1)
+        assert all(later - earlier >= DELAY for earlier, later in zip(times, times[1:]))
+
+
+def test_times_fall_in_optimal_windows_with_jitter():
+    rng = np.random.default_rng(4)
+    day = _future_day()
+    jitter = timedelta(minutes=30)
+    times = generate_posting_times([day] * 2000, [1] * 2000, rng=rng)
+
+    windows = [(day.replace(hour=start) - jitter, day.replace(hour=end) + jitter) for start, end in OPTIMAL_HOURS]
+    assert all(any(low <= time < high for low, high in windows) for (time,) in times)
+
+
+def test_past_times_are_skipped():
+    yesterday = _future_day(-1)
+    assert generate_posting_times([yesterday], [5]) == [[]]
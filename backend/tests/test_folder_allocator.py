@@ -0,0 +1,48 @@
+"""
+MediaFlux Hub - Тесты распределителя папок
+"""
+import random
+from collections import Counter
+
+import pytest
+
+from app.services.folder_allocator import AliasTable
+
+
+def implied_distribution(table: AliasTable):
+    """Точная вероятность каждого индекса по столбцам таблицы"""
+    count = len(table.probability)
+    distribution = [0.0] * count
+    for column, (probability, alias) in enumerate(zip(table.probability, table.alias)):
+        distribution[column] += probability / count
+        distribution[alias] += (1 - probability) / count
+    return distribution
+
+
+@pytest.mark.parametrize("weights", [
+    [1],
+    [1, 1, 1, 1],
+    [7, 3],
+    [5, 0, 2, 1, 0],
+    [0.1, 0.2, 0.3, 0.4],
+    [1000, 1, 1, 1],
+    list(range(1, 21)),
+])
+def test_alias_table_matches_weights(weights):
+    """Таблица дает вероятности, пропорциональные весам"""
+    total = sum(weights)
+    assert implied_distribution(AliasTable(weights)) == pytest.approx([weight / total for weight in weights])
+
+
+def test_alias_table_draws():
+    """Частоты выборки сходятся к весам, индексы с нулевым весом не выпадают"""
+    weights = [6, 0, 3, 1]
+    table = AliasTable(weights)
+    rng = random.Random(42)
+    draws = 100_000
+
+    counts = Counter(table.draw(rng) for _ in range(draws))
+
+    assert counts[1] == 0
+    for index, weight in enumerate(weights):
+        assert counts[index] / draws == pytest.approx(weight / sum(weights), abs=0.01)
@@ -0,0 +1,93 @@
+"""
+MediaFlux Hub - Тесты приема видео с докачкой
+"""
+import hashlib
+import os
+
+import pytest
+
+from app.services.content_service import MediaFluxContentService
+from app.services.ingest_service import IngestError, VideoIngest
+from app.services.video_catalog import video_catalog
+
+VIDEO = os.urandom(256 * 1024)
+
+
+async def chunks(data: bytes, size: int = 64 * 1024, fail_after: int = None):
+    """Тело запроса частями; fail_after - обрыв передачи после стольких байт"""
+    sent = 0
+    for start in range(0, len(data), size):
+        if fail_after is not None and sent >= fail_after:
+            raise ConnectionResetError("Обрыв передачи")
+        yield data[start:start + size]
+        sent += size
+
+
+@pytest.fixture
+async def ingest(database):
+    video_catalog.invalidate()
+    return VideoIngest(MediaFluxContentService())
+
+
+async def test_resume_after_interrupted_transfer_and_restart(ingest):
+    """Принятое до обрыва сохраняется, загрузка продолжается с него и после перезапуска процесса"""
+    upload = await ingest.create("resume", "clip.mp4", len(VIDEO))
+
+    with pytest.raises(ConnectionResetError):
+        await ingest.write(upload.upload_id, 0, chunks(VIDEO, fail_after=128 * 1024))
+    assert upload.offset == 128 * 1024
+    assert upload.state == 'uploading'
+
+    # Новый процесс: смещение восстанавливается по размеру .part файла
+    restarted = VideoIngest(MediaFluxContentService())
+    resumed = await restarted.get(upload.upload_id)
+    assert resumed.offset == 128 * 1024
+
+    with pytest.raises(IngestError) as error:
+        await restarted.write(upload.upload_id, 0, chunks(VIDEO))
+    assert error.value.status_code == 409
+
+    resumed = await restarted.write(upload.upload_id, resumed.offset, chunks(VIDEO[resumed.offset:]))
+    assert resumed.state == 'complete'
+    assert resumed.content_hash == hashlib.sha256(VIDEO).hexdigest()
+    with open(resumed.video_path, 'rb') as f:
+        assert f.read() == VIDEO
+    assert os.listdir(os.path.join(os.path.dirname(resumed.video_path), '.uploads')) == []
+    assert restarted.stats['resumed'] == 1
+
+    entry = video_catalog.by_hash(resumed.content_hash)
+    assert entry is not None and entry.path == resumed.video_path
+
+
+async def test_duplicates_are_not_stored_twice(ingest):
+    content_hash = hashlib.sha256(VIDEO).hexdigest()
+    first = await ingest.create("dupes", "clip.mp4", len(VIDEO))
+    first = await ingest.write(first.upload_id, 0, chunks(VIDEO))
+    assert first.state == 'complete'
+
+    # Копия под другим именем принимается, но не сохраняется
+    copy = await ingest.create("dupes", "copy.mp4", len(VIDEO))
+    copy = await ingest.write(copy.upload_id, 0, chunks(VIDEO))
+    assert (copy.state, copy.video_path) == ('duplicate', first.video_path)
+
+    # Заявленный заранее хеш известного видео - без передачи данных
+    announced = await ingest.create("dupes", "again.mp4", len(VIDEO), sha256=content_hash.upper())
+    assert (announced.state, announced.video_path, announced.offset) == ('duplicate', first.video_path, len(VIDEO))
+
+    folder = os.path.dirname(first.video_path)
+    assert sorted(name for name in os.listdir(folder) if not name.startswith('.')) == ['clip.mp4']
+    assert ingest.stats['duplicates'] == 2
+
+
+async def test_rejects_wrong_hash_and_excess_data(ingest):
+    upload = await ingest.create("rejects", "clip.mp4", len(VIDEO), sha256="0" * 64)
+    with pytest.raises(IngestError) as error:
+        await ingest.write(upload.upload_id, 0, chunks(VIDEO))
+    assert error.value.status_code == 460
+    assert not os.path.exists(ingest._part_path(upload))
+
+    upload = await ingest.create("rejects", "clip.mp4", 1000)
+    with pytest.raises(IngestError) as error:
+        await ingest.write(upload.upload_id, 0, chunks(VIDEO))
+    assert error.value.status_code == 413
+    assert upload.offset == 0
@@ -0,0 +1,122 @@
+"""
+MediaFlux Hub - Тесты медиа-сервера: Range и условные запросы
+"""
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import media
+from app.api.media import parse_range
+from app.services.media_server import MediaServer, media_server
+from tests.conftest import TEST_ROOT
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, SIZE - 1)),
+    ("bytes=900-5000", (900, SIZE - 1)),
+    ("bytes=-100", (SIZE - 100, SIZE - 1)),
+    ("bytes=-5000", (0, SIZE - 1)),
+    ("bytes=999-999", (999, 999)),
+    ("bytes=1000-", "unsatisfiable"),
+    ("bytes=-0", "unsatisfiable"),
+    ("bytes=50-10", None),
+    ("bytes=0-10,20-30", None),
+    ("items=0-10", None),
+    ("bytes=abc-", None),
+    ("bytes=10", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.fixture
+async def client():
+    """Клиент приложения с одним роутером медиа"""
+    app = FastAPI()
+    app.include_router(media.router, prefix="/media")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+async def video_url(database):
+    """Подписанная ссылка на опубликованное видео (путь с query)"""
+    # База пересоздана - регистрации прошлых тестов в памяти недействительны
+    media_server._published.clear()
+    path = TEST_ROOT / "media_video.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    url = urlsplit(await media_server.publish(str(path), ttl=600))
+    return f"{url.path}?{url.query}"
+
+
+async def test_full_and_range_responses(client, video_url):
+    body = bytes(range(256)) * 4
+
+    response = await client.get(video_url)
+    assert response.status_code == 200
+    assert response.content == body
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = await client.get(video_url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == body[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(body)}"
+    assert response.headers["content-length"] == "10"
+
+    response = await client.get(video_url, headers={"Range": "bytes=-4"})
+    assert response.status_code == 206
+    assert response.content == body[-4:]
+
+    response = await client.get(video_url, headers={"Range": f"bytes={len(body)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(body)}"
+
+    response = await client.head(video_url, headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "100"
+    assert response.content == b""
+
+
+async def test_conditional_requests(client, video_url):
+    response = await client.get(video_url)
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    assert (await client.get(video_url, headers={"If-None-Match": etag})).status_code == 304
+    assert (await client.get(video_url, headers={"If-None-Match": f'"other", W/{etag}'})).status_code == 304
+    assert (await client.get(video_url, headers={"If-None-Match": '"other"'})).status_code == 200
+    assert (await client.get(video_url, headers={"If-Modified-Since": last_modified})).status_code == 304
+    assert (await client.get(video_url, headers={"If-Modified-Since": formatdate(0, usegmt=True)})).status_code == 200
+
+    # If-None-Match важнее If-Modified-Since
+    response = await client.get(video_url, headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert response.status_code == 200
+
+    # If-Range: диапазон только для той же версии файла, иначе файл целиком
+    response = await client.get(video_url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+    response = await client.get(video_url, headers={"Range": "bytes=0-9", "If-Range": last_modified})
+    assert response.status_code == 206
+    response = await client.get(video_url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+
+
+async def test_rejects_bad_signature(client, video_url):
+    path, query = video_url.split("?")
+    assert (await client.get(f"{path}?{query}x")).status_code == 403
+    assert (await client.get(f"{path}?expires=1&sig=x")).status_code == 403
+
+
+async def test_published_file_outside_catalog_survives_restart(client, video_url, monkeypatch):
+    """Ссылка на видео вне каталога (результат перекодирования) работает после перезапуска процесса"""
+    monkeypatch.setattr(media, "media_server", MediaServer())
+
+    response = await client.get(video_url, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10))
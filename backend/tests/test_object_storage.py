@@ -0,0 +1,70 @@
+"""
+MediaFlux Hub - Тесты файлового объектного хранилища
+"""
+from urllib.parse import urlsplit
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import media
+from app.config import settings
+from app.services.object_storage import FilesystemStorageBackend, ObjectStorage
+from tests.conftest import TEST_ROOT
+
+BODY = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """Хранилище STORAGE_BACKEND=filesystem, которое отдает роутер медиа"""
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "filesystem")
+    monkeypatch.setattr(settings, "STORAGE_FS_ROOT", str(TEST_ROOT / "storage"))
+    monkeypatch.setattr(settings, "STORAGE_FS_BASE_URL", "http://test/")
+    monkeypatch.setattr(settings, "STORAGE_PART_SIZE", 4096)
+    storage = ObjectStorage()
+    monkeypatch.setattr(media, "object_storage", storage)
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+async def client():
+    """Клиент приложения с одним роутером медиа"""
+    app = FastAPI()
+    app.include_router(media.router, prefix="/media")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_filesystem_links_are_signed_and_expire(database, storage, client, monkeypatch):
+    path = TEST_ROOT / "storage_video.mp4"
+    path.write_bytes(BODY)
+
+    url = urlsplit(await storage.publish(str(path), ttl=600))
+    assert url.path.startswith(f"/media/storage/{settings.STORAGE_KEY_PREFIX}")
+    assert storage.stats['uploads'] == 1
+    link = f"{url.path}?{url.query}"
+
+    # Объект собран из частей multipart загрузки
+    response = await client.get(link)
+    assert response.status_code == 200
+    assert response.content == BODY
+
+    response = await client.get(link, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == BODY[100:200]
+
+    # Подпись привязана к ключу, ссылка истекает через ttl
+    assert (await client.get(link.replace("/media/storage/", "/media/storage/x"))).status_code == 403
+    monkeypatch.setattr("time.time", lambda: 2 ** 40)
+    assert (await client.get(link)).status_code == 403
+
+
+def test_filesystem_backend_requires_base_url(monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "filesystem")
+    monkeypatch.setattr(settings, "STORAGE_FS_BASE_URL", "")
+    with pytest.raises(RuntimeError):
+        FilesystemStorageBackend()
+    with pytest.raises(RuntimeError):
+        ObjectStorage().start()
@@ -0,0 +1,50 @@
+"""
+MediaFlux Hub - Тесты планировщика
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.database import Account, AsyncSessionLocal, PostTask
+from app.services.dispatch_service import task_timeline
+from app.services.scheduler_service import MediaFluxHubScheduler
+
+
+async def test_start_dispatches_pending_task_from_database(database):
+    """Pending задача, созданная до запуска (другим процессом или до перезапуска), публикуется после start()"""
+    async with AsyncSessionLocal() as db:
+        db.add(Account(id="acc_1", username="paused", access_token="x", instagram_account_id="1", status="paused"))
+        db.add(PostTask(
+            task_id="task_existing",
+            account_id="acc_1",
+            folder_id="folder_motivation",
+            video_path="/content/motivation/1.mp4",
+            scheduled_time=datetime.now() - timedelta(seconds=1),
+            status="pending"
+        ))
+        await db.commit()
+
+    task_timeline.clear()
+    scheduler = MediaFluxHubScheduler()
+    submitted = asyncio.Queue()
+
+    async def submit(task):
+        await submitted.put(task.task_id)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+
+    async def skip():
+        pass
+
+    scheduler.pipeline.submit = submit
+    scheduler.prestage_videos = skip
+
+    await scheduler.start()
+    try:
+        assert await asyncio.wait_for(submitted.get(), timeout=5) == "task_existing"
+    finally:
+        await scheduler.stop()
+
+    async with AsyncSessionLocal() as db:
+        task = await db.get(PostTask, "task_existing")
+        assert task.status == "processing"
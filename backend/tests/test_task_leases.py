@@ -0,0 +1,91 @@
+"""
+MediaFlux Hub - Тесты очереди задач с арендой
+"""
+from datetime import datetime, timedelta
+
+from app.database import AsyncSessionLocal, PostTask
+from app.repositories.post_tasks import PostTaskRepository
+
+NOW = datetime(2026, 1, 10, 12, 0)
+
+
+def make_task(task_id: str, scheduled_time: datetime, **fields) -> PostTask:
+    return PostTask(
+        task_id=task_id,
+        account_id="acc_1",
+        folder_id="folder_motivation",
+        video_path=f"/content/motivation/{task_id}.mp4",
+        scheduled_time=scheduled_time,
+        **fields
+    )
+
+
+async def test_claim_due_takes_due_pending_tasks_once(database):
+    """Готовые задачи захватываются по порядку времени, до limit, и только одним воркером"""
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            make_task("task_late", NOW - timedelta(minutes=1)),
+            make_task("task_early", NOW - timedelta(minutes=5)),
+            make_task("task_middle", NOW - timedelta(minutes=3)),
+            make_task("task_future", NOW + timedelta(minutes=1)),
+            make_task("task_done", NOW - timedelta(minutes=10), status="completed"),
+        ])
+        await db.commit()
+
+    lease = NOW + timedelta(minutes=5)
+    async with AsyncSessionLocal() as db:
+        claimed = await PostTaskRepository(db).claim_due("worker_a", NOW, lease, limit=2)
+        await db.commit()
+    assert [task.task_id for task in claimed] == ["task_early", "task_middle"]
+    assert all(task.lease_owner == "worker_a" and task.lease_expires_at == lease for task in claimed)
+
+    async with AsyncSessionLocal() as db:
+        repository = PostTaskRepository(db)
+        claimed = await repository.claim_due("worker_b", NOW, lease, limit=10)
+        await db.commit()
+        assert [task.task_id for task in claimed] == ["task_late"]
+
+        # Попытку учитывает только владелец аренды
+        assert not await repository.begin_attempt("task_early", "worker_b")
+        assert await repository.begin_attempt("task_early", "worker_a")
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        assert await PostTaskRepository(db).claim_due("worker_c", NOW, lease, limit=10) == []
+        assert (await db.get(PostTask, "task_future")).status == "pending"
+        assert (await db.get(PostTask, "task_early")).attempts == 1
+
+
+async def test_reap_expired_leases(database):
+    """Истекшая аренда возвращает задачу в pending, а с исчерпанными попытками - в failed"""
+    expired = NOW - timedelta(seconds=1)
+    active = NOW + timedelta(minutes=5)
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            make_task("task_retry", NOW, status="processing", lease_owner="worker_a",
+                      lease_expires_at=expired, attempts=1, max_attempts=3),
+            make_task("task_exhausted", NOW, status="processing", lease_owner="worker_a",
+                      lease_expires_at=expired, attempts=3, max_attempts=3),
+            make_task("task_active", NOW, status="processing", lease_owner="worker_b",
+                      lease_expires_at=active, attempts=3, max_attempts=3),
+        ])
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        assert await PostTaskRepository(db).reap_expired_leases(NOW) == (1, 1)
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        retry = await db.get(PostTask, "task_retry")
+        assert (retry.status, retry.lease_owner, retry.lease_expires_at) == ("pending", None, None)
+
+        exhausted = await db.get(PostTask, "task_exhausted")
+        assert exhausted.status == "failed" and exhausted.lease_owner is None
+
+        untouched = await db.get(PostTask, "task_active")
+        assert (untouched.status, untouched.lease_owner) == ("processing", "worker_b")
+
+    # Возвращенную задачу снова может захватить любой воркер
+    async with AsyncSessionLocal() as db:
+        claimed = await PostTaskRepository(db).claim_due("worker_c", NOW, active, limit=10)
+        assert [task.task_id for task in claimed] == ["task_retry"]
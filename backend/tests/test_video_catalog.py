@@ -0,0 +1,29 @@
+"""
+MediaFlux Hub - Тесты каталога видео
+"""
+from app.database import AsyncSessionLocal
+from app.services.video_catalog import VideoCatalog
+
+FOLDER = "folder_motivation"
+
+
+async def test_find_by_path_follows_changes(database):
+    catalog = VideoCatalog()
+    async with AsyncSessionLocal() as db:
+        await catalog.apply_scan(db, FOLDER, 1, {
+            "/content/motivation/1.mp4": (100, 1, 11),
+            "/content/motivation/2.mp4": (200, 1, 12),
+        })
+        first = catalog.find("/content/motivation/1.mp4")
+        assert first is not None and first.size == 100
+
+        # Измененный файл заменяет запись, удаленный исчезает из индекса по пути
+        await catalog.apply_changes(db, FOLDER, {"/content/motivation/1.mp4": (150, 2, 11)}, ["/content/motivation/2.mp4"])
+        await db.commit()
+
+    assert catalog.find("/content/motivation/1.mp4").size == 150
+    assert catalog.find("/content/motivation/2.mp4") is None
+    assert catalog.find("/content/other/1.mp4") is None
+
+    catalog.invalidate()
+    assert catalog.find("/content/motivation/1.mp4") is None
@@ -0,0 +1,57 @@
+"""
+MediaFlux Hub - Тесты индекса перцептивных хешей
+"""
+import random
+
+import pytest
+
+from app.services.video_fingerprint import HammingIndex
+
+
+def flip_spread(value: int, distance: int, rng: random.Random) -> int:
+    """Переворот distance бит, разложенных по 16-битным частям как можно равномернее"""
+    per_chunk = [distance // 4 + (1 if chunk < distance % 4 else 0) for chunk in range(4)]
+    for chunk, count in enumerate(per_chunk):
+        for bit in rng.sample(range(16), count):
+            value ^= 1 << (chunk * 16 + bit)
+    return value
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 4, 6, 7, 8, 11])
+def test_query_finds_hashes_at_distance_boundary(max_distance):
+    """Хеш ровно на max_distance находится, даже если отличия во всех частях; max_distance + 1 - нет"""
+    rng = random.Random(max_distance)
+    index = HammingIndex(max_distance)
+    for _ in range(200):
+        base = rng.getrandbits(64)
+        index.add(1, flip_spread(base, max_distance, rng))
+        assert index.query(base) == [1]
+        index.add(1, flip_spread(base, max_distance + 1, rng))
+        assert index.query(base) == []
+
+
+def test_query_matches_linear_scan():
+    """Результат совпадает с полным перебором, в том числе после удаления и замены"""
+    rng = random.Random(7)
+    index = HammingIndex(6)
+    values = {}
+    for key in range(2000):
+        # Часть хешей - близкие варианты уже добавленных
+        if values and rng.random() < 0.5:
+            value = flip_spread(rng.choice(list(values.values())), rng.randrange(10), rng)
+        else:
+            value = rng.getrandbits(64)
+        values[key] = value
+        index.add(key, value)
+
+    for key in rng.sample(list(values), 300):
+        del values[key]
+        index.remove(key)
+    for key in rng.sample(list(values), 300):
+        values[key] = rng.getrandbits(64)
+        index.add(key, values[key])
+
+    assert len(index) == len(values)
+    for probe in rng.sample(list(values.values()), 200):
+        expected = {key for key, value in values.items() if bin(value ^ probe).count('1') <= 6}
+        assert set(index.query(probe)) == expected
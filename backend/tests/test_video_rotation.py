@@ -0,0 +1,150 @@
+"""
+MediaFlux Hub - Тесты колод ротации видео
+"""
+import json
+
+from app.database import AsyncSessionLocal
+from app.repositories.rotation_decks import RotationDeckRepository
+from app.services.video_catalog import VideoCatalog, VideoEntry
+from app.services.video_rotation import VideoRotation
+
+ACCOUNT = "acc_1"
+FOLDER = "folder_motivation"
+
+
+def _rotation(count: int) -> VideoRotation:
+    catalog = VideoCatalog()
+    catalog.load_snapshot(
+        [VideoEntry(video_id, FOLDER, f"/content/motivation/{video_id}.mp4", 1000, 0, video_id) for video_id in range(1, count + 1)],
+        {FOLDER: 1}
+    )
+    rotation = VideoRotation(catalog)
+    # Колод аккаунта в БД нет - обращений к сессии не будет
+    rotation.adopt({}, [ACCOUNT], dirty=False)
+    return rotation
+
+
+async def test_cycle_deals_every_video_once_before_reshuffle():
+    rotation = _rotation(5)
+    dealt = [(await rotation.draw(None, ACCOUNT, FOLDER)).video_id for _ in range(5)]
+    assert sorted(dealt) == [1, 2, 3, 4, 5]
+
+    assert await rotation.draw(None, ACCOUNT, FOLDER) is not None
+    assert rotation.stats['reshuffles'] == 1
+
+
+async def test_rejected_remainder_does_not_start_new_cycle():
+    rotation = _rotation(4)
+    first = await rotation.draw(None, ACCOUNT, FOLDER)
+    deck = rotation._decks[(ACCOUNT, FOLDER)]
+    deck.posted.add(first.video_id)
+    cycle = deck.cycle
+
+    # Все оставшиеся видео - дубликаты уже опубликованного
+    assert await rotation.draw(None, ACCOUNT, FOLDER, duplicates=lambda entry: [first.video_id]) is None
+    assert deck.cycle == cycle
+    assert deck.posted == {first.video_id}
+    assert rotation.stats['reshuffles'] == 0
+
+
+async def test_evict_drops_saved_decks_and_keeps_unsaved():
+    rotation = _rotation(3)
+    await rotation.draw(None, ACCOUNT, FOLDER)
+    assert rotation.evict() == 0
+
+    rotation._decks[(ACCOUNT, FOLDER)].dirty = False
+    assert rotation.evict() == 1
+    assert rotation.get_rotation_stats()['decks'] == 0
+
+
+def _deck_row(account_id: str, cursor: int) -> dict:
+    return {'account_id': account_id, 'folder_id': FOLDER, 'cards': '[1, 2, 3]', 'cursor': cursor, 'posted': '[]', 'cycle': 1}
+
+
+async def test_save_many_upserts_decks(database):
+    """Существующие колоды перезаписываются, новые вставляются, без конфликта ключа"""
+    async with AsyncSessionLocal() as db:
+        await RotationDeckRepository(db).save_many([_deck_row("acc_1", 1)])
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        repository = RotationDeckRepository(db)
+        await repository.save_many([_deck_row("acc_1", 2), _deck_row("acc_2", 0)])
+        await db.commit()
+        decks = await repository.list_for_accounts(["acc_1", "acc_2"])
+
+    assert sorted((deck.account_id, deck.cursor) for deck in decks) == [("acc_1", 2), ("acc_2", 0)]
+
+
+async def _stored_deck(account_id: str = ACCOUNT):
+    async with AsyncSessionLocal() as db:
+        return await RotationDeckRepository(db).get_fields(account_id, FOLDER, 'cards', 'cursor', 'posted')
+
+
+async def test_mark_posted_does_not_persist_uncommitted_draws(database):
+    """Отметка публикации из другой сессии пишет только posted, а не курсор незафиксированного планирования"""
+    rotation = _rotation(5)
+    async with AsyncSessionLocal() as db:
+        posted = await rotation.draw(db, ACCOUNT, FOLDER)
+        saved = await rotation.save(db)
+        await db.commit()
+        rotation.saved(saved)
+
+    # Планирование выдает карты, но еще не зафиксировано
+    async with AsyncSessionLocal() as planning:
+        await rotation.draw(planning, ACCOUNT, FOLDER)
+
+        async with AsyncSessionLocal() as pipeline:
+            await rotation.mark_posted(pipeline, ACCOUNT, FOLDER, posted.path)
+            await pipeline.commit()
+
+        await planning.rollback()
+
+    stored = await _stored_deck()
+    assert stored.cursor == 1
+    assert json.loads(stored.posted) == [posted.video_id]
+
+
+async def test_decks_stay_dirty_until_commit_succeeds(database):
+    rotation = _rotation(3)
+    async with AsyncSessionLocal() as db:
+        await rotation.draw(db, ACCOUNT, FOLDER)
+        await rotation.save(db)
+        await db.rollback()
+
+    # Запись откатилась - колода не выгружается и будет записана снова
+    assert rotation.evict() == 0
+    assert await _stored_deck() is None
+
+    async with AsyncSessionLocal() as db:
+        saved = await rotation.save(db)
+        await db.commit()
+    rotation.saved(saved)
+    assert await _stored_deck() is not None
+    assert rotation.evict() == 1
+
+
+async def test_release_cards_rewrites_only_stored_deck(database):
+    """Возврат карты проваленной задачи не сохраняет выдачи незафиксированного планирования"""
+    rotation = _rotation(5)
+    async with AsyncSessionLocal() as db:
+        failed = await rotation.draw(db, ACCOUNT, FOLDER)
+        saved = await rotation.save(db)
+        await db.commit()
+        rotation.saved(saved)
+
+    async with AsyncSessionLocal() as planning:
+        await rotation.draw(planning, ACCOUNT, FOLDER)
+
+        async with AsyncSessionLocal() as pipeline:
+            await rotation.release_cards(pipeline, ACCOUNT, FOLDER, [failed.path])
+            await pipeline.commit()
+
+    stored = await _stored_deck()
+    assert stored.cursor == 0
+    assert failed.video_id in json.loads(stored.cards)
+
+    # В памяти карта тоже вернулась, выдача планирования сохранилась
+    deck = rotation._decks[(ACCOUNT, FOLDER)]
+    assert deck.cursor == 1
+    assert not deck.is_dealt(failed.video_id)